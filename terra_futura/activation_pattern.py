@@ -14,11 +14,20 @@ class ActivationPattern:
         self._pattern = pattern.copy()
         self._selected = False
 
+    @property
+    def pattern(self) -> list[GridPosition]:
+        return self._pattern.copy()
+
     def select(self) -> None:
         assert self._selected is False
         self._grid.setActivationPattern(self._pattern)
         self._selected = True
 
+    def deselect(self) -> None:
+        """Undoes select; the grid activations are restored by the caller."""
+        assert self._selected is True
+        self._selected = False
+
     def is_selected(self) -> bool:
         return self._selected
 
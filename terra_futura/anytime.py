@@ -0,0 +1,158 @@
+"""
+Hosting bots under a time limit per move.
+
+A bot seat is an AnytimeBotInterface (see interfaces): it gets a read-only
+GameView of the position and a deadline, and yields the best move it has
+found so far, as often as it can. BotHost steps the bots of any number of
+games cooperatively on one asyncio event loop: it advances a bot for at
+most `sliceSeconds` before letting other games run, stops it at the
+deadline and plays the last move it yielded. A bot that yielded no legal
+move by then gets a default move (the first of GameView.legalMoves: the
+first card on offer, finishing the turn, the first pattern or scoring
+card), so every move takes at most the budget plus one step of its bot.
+
+Plain bot policies (bots.BotPolicy) are hosted through PolicyBot, which
+yields the policy's one decision; MCTSBot searches anytime.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+from .bots import BotPolicy, GameDriver, GreedyBot, RandomBot
+from .game import Game
+from .interfaces import AnytimeBotInterface
+from .mcts import FINISH_TURN, MCTSBot, Move, legalMoves
+from .metrics import percentile
+from .simple_types import GameState, GridPosition
+
+
+class GameView:
+    """What a bot may see of the position of the player on turn."""
+
+    __slots__ = ("_driver",)
+
+    def __init__(self, driver: GameDriver) -> None:
+        self._driver = driver
+
+    @property
+    def playerId(self) -> int:
+        return self._driver.game.onTurn()
+
+    @property
+    def state(self) -> GameState:
+        return self._driver.game.state
+
+    @property
+    def turnNumber(self) -> int:
+        return self._driver.game.turnNumber
+
+    @property
+    def allowed(self) -> tuple[GridPosition, ...]:
+        """Cards that may still be activated this turn."""
+        return tuple(self._driver.allowed)
+
+    def legalMoves(self) -> list[Move]:
+        return legalMoves(self._driver)
+
+    def explore(self) -> GameDriver:
+        """A driver of an independent copy of the game, to try moves on."""
+        return GameDriver(self._driver.game.clone(), self._driver.allowed.copy())
+
+
+class PolicyBot:
+    """Hosts a bots.BotPolicy, which decides in one step."""
+
+    def __init__(self, policy: BotPolicy) -> None:
+        self._policy = policy
+
+    def think(self, view: GameView, deadline: float) -> Iterator[Optional[Move]]:
+        # a policy cannot be stopped once asked, so it is not asked after the deadline
+        if time.monotonic() >= deadline:
+            return
+        # policies only read the game, so they are given the live one rather than a copy
+        driver = view._driver  # pylint: disable=protected-access
+        game, playerId = driver.game, view.playerId
+        if view.state in (GameState.TakeCardNoCardDiscarded, GameState.TakeCardCardDiscarded):
+            yield Move(card=self._policy.chooseCard(game, playerId))
+        elif view.state == GameState.ActivateCard:
+            activation = self._policy.chooseActivation(game, playerId, driver.allowed.copy()) if driver.allowed else None
+            yield FINISH_TURN if activation is None else Move(activation=activation)
+        elif view.state == GameState.SelectActivationPattern:
+            yield Move(pattern=self._policy.choosePattern(game, playerId))
+        elif view.state == GameState.SelectScoringMethod:
+            yield Move(scoring=self._policy.chooseScoring(game, playerId))
+
+
+# Bots a host creates by name; hosts do not import code named by clients.
+BOTS: dict[str, Callable[[int], AnytimeBotInterface]] = {
+    "random": lambda seed: PolicyBot(RandomBot(seed)),
+    "greedy": lambda seed: PolicyBot(GreedyBot(seed)),
+    "mcts": MCTSBot,
+}
+
+
+@dataclass
+class HostMetrics:
+    decisions: int = 0
+    timeouts: int = 0  # bots stopped at the deadline
+    defaults: int = 0  # decisions without a legal move from the bot
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=10000))
+
+    def percentile(self, p: float) -> float:
+        return percentile(self.latencies, p)
+
+    def summary(self) -> str:
+        return (f"decisions={self.decisions} timeouts={self.timeouts} defaults={self.defaults} "
+                f"latency_p50={self.percentile(0.5) * 1000:.3f}ms latency_p99={self.percentile(0.99) * 1000:.3f}ms")
+
+
+class BotHost:
+    """Runs bot decisions cooperatively on the running event loop."""
+
+    def __init__(self, sliceSeconds: float = 0.002) -> None:
+        self._sliceSeconds = sliceSeconds
+        self.metrics = HostMetrics()
+
+    async def decide(self, driver: GameDriver, bot: AnytimeBotInterface, budget: float) -> Move:
+        """The move of the player on turn, within `budget` seconds."""
+        start = time.monotonic()
+        deadline = start + budget
+        view = GameView(driver)
+        best: Optional[Move] = None
+        thoughts = bot.think(view, deadline)
+        try:
+            yieldAt = start + self._sliceSeconds
+            for move in thoughts:
+                if move is not None:
+                    best = move
+                now = time.monotonic()
+                if now >= yieldAt:
+                    await asyncio.sleep(0)
+                    now = time.monotonic()
+                    yieldAt = now + self._sliceSeconds
+                if now >= deadline:
+                    self.metrics.timeouts += 1
+                    break
+        finally:
+            # let generators clean up now rather than when they are collected
+            close = getattr(thoughts, "close", None)
+            if close is not None:
+                close()
+        moves = view.legalMoves()
+        if best not in moves:
+            self.metrics.defaults += 1
+            best = moves[0]
+        self.metrics.decisions += 1
+        self.metrics.latencies.append(time.monotonic() - start)
+        assert best is not None
+        return best
+
+    async def playGame(self, game: Game, bots: dict[int, AnytimeBotInterface], budget: float) -> None:
+        """Play the game until it is finished, with one bot per player."""
+        driver = GameDriver(game)
+        while game.state != GameState.Finish:
+            move = await self.decide(driver, bots[game.onTurn()], budget)
+            move.apply(driver)
+            await asyncio.sleep(0)  # let the other games move too
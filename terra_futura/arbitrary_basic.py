@@ -1,5 +1,5 @@
 from terra_futura.interfaces import Resource, Effect
-from typing import List
+from typing import Any, List
 from dataclasses import dataclass
 
 @dataclass(frozen=True)
@@ -69,6 +69,10 @@ class ArbitraryBasic(Effect):
 
         return True
 
+    def __deepcopy__(self, memo: dict[int, Any]) -> "ArbitraryBasic":
+        # immutable, so copies of games can share their effects
+        return self
+
     def hasAssistance(self) -> bool:
         """
         ArbitraryBasic is never an Assistance-type effect.
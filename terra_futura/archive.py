@@ -0,0 +1,259 @@
+"""
+Columnar archive of completed games for analytics.
+
+ArchiveWriter stores finished games as tables of fixed-width columns, one
+raw `array` file per column, in a directory:
+
+    scores       player, scoring (card chosen), points
+    patterns     player, pattern (card chosen)
+    picks        player, turn, deck, index, x, y     every card taken
+    activations  player, x, y, count                 every card activated
+    pollution    player, turn, total                 pollution of the grid after every turn
+
+Every table also has an `offsets` column: the rows of game g are
+offsets[g]:offsets[g + 1]. meta.json records the typecode and item size
+of every column. ArchiveReader maps the column files and returns memoryviews
+of them, so analytics over millions of games slice the files without
+copying or parsing anything:
+
+    with ArchiveReader("archive") as archive:
+        points = archive.column("scores", "points")
+        mean = sum(points) / len(points)
+
+Archive the games of a simulation with
+`python -m terra_futura.simulate --archive DIR` and summarize an archive
+with `python -m terra_futura.archive DIR`.
+"""
+from __future__ import annotations
+import argparse
+import json
+import mmap
+import os
+import sys
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from types import TracebackType
+from typing import BinaryIO, Literal, Optional
+from .bots import finalScores
+from .commands import ActivateCardCommand, SelectPatternCommand, SelectScoringCommand, TakeCardCommand
+from .game import Game
+from .simple_types import GameState
+
+_VERSION = 1
+
+_Typecode = Literal["b", "B", "h", "H", "i", "I", "q", "Q"]
+
+# columns of every table with their array typecodes
+TABLES: dict[str, tuple[tuple[str, _Typecode], ...]] = {
+    "scores": (("player", "q"), ("scoring", "b"), ("points", "i")),
+    "patterns": (("player", "q"), ("pattern", "b")),
+    "picks": (("player", "q"), ("turn", "H"), ("deck", "b"), ("index", "b"), ("x", "b"), ("y", "b")),
+    "activations": (("player", "q"), ("x", "b"), ("y", "b"), ("count", "H")),
+    "pollution": (("player", "q"), ("turn", "H"), ("total", "H")),
+}
+_OFFSETS: _Typecode = "Q"
+_TYPECODES: dict[str, _Typecode] = {f"{table}.{name}": typecode for table, columns in TABLES.items()
+                                    for name, typecode in columns + (("offsets", _OFFSETS),)}
+
+
+@dataclass(frozen=True)
+class GameRecord:
+    """Rows of one finished game for every table, in the column order of TABLES."""
+    scores: tuple[tuple[int, ...], ...]
+    patterns: tuple[tuple[int, ...], ...]
+    picks: tuple[tuple[int, ...], ...]
+    activations: tuple[tuple[int, ...], ...]
+    pollution: tuple[tuple[int, ...], ...]
+
+    @classmethod
+    def fromGame(cls, game: Game) -> GameRecord:
+        if game.state != GameState.Finish:
+            raise ValueError("Only finished games can be archived")
+        points = finalScores(game)
+        scores: list[tuple[int, ...]] = []
+        patterns: list[tuple[int, ...]] = []
+        picks: list[tuple[int, ...]] = []
+        activations: Counter[tuple[int, int, int]] = Counter()
+        placed: Counter[tuple[int, int]] = Counter()  # pollution placed by player in turn
+        for command in game.history:
+            turn = command.before.turnNumber
+            if isinstance(command, TakeCardCommand):
+                playerId, source, cardIndex, destination = command.args
+                picks.append((playerId, turn, source.deck.value, cardIndex, destination.x, destination.y))
+            elif isinstance(command, ActivateCardCommand):
+                playerId, position, _, _, cubes = command.args[:5]
+                activations[(playerId, position.x, position.y)] += 1
+                placed[(playerId, turn)] += len(cubes)
+            elif isinstance(command, SelectPatternCommand):
+                patterns.append(command.args)
+            elif isinstance(command, SelectScoringCommand):
+                playerId, card = command.args
+                scores.append((playerId, card, points[playerId]))
+        turns = max(command.before.turnNumber for command in game.history)
+        pollution: list[tuple[int, ...]] = []
+        for player in game.players:
+            total = 0
+            for turn in range(1, turns + 1):
+                total += placed[(player.id, turn)]
+                pollution.append((player.id, turn, total))
+        return cls(tuple(scores), tuple(patterns), tuple(picks),
+                   tuple(key + (count,) for key, count in sorted(activations.items())), tuple(pollution))
+
+
+class ArchiveWriter:
+    """Writes a new archive into `directory`, buffering `flushEvery` games in memory."""
+
+    def __init__(self, directory: str, flushEvery: int = 4096) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._flushEvery = flushEvery
+        self._games = 0
+        self._buffered = 0
+        self._rows = {table: 0 for table in TABLES}
+        self._columns: dict[str, array[int]] = {}
+        self._files: dict[str, BinaryIO] = {}
+        for key, typecode in _TYPECODES.items():
+            self._columns[key] = array(typecode)
+            self._files[key] = open(os.path.join(directory, key), "wb")
+        for table in TABLES:
+            self._columns[f"{table}.offsets"].append(0)
+
+    def __enter__(self) -> ArchiveWriter:
+        return self
+
+    def __exit__(self, excType: Optional[type[BaseException]], exc: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    @property
+    def games(self) -> int:
+        return self._games
+
+    def add(self, record: GameRecord) -> None:
+        for table, columns in TABLES.items():
+            rows: tuple[tuple[int, ...], ...] = getattr(record, table)
+            for row in rows:
+                for (name, _), value in zip(columns, row):
+                    self._columns[f"{table}.{name}"].append(value)
+            self._rows[table] += len(rows)
+            self._columns[f"{table}.offsets"].append(self._rows[table])
+        self._games += 1
+        self._buffered += 1
+        if self._buffered >= self._flushEvery:
+            self.flush()
+
+    def addGame(self, game: Game) -> None:
+        self.add(GameRecord.fromGame(game))
+
+    def flush(self) -> None:
+        for key, column in self._columns.items():
+            column.tofile(self._files[key])
+            del column[:]
+        self._buffered = 0
+
+    def close(self) -> None:
+        if not self._files:
+            return
+        self.flush()
+        for file in self._files.values():
+            file.close()
+        self._files = {}
+        meta = {
+            "version": _VERSION,
+            "byteorder": sys.byteorder,
+            "games": self._games,
+            "columns": {key: [column.typecode, column.itemsize] for key, column in self._columns.items()},
+        }
+        with open(os.path.join(self._directory, "meta.json"), "w", encoding="utf-8") as metaFile:
+            json.dump(meta, metaFile, indent=1)
+
+
+class ArchiveReader:
+    """
+    Read-only memory maps of the columns of an archive. Release the views it
+    returned before closing it.
+    """
+
+    def __init__(self, directory: str) -> None:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+        if meta["version"] != _VERSION:
+            raise ValueError(f"Unsupported archive version {meta['version']}")
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Archive is {meta['byteorder']} endian and cannot be mapped here")
+        self._directory = directory
+        self._games: int = meta["games"]
+        for key, typecode in _TYPECODES.items():
+            if meta["columns"].get(key) != [typecode, array(typecode).itemsize]:
+                raise ValueError(f"Column {key} is not stored as {typecode!r} arrays of this platform")
+        self._maps: dict[str, mmap.mmap] = {}
+
+    def __enter__(self) -> ArchiveReader:
+        return self
+
+    def __exit__(self, excType: Optional[type[BaseException]], exc: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for columnMap in self._maps.values():
+            columnMap.close()
+        self._maps = {}
+
+    @property
+    def games(self) -> int:
+        return self._games
+
+    def column(self, table: str, name: str) -> memoryview:
+        """All values of a column, as a view of the mapped file."""
+        key = f"{table}.{name}"
+        typecode = _TYPECODES[key]
+        if key not in self._maps:
+            with open(os.path.join(self._directory, key), "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return memoryview(b"").cast(typecode)
+                self._maps[key] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._maps[key]).cast(typecode)
+
+    def rows(self, table: str, start: int, stop: Optional[int] = None) -> slice:
+        """Rows of `table` that belong to games start..stop-1, or to game `start` alone."""
+        stop = start + 1 if stop is None else stop
+        if not 0 <= start <= stop <= self._games:
+            raise IndexError((start, stop))
+        offsets = self.column(table, "offsets")
+        try:
+            return slice(offsets[start], offsets[stop])
+        finally:
+            offsets.release()
+
+
+def summary(archive: ArchiveReader) -> str:
+    lines = [f"{archive.games} games"]
+    points, scoring = archive.column("scores", "points"), archive.column("scores", "scoring")
+    for card in (0, 1):
+        chosen = [p for p, s in zip(points, scoring) if s == card]
+        if chosen:
+            lines.append(f"scoring card {card}: chosen {len(chosen)} times, {sum(chosen) / len(chosen):.1f} points on average")
+    deck = archive.column("picks", "deck")
+    lines.append("picks per deck: " + ", ".join(f"{value}: {count}" for value, count in sorted(Counter(deck).items())))
+    turn, total = archive.column("pollution", "turn"), archive.column("pollution", "total")
+    final: dict[int, list[int]] = {}
+    for t, p in zip(turn, total):
+        final.setdefault(t, []).append(p)
+    lines.append("mean pollution after turn: " + ", ".join(f"{t}: {sum(v) / len(v):.2f}" for t, v in sorted(final.items())))
+    for view in (points, scoring, deck, turn, total):
+        view.release()
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Summarize an archive of completed Terra Futura games.")
+    parser.add_argument("archive")
+    args = parser.parse_args(argv)
+    with ArchiveReader(args.archive) as archive:
+        print(summary(archive))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Automated players.
+
+A bot policy answers the four decisions a player makes: which card to take
+and where to put it, which cards to activate (one at a time, each card at
+most once per turn), which activation pattern and which scoring method to
+select. playGame drives a Game through all its states with one policy per
+player.
+
+Activations follow the board game rules: during a regular turn the newly
+placed card and the cards in its row and column may be activated, during the
+final round the cards of the selected activation pattern.
+"""
+from __future__ import annotations
+import importlib
+import random
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Optional, Protocol
+from .arbitrary_basic import ArbitraryBasic
+from .effect_or import EffectOr
+from .game import Game
+from .grid import GRID_POSITIONS
+from .interfaces import Effect, InterfaceCard, InterfaceGrid
+from .payments import payments
+from .player import Player
+from .scoring_method import BASE_SCORES
+from .simple_types import CardSource, Deck, GameState, GridPosition, Resource
+from .transformation_fixed import TransformationFixed
+
+
+@dataclass(frozen=True)
+class Activation:
+    """Arguments of one Game.activateCard call without assistance."""
+    card: GridPosition
+    inputs: tuple[tuple[Resource, GridPosition], ...]
+    outputs: tuple[tuple[Resource, GridPosition], ...]
+    pollution: tuple[GridPosition, ...]
+
+    @property
+    def value(self) -> int:
+        """Change of the final base score, counting each pollution cube as one point."""
+        gained = sum(BASE_SCORES[r] for r, _ in self.outputs)
+        paid = sum(BASE_SCORES[r] for r, _ in self.inputs)
+        return gained - paid - len(self.pollution)
+
+
+class BotPolicy(Protocol):
+    def chooseCard(self, game: Game, playerId: int) -> tuple[Deck, int, GridPosition]:
+        """Deck, card index (1..4) and grid position of the card to take."""
+        ...
+
+    def chooseActivation(self, game: Game, playerId: int,
+                         positions: list[GridPosition]) -> Optional[Activation]:
+        """Next activation of one of `positions`, or None to finish the turn."""
+        ...
+
+    def choosePattern(self, game: Game, playerId: int) -> int:
+        ...
+
+    def chooseScoring(self, game: Game, playerId: int) -> int:
+        ...
+
+
+def getPlayer(game: Game, playerId: int) -> Player:
+    for player in game.players:
+        if player.id == playerId:
+            return player
+    raise ValueError(f"No player with id {playerId}")
+
+
+def effectOptions(effect: Optional[Effect]) -> list[Effect]:
+    """Alternatives a player can choose from, with EffectOr flattened."""
+    if effect is None:
+        return []
+    if isinstance(effect, EffectOr):
+        return [option for child in effect.effects for option in effectOptions(child)]
+    return [effect]
+
+
+def cardOptions(card: InterfaceCard) -> list[Effect]:
+    return effectOptions(card.upperEffect) + effectOptions(card.lowerEffect)
+
+
+def cardChoices(game: Game, playerId: int) -> list[tuple[Deck, int, GridPosition]]:
+    """Every legal takeCard choice of the player."""
+    grid = getPlayer(game, playerId).grid
+    free = [position for position in GRID_POSITIONS if grid.canPutCard(position)]
+    return [(deck, index, position)
+            for deck, pile in game.piles.items()
+            for index in range(1, 5) if pile.getCard(index) is not None
+            for position in free]
+
+
+def turnActivations(grid: InterfaceGrid, placed: GridPosition) -> list[GridPosition]:
+    """Cards that may be activated after placing a card: its row and its column."""
+    return [position for position in GRID_POSITIONS
+            if (position.x == placed.x or position.y == placed.y) and grid.getCard(position) is not None]
+
+
+def patternActivations(grid: InterfaceGrid, pattern: list[GridPosition]) -> list[GridPosition]:
+    return [position for position in pattern if grid.getCard(position) is not None]
+
+
+def _payment(grid: InterfaceGrid, option: Effect) -> Optional[list[tuple[Resource, GridPosition]]]:
+    """Cheapest inputs for the option taken from active cards of the grid, or None."""
+    payment = next(payments(grid, option, cheapestFirst=True), None)
+    return list(payment) if payment is not None else None
+
+
+def freePollutionSlots(card: InterfaceCard) -> int:
+    """How many pollution cubes the card can still take."""
+    slots = 0
+    while card.canPlacePollution(slots + 1):
+        slots += 1
+    return slots
+
+
+def _pollutionPlacement(grid: InterfaceGrid, amount: int,
+                        involved: set[GridPosition]) -> Optional[list[GridPosition]]:
+    """
+    Cards to receive `amount` pollution cubes. Cards used by the activation are
+    avoided, since pollution is placed before resources are moved. Cards that
+    would stay active are preferred.
+    """
+    if amount == 0:
+        return []
+    free: dict[GridPosition, int] = {}
+    for position in GRID_POSITIONS:
+        card = grid.getCard(position)
+        if card is not None and position not in involved:
+            slots = freePollutionSlots(card)
+            if slots > 0:
+                free[position] = slots
+    placement: list[GridPosition] = []
+    for _ in range(amount):
+        if not free:
+            return None
+        position = max(free, key=lambda p: free[p])
+        placement.append(position)
+        free[position] -= 1
+        if free[position] == 0:
+            del free[position]
+    return placement
+
+
+def activationsFor(grid: InterfaceGrid, position: GridPosition) -> list[Activation]:
+    """One activation per effect option of the card that the grid can currently pay for."""
+    card = grid.getCard(position)
+    if card is None or not card.isActive():
+        return []
+    activations: list[Activation] = []
+    for option in cardOptions(card):
+        if not isinstance(option, (TransformationFixed, ArbitraryBasic)):
+            continue
+        inputs = _payment(grid, option)
+        if inputs is None:
+            continue
+        involved = {p for _, p in inputs} | {position}
+        pollution = _pollutionPlacement(grid, option.pollution, involved)
+        if pollution is None:
+            continue
+        outputs = [(resource, position) for resource in option.to]
+        activations.append(Activation(position, tuple(inputs), tuple(outputs), tuple(pollution)))
+    return activations
+
+
+def effectValue(card: InterfaceCard, grid: InterfaceGrid) -> int:
+    """Best base score change a single activation of the card can bring with what the grid holds."""
+    held = Counter(resource for position in GRID_POSITIONS
+                   if (other := grid.getCard(position)) is not None and other.isActive()
+                   for resource in other.resources)
+    best = 0
+    for option in cardOptions(card):
+        if isinstance(option, TransformationFixed):
+            if any(held[r] < count for r, count in Counter(option.from_).items()):
+                continue
+            paid = sum(BASE_SCORES[r] for r in option.from_)
+        elif isinstance(option, ArbitraryBasic):
+            if held.total() < option.from_:
+                continue
+            paid = option.from_
+        else:
+            continue
+        best = max(best, sum(BASE_SCORES[r] for r in option.to) - paid - option.pollution)
+    return best
+
+
+class RandomBot:
+    """Picks uniformly among legal choices."""
+
+    def __init__(self, seed: int = 0) -> None:
+        self._random = random.Random(seed)
+
+    def chooseCard(self, game: Game, playerId: int) -> tuple[Deck, int, GridPosition]:
+        return self._random.choice(cardChoices(game, playerId))
+
+    def chooseActivation(self, game: Game, playerId: int,
+                         positions: list[GridPosition]) -> Optional[Activation]:
+        grid = getPlayer(game, playerId).grid
+        candidates = [a for position in positions for a in activationsFor(grid, position)]
+        if not candidates or self._random.random() < 0.2:
+            return None
+        return self._random.choice(candidates)
+
+    def choosePattern(self, game: Game, playerId: int) -> int:
+        return self._random.randrange(2)
+
+    def chooseScoring(self, game: Game, playerId: int) -> int:
+        return self._random.randrange(2)
+
+
+class GreedyBot:
+    """Maximizes the immediate gain of every single decision."""
+
+    def __init__(self, seed: int = 0) -> None:
+        self._random = random.Random(seed)
+
+    def chooseCard(self, game: Game, playerId: int) -> tuple[Deck, int, GridPosition]:
+        grid = getPlayer(game, playerId).grid
+
+        def score(choice: tuple[Deck, int, GridPosition]) -> tuple[int, int, float]:
+            deck, index, position = choice
+            card = game.piles[deck].getCard(index)
+            assert card is not None
+            # prefer spots whose row and column already hold cards to activate
+            return (effectValue(card, grid), len(turnActivations(grid, position)), self._random.random())
+
+        return max(cardChoices(game, playerId), key=score)
+
+    def chooseActivation(self, game: Game, playerId: int,
+                         positions: list[GridPosition]) -> Optional[Activation]:
+        grid = getPlayer(game, playerId).grid
+        candidates = [a for position in positions for a in activationsFor(grid, position)]
+        best = max(candidates, key=lambda a: a.value, default=None)
+        if best is None or best.value <= 0:
+            return None
+        return best
+
+    def choosePattern(self, game: Game, playerId: int) -> int:
+        player = getPlayer(game, playerId)
+        counts = [len(patternActivations(player.grid, p.pattern)) for p in player.activation_patterns]
+        return counts.index(max(counts))
+
+    def chooseScoring(self, game: Game, playerId: int) -> int:
+        totals = [method.calculate().value for method in getPlayer(game, playerId).scoring_methods]
+        return totals.index(max(totals))
+
+
+PolicyFactory = Callable[[int], BotPolicy]
+
+# Policies selectable by name; others can be given as "package.module:ClassName".
+POLICIES: dict[str, PolicyFactory] = {
+    "random": RandomBot,
+    "greedy": GreedyBot,
+}
+
+
+def loadPolicy(spec: str) -> PolicyFactory:
+    """Policy factory by registered name or "module:attribute" import path."""
+    if spec in POLICIES:
+        return POLICIES[spec]
+    moduleName, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Unknown policy: {spec!r}")
+    factory: PolicyFactory = getattr(importlib.import_module(moduleName), attribute)
+    return factory
+
+
+def closePolicy(policy: object) -> None:
+    """Release what a policy holds, e.g. the worker processes of MCTSBot, if it can be closed."""
+    close = getattr(policy, "close", None)
+    if close is not None:
+        close()
+
+
+class GameDriver:
+    """
+    Advances a game by one decision at a time, remembering which cards may
+    still be activated during the current turn.
+    """
+
+    def __init__(self, game: Game, allowed: Optional[list[GridPosition]] = None) -> None:
+        self.game = game
+        self.allowed: list[GridPosition] = allowed if allowed is not None else []
+
+    def takeCard(self, playerId: int, deck: Deck, index: int, position: GridPosition) -> None:
+        if not self.game.takeCard(playerId, CardSource(deck, index), index, position):
+            raise RuntimeError(f"Illegal takeCard by player {playerId}")
+        self.allowed = turnActivations(getPlayer(self.game, playerId).grid, position)
+
+    def activate(self, playerId: int, activation: Activation) -> None:
+        self.allowed.remove(activation.card)
+        self.game.activateCard(playerId, activation.card, list(activation.inputs),
+                               list(activation.outputs), list(activation.pollution), None, None)
+
+    def finishTurn(self, playerId: int) -> None:
+        self.allowed = []
+        if not self.game.turnFinished(playerId):
+            raise RuntimeError(f"Illegal turnFinished by player {playerId}")
+
+    def selectPattern(self, playerId: int, card: int) -> None:
+        if not self.game.selectActivationPattern(playerId, card):
+            raise RuntimeError(f"Illegal selectActivationPattern by player {playerId}")
+        player = getPlayer(self.game, playerId)
+        self.allowed = patternActivations(player.grid, player.activation_patterns[card].pattern)
+
+    def selectScoring(self, playerId: int, card: int) -> None:
+        if not self.game.selectScoring(playerId, card):
+            raise RuntimeError(f"Illegal selectScoring by player {playerId}")
+
+    def step(self, policy: BotPolicy) -> None:
+        """Let the player on turn make one decision with the given policy."""
+        game = self.game
+        playerId = game.onTurn()
+        state = game.state
+        if state in (GameState.TakeCardNoCardDiscarded, GameState.TakeCardCardDiscarded):
+            self.takeCard(playerId, *policy.chooseCard(game, playerId))
+        elif state == GameState.ActivateCard:
+            activation = policy.chooseActivation(game, playerId, self.allowed) if self.allowed else None
+            if activation is None:
+                self.finishTurn(playerId)
+            else:
+                self.activate(playerId, activation)
+        elif state == GameState.SelectActivationPattern:
+            self.selectPattern(playerId, policy.choosePattern(game, playerId))
+        elif state == GameState.SelectScoringMethod:
+            self.selectScoring(playerId, policy.chooseScoring(game, playerId))
+        else:
+            raise RuntimeError(f"Bots cannot play in state {state.name}")
+
+
+def playGame(game: Game, policies: dict[int, BotPolicy]) -> None:
+    """Play the game until it is finished."""
+    driver = GameDriver(game)
+    while game.state != GameState.Finish:
+        driver.step(policies[game.onTurn()])
+
+
+def finalScores(game: Game) -> dict[int, int]:
+    """Points of the selected scoring method of every player that has selected one."""
+    scores: dict[int, int] = {}
+    for player in game.players:
+        for method in player.scoring_methods:
+            if method.calculatedTotal is not None:
+                scores[player.id] = method.calculatedTotal.value
+    return scores
@@ -0,0 +1,280 @@
+"""
+Static card data shared by the worker processes of one machine.
+
+Every card GameFactory deals is one of a few hundred combinations of
+pollution spaces and effects, and the effects themselves come from fewer than
+200 distinct signatures (see factories.catalogCards). A CardCatalog holds
+the compiled signature of every effect and the static data of every card
+once, in a multiprocessing.shared_memory block that workers attach to by
+name instead of rebuilding it. A worker turns each effect record into an
+Effect object at most once, so the cards of all its games share their
+effects and keep only their own mutable state: resources and pollution,
+and where they lie.
+
+Signatures are nested tuples:
+
+    (FIXED, paid resources, gained resources, pollution)
+    (ARBITRARY, number of resources of any kind paid, gained resources, pollution)
+    (EITHER, option signature, option signature, ...)
+
+and a card is (pollution spaces, upper effect signature, lower effect
+signature or None). In the block, after a header, come the offsets of the
+effect records, one (pollution spaces, upper, lower) record per card,
+referring to effects by index, and the effect records:
+
+    FIXED      kind, pollution, paid count, paid..., gained count, gained...
+    ARBITRARY  kind, pollution, paid count, gained count, gained...
+    EITHER     kind, option count, option indices (uint16)...
+
+with resources as Resource values.
+
+A process pool gets the catalog with `initializer=attachCatalog,
+initargs=(catalog.name,)`; code in its workers reads it with
+processCatalog().
+"""
+from __future__ import annotations
+import struct
+from multiprocessing.shared_memory import SharedMemory
+from types import TracebackType
+from typing import Any, Iterable, Optional
+from .arbitrary_basic import ArbitraryBasic
+from .card import Card
+from .effect_or import EffectOr
+from .interfaces import Effect, InterfaceCard
+from .simple_types import Resource
+from .transformation_fixed import TransformationFixed
+
+FIXED = 0
+ARBITRARY = 1
+EITHER = 2
+
+EffectSignature = tuple[Any, ...]
+CardSignature = tuple[int, EffectSignature, Optional[EffectSignature]]
+
+_MAGIC = b"TFCC"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHII")  # magic, version, effects, cards
+_OFFSET = struct.Struct("<I")
+_CARD = struct.Struct("<BHH")
+_INDEX = struct.Struct("<H")
+_NO_EFFECT = 0xFFFF
+
+
+def _collect(signature: EffectSignature, effects: dict[EffectSignature, int]) -> int:
+    """Index of the signature in `effects`, adding it after its options."""
+    index = effects.get(signature)
+    if index is None:
+        if signature[0] == EITHER:
+            for option in signature[1:]:
+                _collect(option, effects)
+        index = effects[signature] = len(effects)
+    return index
+
+
+def _encodeEffect(signature: EffectSignature, effects: dict[EffectSignature, int]) -> bytes:
+    kind = signature[0]
+    if kind == FIXED:
+        _, paid, gained, pollution = signature
+        return bytes([FIXED, pollution, len(paid), *(r.value for r in paid), len(gained), *(r.value for r in gained)])
+    if kind == ARBITRARY:
+        _, count, gained, pollution = signature
+        return bytes([ARBITRARY, pollution, count, len(gained), *(r.value for r in gained)])
+    if kind == EITHER:
+        options = signature[1:]
+        return bytes([EITHER, len(options)]) + b"".join(_INDEX.pack(effects[option]) for option in options)
+    raise ValueError(f"Unknown effect signature: {signature!r}")
+
+
+def signatureOf(effect: Effect) -> EffectSignature:
+    """The signature of an effect built from one, see buildEffect."""
+    if isinstance(effect, TransformationFixed):
+        return (FIXED, tuple(effect.from_), tuple(effect.to), effect.pollution)
+    if isinstance(effect, ArbitraryBasic):
+        return (ARBITRARY, effect.from_, tuple(effect.to), effect.pollution)
+    if isinstance(effect, EffectOr):
+        return (EITHER, *(signatureOf(option) for option in effect.effects))
+    raise ValueError(f"{effect!r} has no signature")
+
+
+def buildEffect(signature: EffectSignature) -> Effect:
+    """A new effect of the given signature."""
+    kind = signature[0]
+    if kind == FIXED:
+        return TransformationFixed(list(signature[1]), list(signature[2]), signature[3])
+    if kind == ARBITRARY:
+        return ArbitraryBasic(from_=signature[1], to=list(signature[2]), pollution=signature[3])
+    if kind == EITHER:
+        return EffectOr([buildEffect(option) for option in signature[1:]])
+    raise ValueError(f"Unknown effect signature: {signature!r}")
+
+
+class CardCatalog:
+    """Effects and cards in a shared memory block; create one with create, use it elsewhere with attach."""
+
+    def __init__(self, memory: SharedMemory, owner: bool) -> None:
+        self._memory = memory
+        self._owner = owner
+        buffer = memory.buf
+        assert buffer is not None
+        self._buffer = buffer
+        magic, version, effectCount, cardCount = _HEADER.unpack_from(buffer)
+        self._cardCount: int = cardCount
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{memory.name} is not a version {_VERSION} card catalog")
+        self._offsets = [_OFFSET.unpack_from(buffer, _HEADER.size + index * _OFFSET.size)[0]
+                         for index in range(effectCount)]
+        self._cardsAt = _HEADER.size + effectCount * _OFFSET.size
+        self._effectsAt = self._cardsAt + cardCount * _CARD.size
+        # decoded lazily: the signature and the shared Effect of every record
+        self._signatures: list[Optional[EffectSignature]] = [None] * effectCount
+        self._effects: list[Optional[Effect]] = [None] * effectCount
+        self._interned: dict[int, int] = {}  # id of a shared Effect -> its index
+        self._cards: dict[int, tuple[int, Effect, Optional[Effect]]] = {}  # decoded card records
+        self._effectIds: Optional[dict[EffectSignature, int]] = None
+        self._cardIds: Optional[dict[tuple[int, int, int], int]] = None
+
+    @classmethod
+    def create(cls, cards: Iterable[CardSignature], name: Optional[str] = None) -> CardCatalog:
+        """Publish a catalog of `cards` and every effect on them; its owner unlinks it when done."""
+        effects: dict[EffectSignature, int] = {}
+        records: list[tuple[int, int, int]] = []
+        for spaces, upper, lower in cards:
+            lowerIndex = _NO_EFFECT if lower is None else _collect(lower, effects)
+            records.append((spaces, _collect(upper, effects), lowerIndex))
+        if len(effects) >= _NO_EFFECT:
+            raise ValueError(f"A catalog holds fewer than {_NO_EFFECT} effects")
+        encoded = [_encodeEffect(signature, effects) for signature in effects]
+        offsets, at = [], 0
+        for record in encoded:
+            offsets.append(at)
+            at += len(record)
+        data = b"".join([
+            _HEADER.pack(_MAGIC, _VERSION, len(effects), len(records)),
+            *(_OFFSET.pack(offset) for offset in offsets),
+            *(_CARD.pack(*record) for record in records),
+            *encoded,
+        ])
+        memory = SharedMemory(name, create=True, size=len(data))
+        assert memory.buf is not None
+        memory.buf[:len(data)] = data
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> CardCatalog:
+        return cls(SharedMemory(name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    @property
+    def effectCount(self) -> int:
+        return len(self._offsets)
+
+    def __len__(self) -> int:
+        return self._cardCount
+
+    def signature(self, index: int) -> EffectSignature:
+        signature = self._signatures[index]
+        if signature is None:
+            buffer = self._buffer
+            at = self._effectsAt + self._offsets[index]
+            kind = buffer[at]
+            if kind == FIXED:
+                paidCount = buffer[at + 2]
+                paid = tuple(Resource(value) for value in buffer[at + 3:at + 3 + paidCount])
+                gainedAt = at + 3 + paidCount
+                gained = tuple(Resource(value) for value in buffer[gainedAt + 1:gainedAt + 1 + buffer[gainedAt]])
+                signature = (FIXED, paid, gained, buffer[at + 1])
+            elif kind == ARBITRARY:
+                gained = tuple(Resource(value) for value in buffer[at + 4:at + 4 + buffer[at + 3]])
+                signature = (ARBITRARY, buffer[at + 2], gained, buffer[at + 1])
+            else:
+                options = [_INDEX.unpack_from(buffer, at + 2 + option * _INDEX.size)[0]
+                           for option in range(buffer[at + 1])]
+                signature = (EITHER, *(self.signature(option) for option in options))
+            self._signatures[index] = signature
+        return signature
+
+    def effect(self, index: int) -> Effect:
+        """The effect of record `index`, the same object on every call."""
+        effect = self._effects[index]
+        if effect is None:
+            signature = self.signature(index)
+            if signature[0] == EITHER:
+                options = [self.effect(self.effectId(option)) for option in signature[1:]]
+                effect = EffectOr(options)
+            else:
+                effect = buildEffect(signature)
+            self._effects[index] = effect
+            self._interned[id(effect)] = index
+        return effect
+
+    def effectId(self, signature: EffectSignature) -> int:
+        if self._effectIds is None:
+            self._effectIds = {self.signature(index): index for index in range(self.effectCount)}
+        index = self._effectIds.get(signature)
+        if index is None:
+            raise ValueError(f"Effect {signature!r} is not in the catalog")
+        return index
+
+    def _cardOf(self, spaces: int, upper: int, lower: int) -> int:
+        if self._cardIds is None:
+            self._cardIds = {_CARD.unpack_from(self._buffer, self._cardsAt + card * _CARD.size): card
+                             for card in range(self._cardCount)}
+        card = self._cardIds.get((spaces, upper, lower))
+        if card is None:
+            raise ValueError(f"No card of {spaces} pollution spaces and effects {upper}, {lower} in the catalog")
+        return card
+
+    def cardId(self, signature: CardSignature) -> int:
+        spaces, upper, lower = signature
+        return self._cardOf(spaces, self.effectId(upper), _NO_EFFECT if lower is None else self.effectId(lower))
+
+    def identify(self, card: InterfaceCard) -> int:
+        """The id of the static data of `card`, which may come from the catalog or not."""
+        upper, lower = card.upperEffect, card.lowerEffect
+        if upper is None:
+            raise ValueError("Catalog cards have an upper effect")
+        return self._cardOf(card.pollutionSpacesL, self._indexOf(upper),
+                            _NO_EFFECT if lower is None else self._indexOf(lower))
+
+    def _indexOf(self, effect: Effect) -> int:
+        index = self._interned.get(id(effect))
+        return self.effectId(signatureOf(effect)) if index is None else index
+
+    def card(self, cardId: int) -> Card:
+        """A new card with the static data of `cardId` and no resources or pollution yet."""
+        static = self._cards.get(cardId)
+        if static is None:
+            spaces, upper, lower = _CARD.unpack_from(self._buffer, self._cardsAt + cardId * _CARD.size)
+            static = self._cards[cardId] = (spaces, self.effect(upper),
+                                            None if lower == _NO_EFFECT else self.effect(lower))
+        return Card(*static)
+
+    def close(self) -> None:
+        """Detach from the block, and remove it if this catalog created it."""
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def __enter__(self) -> CardCatalog:
+        return self
+
+    def __exit__(self, excType: Optional[type[BaseException]], exc: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+
+_processCatalog: Optional[CardCatalog] = None
+
+
+def attachCatalog(name: Optional[str]) -> None:
+    """Process pool initializer: attach this process to the catalog called `name`, if any."""
+    global _processCatalog  # pylint: disable=global-statement
+    _processCatalog = None if name is None else CardCatalog.attach(name)
+
+
+def processCatalog() -> Optional[CardCatalog]:
+    """The catalog attached with attachCatalog, or None."""
+    return _processCatalog
@@ -0,0 +1,229 @@
+"""
+Chess clock time control for hosted games.
+
+Every player of a timed game has a clock that runs while Game.onTurn()
+points at them. A player gets `increment` seconds back whenever they
+finish a turn (turnFinished, or a submitted turn), and when their time
+runs out the host plays a default action for them.
+
+The deadlines of all clocks of all games live in one TimerWheel: a
+hierarchical timing wheel (Varghese and Lauck) of LEVELS levels of SLOTS
+slots each. A timer due within SLOTS ticks sits in the first level, one due
+within SLOTS**2 ticks in the second and so on; when the first level wraps
+around, the due slot of the next level is cascaded down. Scheduling and
+cancelling are O(1) and every tick touches one slot, however many clocks
+are running.
+"""
+from __future__ import annotations
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from .game import Game
+from .simple_types import GameState
+
+LEVELS = 4
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+
+# actions after which the acting player gets the increment
+FINISHING_METHODS = frozenset({"turnFinished", "submitTurn"})
+
+
+class Timer:
+    """A scheduled callback; cancel it with TimerWheel.cancel."""
+
+    __slots__ = ("due", "callback", "_slot")
+
+    def __init__(self, due: int, callback: Callable[[], None]) -> None:
+        self.due = due  # tick
+        self.callback = callback
+        self._slot: Optional[set[Timer]] = None
+
+
+class TimerWheel:
+    """Timers with a resolution of `tick` seconds."""
+
+    def __init__(self, tick: float = 0.01, now: float = 0.0) -> None:
+        self._tickSeconds = tick
+        self._origin = now
+        self._tick = 0  # every timer due at or before it has fired
+        self._wheels: list[list[set[Timer]]] = [[set() for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self._count = 0
+        self.failures = 0  # callbacks that raised
+        self.lastFailure: Optional[Exception] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def tickSeconds(self) -> float:
+        return self._tickSeconds
+
+    def _ticks(self, at: float) -> int:
+        return math.ceil((at - self._origin) / self._tickSeconds - 1e-9)
+
+    def _place(self, timer: Timer, earliest: int) -> None:
+        due = max(timer.due, earliest)
+        delta = due - self._tick
+        level = 0
+        while level < LEVELS - 1 and delta >= 1 << (SLOT_BITS * (level + 1)):
+            level += 1
+        slot = self._wheels[level][(due >> (SLOT_BITS * level)) & (SLOTS - 1)]
+        slot.add(timer)
+        timer._slot = slot  # pylint: disable=protected-access
+
+    def schedule(self, at: float, callback: Callable[[], None]) -> Timer:
+        """Call `callback` once the wheel is advanced to `at` seconds."""
+        timer = Timer(self._ticks(at), callback)
+        # timers due now or earlier fire on the next tick
+        self._place(timer, self._tick + 1)
+        self._count += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        slot = timer._slot  # pylint: disable=protected-access
+        if slot is not None:
+            slot.discard(timer)
+            timer._slot = None  # pylint: disable=protected-access
+            self._count -= 1
+
+    def advance(self, now: float) -> int:
+        """Fire every timer due by `now`; returns how many fired."""
+        target = math.floor((now - self._origin) / self._tickSeconds + 1e-9)
+        fired = 0
+        while self._tick < target:
+            if not self._count:
+                # nothing to cascade or fire on the way
+                self._tick = target
+                break
+            self._tick += 1
+            wrapped = 1
+            while wrapped < LEVELS and not self._tick & ((1 << (SLOT_BITS * wrapped)) - 1):
+                wrapped += 1
+            # from the top, so that timers cascade through several levels in one tick
+            for level in range(wrapped - 1, 0, -1):
+                index = (self._tick >> (SLOT_BITS * level)) & (SLOTS - 1)
+                cascaded = self._wheels[level][index]
+                self._wheels[level][index] = set()
+                for timer in cascaded:
+                    self._place(timer, self._tick)
+            slot = self._wheels[0][self._tick & (SLOTS - 1)]
+            for timer in [timer for timer in slot if timer.due <= self._tick]:
+                self.cancel(timer)
+                try:
+                    timer.callback()
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    # one failing timer must not stop the others
+                    self.failures += 1
+                    self.lastFailure = e
+                fired += 1
+        return fired
+
+
+@dataclass(frozen=True)
+class TimeControl:
+    initial: float           # seconds every player starts with
+    increment: float = 0.0   # seconds added for every finished turn
+
+    @classmethod
+    def parse(cls, text: str) -> TimeControl:
+        """From "SECONDS" or "SECONDS+INCREMENT", e.g. "300+5"."""
+        initial, _, increment = text.partition("+")
+        return cls(float(initial), float(increment or 0))
+
+
+class ChessClock:
+    """Remaining time of every player of one game."""
+
+    def __init__(self, control: TimeControl, playerIds: list[int]) -> None:
+        self.control = control
+        self._remaining = {playerId: control.initial for playerId in playerIds}
+        self.running: Optional[int] = None
+        self._since = 0.0
+
+    @property
+    def playerIds(self) -> list[int]:
+        return list(self._remaining)
+
+    def remaining(self, playerId: int, now: float) -> float:
+        left = self._remaining[playerId]
+        if playerId == self.running:
+            left -= now - self._since
+        return max(0.0, left)
+
+    def stop(self, now: float, finished: bool) -> None:
+        if self.running is not None:
+            self._remaining[self.running] = self.remaining(self.running, now)
+            if finished:
+                self._remaining[self.running] += self.control.increment
+        self.running = None
+
+    def start(self, playerId: int, now: float) -> float:
+        """Run the clock of `playerId`; returns when it runs out."""
+        self.running = playerId
+        self._since = now
+        return now + self._remaining[playerId]
+
+
+class GameClocks:
+    """
+    Clocks of many games on one TimerWheel. Call update after every
+    accepted action and advance regularly; onTimeout(gameId, playerId) is
+    called when a player runs out of time and should make the player's
+    move, after which the host calls update as for any other action.
+    """
+
+    def __init__(self, control: TimeControl, onTimeout: Callable[[int, int], None], tick: float = 0.01,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.control = control
+        self._onTimeout = onTimeout
+        self._clock = clock
+        self.wheel = TimerWheel(tick, clock())
+        self._clocks: dict[int, ChessClock] = {}
+        self._timers: dict[int, Timer] = {}
+        self.timeouts = 0
+
+    def __contains__(self, gameId: int) -> bool:
+        return gameId in self._clocks
+
+    def start(self, gameId: int, game: Game) -> None:
+        self._clocks[gameId] = ChessClock(self.control, [player.id for player in game.players])
+        self.update(gameId, game, None)
+
+    def stop(self, gameId: int) -> None:
+        self._clocks.pop(gameId, None)
+        timer = self._timers.pop(gameId, None)
+        if timer is not None:
+            self.wheel.cancel(timer)
+
+    def remaining(self, gameId: int) -> dict[int, float]:
+        clock, now = self._clocks[gameId], self._clock()
+        return {playerId: clock.remaining(playerId, now) for playerId in clock.playerIds}
+
+    def update(self, gameId: int, game: Game, method: Optional[str]) -> None:
+        """Switch the clocks of the game after an accepted `method`."""
+        clock = self._clocks.get(gameId)
+        if clock is None:
+            return
+        finished = method in FINISHING_METHODS
+        onTurn = game.onTurn() if game.state != GameState.Finish else None
+        if onTurn == clock.running and not finished and gameId in self._timers:
+            return
+        now = self._clock()
+        clock.stop(now, finished)
+        timer = self._timers.pop(gameId, None)
+        if timer is not None:
+            self.wheel.cancel(timer)
+        if onTurn is None:
+            return
+        due = clock.start(onTurn, now)
+        self._timers[gameId] = self.wheel.schedule(due, lambda: self._expire(gameId, onTurn))
+
+    def _expire(self, gameId: int, playerId: int) -> None:
+        self._timers.pop(gameId, None)
+        self.timeouts += 1
+        self._onTimeout(gameId, playerId)
+
+    def advance(self) -> int:
+        return self.wheel.advance(self._clock())
@@ -0,0 +1,398 @@
+"""
+Games hosted on several processes behind one router.
+
+    python -m terra_futura.cluster --workers 4 --port 8765
+
+Every worker process runs a GameServer on a local port and owns a disjoint
+set of games: a game lives on the worker its id hashes to on a consistent
+hash ring (HashRing). The router speaks the protocol of the server to
+clients (see server), so clients cannot tell the difference. It assigns
+the ids of new games and forwards every request of a client over that
+client's own connection to the worker of the game. Answers and observer
+updates are passed back unparsed. A worker answers the requests of one
+connection in order, which lets the router count the requests in flight
+per game without reading the answers. The workers deal their cards from
+one shared card catalog (see catalog).
+
+Router.addWorker starts another worker and moves the games that now hash
+to it there (exportGame on the old worker, importGame on the new one, over
+the private pipe of each worker, never the client protocol): requests for
+a moving game wait until it has moved, and subscriptions to its seats move
+along. Only about 1/N of the games move.
+
+`python -m terra_futura.cluster --benchmark --workers 4` measures request
+throughput with 1 to 4 workers, using load_client.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+from collections import Counter, deque
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any, Iterable, Optional
+from .catalog import attachCatalog
+from .factories import createCatalog
+from .load_client import runLoad
+from .server import GameServer
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of game ids to workers, with `replicas` points per worker."""
+
+    def __init__(self, workers: Iterable[int] = (), replicas: int = 64) -> None:
+        self._replicas = replicas
+        self._points: list[int] = []
+        self._owners: list[int] = []
+        for worker in workers:
+            self.add(worker)
+
+    def __len__(self) -> int:
+        return len(self._points) // self._replicas
+
+    def add(self, worker: int) -> None:
+        for replica in range(self._replicas):
+            point = _hash(f"worker-{worker}-{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, worker)
+
+    def remove(self, worker: int) -> None:
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != worker]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def lookup(self, gameId: int) -> int:
+        if not self._points:
+            raise LookupError("The ring has no workers")
+        index = bisect.bisect(self._points, _hash(f"game-{gameId}")) % len(self._points)
+        return self._owners[index]
+
+
+def _transfer(server: GameServer, connection: Connection) -> None:
+    """Move a game off or onto the worker, as the router asked over the pipe."""
+    method, gameId, data = connection.recv()
+    try:
+        if method == "exportGame":
+            connection.send((server.exportGame(gameId), None))
+        else:
+            server.importGame(gameId, data)
+            connection.send((None, None))
+    except (KeyError, ValueError) as e:
+        connection.send((None, repr(e)))
+
+
+def _runWorker(connection: Connection, host: str, catalog: str) -> None:
+    attachCatalog(catalog)
+
+    async def serve() -> None:
+        server = GameServer()
+        tcp = await server.start(host, 0)
+        connection.send(tcp.sockets[0].getsockname()[1])
+        asyncio.get_running_loop().add_reader(connection.fileno(), _transfer, server, connection)
+        async with tcp:
+            await tcp.serve_forever()
+
+    asyncio.run(serve())
+
+
+class _Worker:
+    """A worker process and the router's private pipe to it."""
+
+    def __init__(self, index: int, process: BaseProcess, port: int, connection: Connection) -> None:
+        self.index = index
+        self.process = process
+        self.port = port
+        self._connection = connection
+        self._lock = asyncio.Lock()
+
+    def _exchange(self, request: tuple[str, int, Optional[bytes]]) -> tuple[Optional[bytes], Optional[str]]:
+        self._connection.send(request)
+        answer: tuple[Optional[bytes], Optional[str]] = self._connection.recv()
+        return answer
+
+    async def call(self, method: str, gameId: int, data: Optional[bytes] = None) -> Optional[bytes]:
+        """exportGame or importGame on the worker."""
+        async with self._lock:
+            result, error = await asyncio.get_running_loop().run_in_executor(
+                None, self._exchange, (method, gameId, data))
+        if error is not None:
+            raise RuntimeError(f"{method} of game {gameId} on worker {self.index}: {error}")
+        return result
+
+    async def close(self) -> None:
+        self.process.terminate()
+        await asyncio.get_running_loop().run_in_executor(None, self.process.join)
+        self._connection.close()
+
+
+class _Link:
+    """The connection of one client to one worker."""
+
+    def __init__(self, router: Router, client: _Client, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        self._router = router
+        self._client = client
+        self._writer = writer
+        # game of every request in flight and whether the client sees the answer, oldest first
+        self._pending: deque[tuple[Optional[int], bool]] = deque()
+        self._task = asyncio.get_running_loop().create_task(self._pump(reader))
+
+    def forward(self, line: bytes, gameId: Optional[int], visible: bool = True) -> None:
+        self._pending.append((gameId, visible))
+        self._router.started(gameId)
+        self._writer.write(line)
+
+    async def _pump(self, reader: asyncio.StreamReader) -> None:
+        while line := await reader.readline():
+            if line.startswith(b'{"event"'):
+                self._client.writer.write(line)
+                continue
+            gameId, visible = self._pending.popleft()
+            if visible:
+                self._client.writer.write(line)
+            self._router.finished(gameId)
+
+    def close(self) -> None:
+        self._writer.close()
+        self._task.cancel()
+        for gameId, _ in self._pending:
+            self._router.finished(gameId)
+        self._pending.clear()
+
+
+class _Client:
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.links: dict[int, _Link] = {}
+        self.subscriptions: set[tuple[int, Any]] = set()  # (game, player)
+
+
+class Router:
+    """Routes the requests of clients to worker processes by game id."""
+
+    def __init__(self, host: str = "127.0.0.1") -> None:
+        self._host = host
+        self._workers: dict[int, _Worker] = {}
+        self._ring = HashRing()
+        self._location: dict[int, int] = {}  # game -> worker
+        self._nextGameId = 0
+        self._moving: dict[int, asyncio.Event] = {}
+        self._inFlight: Counter[Optional[int]] = Counter()
+        self._drained: dict[int, asyncio.Event] = {}
+        self._clients: set[_Client] = set()
+        self._catalog = createCatalog()  # the cards of the games of all workers
+        self.created: Counter[int] = Counter()  # games created per worker
+        self.moved = 0  # games moved by rebalancing
+
+    @property
+    def workers(self) -> int:
+        return len(self._workers)
+
+    def workerOf(self, gameId: int) -> int:
+        return self._location[gameId]
+
+    async def _startWorker(self) -> _Worker:
+        index = max(self._workers, default=-1) + 1
+        context = multiprocessing.get_context()
+        parent, child = context.Pipe()
+        process = context.Process(target=_runWorker, args=(child, self._host, self._catalog.name), daemon=True)
+        process.start()
+        loop = asyncio.get_running_loop()
+        port: int = await loop.run_in_executor(None, parent.recv)
+        worker = _Worker(index, process, port, parent)
+        self._workers[index] = worker
+        return worker
+
+    async def addWorker(self) -> int:
+        """Start one more worker and move the games that hash to it; returns how many moved."""
+        worker = await self._startWorker()
+        self._ring.add(worker.index)
+        moving = [gameId for gameId, owner in self._location.items() if self._ring.lookup(gameId) != owner]
+        for gameId in moving:
+            await self._move(gameId, worker)
+        self.moved += len(moving)
+        return len(moving)
+
+    async def _move(self, gameId: int, target: _Worker) -> None:
+        done = self._moving[gameId] = asyncio.Event()
+        try:
+            while self._inFlight[gameId]:
+                drained = self._drained[gameId] = asyncio.Event()
+                await drained.wait()
+            source = self._workers[self._location[gameId]]
+            try:
+                data = await source.call("exportGame", gameId)
+            except RuntimeError:
+                # its creation failed or it was closed on the way
+                self._location.pop(gameId, None)
+                return
+            await target.call("importGame", gameId, data)
+            self._location[gameId] = target.index
+            for client in self._clients:
+                for game, playerId in client.subscriptions:
+                    if game == gameId:
+                        request = {"id": None, "method": "subscribe", "game": gameId, "params": {"playerId": playerId}}
+                        link = await self._link(client, target.index)
+                        link.forward(json.dumps(request).encode() + b"\n", gameId, visible=False)
+        finally:
+            del self._moving[gameId]
+            done.set()
+
+    def started(self, gameId: Optional[int]) -> None:
+        self._inFlight[gameId] += 1
+
+    def finished(self, gameId: Optional[int]) -> None:
+        self._inFlight[gameId] -= 1
+        if not self._inFlight[gameId]:
+            del self._inFlight[gameId]
+            if gameId is not None and gameId in self._drained:
+                self._drained.pop(gameId).set()
+
+    async def _link(self, client: _Client, worker: int) -> _Link:
+        link = client.links.get(worker)
+        if link is None:
+            reader, writer = await asyncio.open_connection(self._host, self._workers[worker].port, limit=1 << 24)
+            # another request may have opened one meanwhile
+            link = client.links.setdefault(worker, _Link(self, client, reader, writer))
+        return link
+
+    async def _gameLink(self, client: _Client, gameId: int, worker: int) -> _Link:
+        """Link to the worker of the game, which may start moving while the link is opened."""
+        link = await self._link(client, worker)
+        while gameId in self._moving or self._location.get(gameId, worker) != worker:
+            if gameId in self._moving:
+                await self._moving[gameId].wait()
+            else:
+                worker = self._location[gameId]
+                link = await self._link(client, worker)
+        return link
+
+    def _route(self, request: dict[str, Any]) -> tuple[Optional[int], Optional[bytes]]:
+        """Worker and rewritten line of a request; the line is None when it need not change."""
+        method = request.get("method")
+        if method == "createGame":
+            params = request.get("params")
+            if not isinstance(params, dict):
+                raise ValueError("'params' must be an object")
+            created = self._nextGameId
+            self._nextGameId += 1
+            self._location[created] = self._ring.lookup(created)
+            self.created[self._location[created]] += 1
+            request["params"] = {**params, "gameId": created}
+            request["game"] = created
+            return self._location[created], json.dumps(request).encode() + b"\n"
+        gameId = request.get("game")
+        if not isinstance(gameId, int) or gameId not in self._location:
+            return None, None
+        return self._location[gameId], None
+
+    async def handleConnection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = _Client(writer)
+        self._clients.add(client)
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                requestId: Any = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be a JSON object")
+                    requestId = request.get("id")
+                    gameId = request.get("game")
+                    while isinstance(gameId, int) and gameId in self._moving:
+                        await self._moving[gameId].wait()
+                    worker, rewritten = self._route(request)
+                except ValueError as e:
+                    writer.write(json.dumps({"id": requestId, "error": str(e)}).encode() + b"\n")
+                    continue
+                if worker is None:
+                    writer.write(json.dumps({"id": requestId, "error": f"Unknown game: {gameId!r}"}).encode() + b"\n")
+                    continue
+                method, routed = request.get("method"), int(request["game"])
+                link = await self._gameLink(client, routed, worker)
+                if method == "subscribe":
+                    client.subscriptions.add((routed, request.get("params", {}).get("playerId")))
+                link.forward(rewritten or line, routed)
+                if method == "closeGame":
+                    self._location.pop(routed, None)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(client)
+            for link in client.links.values():
+                link.close()
+            writer.close()
+
+    async def start(self, workers: int, host: str = "127.0.0.1", port: int = 8765) -> asyncio.Server:
+        for _ in range(workers):
+            worker = await self._startWorker()
+            self._ring.add(worker.index)
+        return await asyncio.start_server(self.handleConnection, host, port, limit=1 << 20)
+
+    async def close(self) -> None:
+        for worker in self._workers.values():
+            await worker.close()
+        self._workers = {}
+        self._catalog.close()
+
+
+async def benchmark(workers: int, games: int, connections: int, players: int) -> list[tuple[int, float]]:
+    """Requests per second of load_client with 1 to `workers` workers."""
+    rates: list[tuple[int, float]] = []
+    for count in range(1, workers + 1):
+        router = Router()
+        tcp = await router.start(count, port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        try:
+            async with tcp:
+                report = await runLoad("127.0.0.1", port, games, connections, players)
+        finally:
+            await router.close()
+        rates.append((count, len(report.latencies) / report.seconds))
+    return rates
+
+
+async def _serve(host: str, port: int, workers: int) -> None:
+    router = Router()
+    tcp = await router.start(workers, host, port)
+    async with tcp:
+        print(f"Terra Futura router listening on {host}:{port} with {workers} workers")
+        try:
+            await tcp.serve_forever()
+        finally:
+            await router.close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Host Terra Futura games on several worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--benchmark", action="store_true",
+                        help="measure request throughput with 1 to --workers workers instead of serving")
+    parser.add_argument("--games", type=int, default=400, help="games per benchmark run")
+    parser.add_argument("--connections", type=int, default=16, help="client connections per benchmark run")
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        rates = asyncio.run(benchmark(args.workers, args.games, args.connections, 2))
+        for count, rate in rates:
+            print(f"{count} workers: {rate:.0f} req/s ({rate / rates[0][1]:.2f}x)")
+        return
+    try:
+        asyncio.run(_serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Reversible records of Game actions.
+
+Game keeps one command per accepted action on its undo stack. A command
+holds the arguments of the action, so it can be redone, and exactly what
+the action changed, so undoing it costs as much as the change itself
+rather than a snapshot of the whole game. The same records let
+Game.submitTurn take back a batch of actions when one of them is rejected.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any
+from .activation_pattern import ActivationPattern
+from .grid import Grid
+from .interfaces import InterfaceCard, InterfacePile, InterfaceSelectReward
+from .journal import Journal
+from .scoring_method import ScoringMethod
+from .simple_types import GameState, GridPosition, Resource
+
+
+# Game methods that can be submitted as steps of a turn.
+TURN_METHODS = frozenset({
+    "takeCard",
+    "discardLastCardFromDeck",
+    "activateCard",
+    "selectReward",
+    "turnFinished",
+    "selectActivationPattern",
+    "selectScoring",
+})
+
+
+@dataclass(frozen=True)
+class TurnStep:
+    """One action of Game.submitTurn: a method of TURN_METHODS and its arguments."""
+    method: str
+    args: tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class GameFields:
+    """Turn bookkeeping of the game."""
+    state: GameState
+    onTurn: int
+    turnNumber: int
+    assistanceUsed: bool
+
+
+@dataclass(frozen=True)
+class GameCommand:
+    method: str            # Game method that performed the action
+    args: tuple[Any, ...]  # its arguments, to redo it
+    before: GameFields     # restored by Game on undo
+
+    def revert(self) -> None:
+        """Undo what the action changed outside the Game object."""
+
+
+@dataclass(frozen=True)
+class DiscardCardCommand(GameCommand):
+    pile: InterfacePile
+    card: InterfaceCard
+
+    def revert(self) -> None:
+        self.pile.returnLastCard(self.card)
+
+
+@dataclass(frozen=True)
+class TakeCardCommand(GameCommand):
+    pile: InterfacePile
+    index: int
+    card: InterfaceCard
+    grid: Grid
+    destination: GridPosition
+
+    def revert(self) -> None:
+        self.grid.removeCard(self.destination)
+        self.pile.returnCard(self.index, self.card)
+
+
+@dataclass(frozen=True)
+class ActivateCardCommand(GameCommand):
+    journal: Journal  # the card changes of the activation
+
+    def revert(self) -> None:
+        self.journal.rollback()
+
+
+@dataclass(frozen=True)
+class SelectRewardCommand(GameCommand):
+    selectReward: InterfaceSelectReward
+    resource: Resource
+
+    def revert(self) -> None:
+        self.selectReward.unselectReward(self.resource)
+
+
+@dataclass(frozen=True)
+class TurnFinishedCommand(GameCommand):
+    grid: Grid
+    activationMask: int
+
+    def revert(self) -> None:
+        self.grid.restoreActivations(self.activationMask)
+
+
+@dataclass(frozen=True)
+class SelectPatternCommand(GameCommand):
+    pattern: ActivationPattern
+    grid: Grid
+    activationMask: int
+
+    def revert(self) -> None:
+        self.pattern.deselect()
+        self.grid.restoreActivations(self.activationMask)
+
+
+@dataclass(frozen=True)
+class SelectScoringCommand(GameCommand):
+    scoringMethod: ScoringMethod
+
+    def revert(self) -> None:
+        self.scoringMethod.calculatedTotal = None
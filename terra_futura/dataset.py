@@ -0,0 +1,363 @@
+"""
+Sharded self-play datasets for training value networks.
+
+    python -m terra_futura.dataset --games 100000 --workers 8 --seed 1 \
+        --policies greedy,random --output data/
+
+Workers play self-play games (see simulate.makeTasks) and encode every
+position where a player makes a decision with features.FeatureEncoder, seen
+by that player, together with the final outcome for that player:
+
+    y[0]  1 for a win, 0.5 for a shared win, 0 for a loss
+    y[1]  final score less the best score of the other players
+
+The parent process feeds the positions through a shuffle buffer and writes
+them to fixed-size shards, `shard-00000.x.npy` holding a (shardRows,
+FEATURES) float32 array and `shard-00000.y.npy` a (shardRows, 2) one; only
+the last shard of a run may be smaller. The files are plain NumPy .npy
+files, written without NumPy.
+
+Memory stays constant however many games are played: a bounded number of
+games is in flight, the shuffle buffer has a fixed size and shards are
+streamed to disk. After every completed shard the run is checkpointed in
+progress.json (the games done, the rows of the open shard, the shuffle
+buffer and its random state); running the same command again after a crash
+resumes from the last checkpoint.
+"""
+from __future__ import annotations
+import argparse
+import ast
+import json
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import Any, BinaryIO, Iterator, Optional
+from .bots import BotPolicy, GameDriver, closePolicy, finalScores, loadPolicy
+from .catalog import processCatalog
+from .factories import GameFactory
+from .features import FEATURES, FeatureEncoder
+from .simple_types import GameState
+from .simulate import SimulationTask, makeTasks, runChunks
+
+OUTCOMES = 2
+_MAGIC = b"\x93NUMPY\x01\x00"
+# fixed header size, so the shape of a shard can be rewritten in place
+_HEADER_SIZE = 128
+_FLOAT = 4
+
+
+def npyHeader(shape: tuple[int, ...]) -> bytes:
+    """Header of a little endian float32 .npy file (format version 1.0) of the given shape."""
+    described = "{'descr': '<f4', 'fortran_order': False, 'shape': (%s), }" % \
+        "".join(f"{size}, " for size in shape).rstrip(" ")
+    padding = _HEADER_SIZE - len(_MAGIC) - 2 - len(described) - 1
+    if padding < 0:
+        raise ValueError(f"Shape {shape} does not fit the header")
+    return _MAGIC + struct.pack("<H", _HEADER_SIZE - len(_MAGIC) - 2) + described.encode() + b" " * padding + b"\n"
+
+
+def readNpy(path: str) -> tuple[tuple[int, ...], array[float]]:
+    """Shape and values of a float32 .npy file written by this module."""
+    with open(path, "rb") as file:
+        if file.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{path} is not a version 1.0 .npy file")
+        (length,) = struct.unpack("<H", file.read(2))
+        header = ast.literal_eval(file.read(length).decode())
+        if header["descr"] != "<f4" or header["fortran_order"]:
+            raise ValueError(f"{path} does not hold a C-ordered float32 array")
+        values: array[float] = array("f")
+        values.frombytes(file.read())
+    if sys.byteorder != "little":
+        values.byteswap()
+    shape: tuple[int, ...] = header["shape"]
+    return shape, values
+
+
+def _floats(values: list[float]) -> bytes:
+    packed = array("f", values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def playPositions(task: SimulationTask) -> tuple[bytes, bytes]:
+    """
+    Play one game and encode every decision position with its outcome, as
+    little endian float32 rows of FEATURES and OUTCOMES values.
+    """
+    playerIds = list(range(1, len(task.policies) + 1))
+    game = GameFactory(task.seed, catalog=processCatalog()).createGame(playerIds)
+    policies: dict[int, BotPolicy] = {
+        playerId: loadPolicy(spec)(task.seed + playerId) for playerId, spec in zip(playerIds, task.policies)
+    }
+    encoder = FeatureEncoder()
+    features: array[float] = array("f")
+    seen: list[int] = []
+    driver = GameDriver(game)
+    try:
+        while game.state != GameState.Finish:
+            playerId = game.onTurn()
+            encoder.encodeInto(features, game, playerId)
+            seen.append(playerId)
+            driver.step(policies[playerId])
+    finally:
+        for policy in policies.values():
+            closePolicy(policy)
+    scores = finalScores(game)
+    outcomes: list[float] = []
+    for playerId in seen:
+        best = max(score for other, score in scores.items() if other != playerId)
+        if scores[playerId] > best:
+            outcomes += [1.0, scores[playerId] - best]
+        else:
+            outcomes += [0.5 if scores[playerId] == best else 0.0, scores[playerId] - best]
+    if sys.byteorder != "little":
+        features.byteswap()
+    return features.tobytes(), _floats(outcomes)
+
+
+def _playChunk(tasks: list[SimulationTask]) -> list[tuple[bytes, bytes]]:
+    return [playPositions(task) for task in tasks]
+
+
+@dataclass(frozen=True)
+class DatasetConfig:
+    games: int
+    seed: int
+    policies: tuple[str, ...]
+    players: int
+    shardRows: int = 4096
+    bufferRows: int = 4096
+
+
+class _ShardWriter:
+    """Writes rows into numbered pairs of .npy shards of shardRows rows."""
+
+    def __init__(self, directory: str, shardRows: int, shards: int = 0, openRows: int = 0) -> None:
+        self._directory = directory
+        self._shardRows = shardRows
+        self.shards = shards      # completed shards
+        self.openRows = openRows  # rows of the shard being written
+        self._files: Optional[tuple[BinaryIO, BinaryIO]] = None
+        if openRows:
+            self._reopen()
+
+    def _path(self, shard: int, part: str) -> str:
+        return os.path.join(self._directory, f"shard-{shard:05d}.{part}.npy")
+
+    def _open(self) -> None:
+        files = []
+        for part, columns in (("x", FEATURES), ("y", OUTCOMES)):
+            file = open(self._path(self.shards, part) + ".tmp", "wb")
+            file.write(npyHeader((self._shardRows, columns)))
+            files.append(file)
+        self._files = (files[0], files[1])
+
+    def _reopen(self) -> None:
+        files = []
+        for part, columns in (("x", FEATURES), ("y", OUTCOMES)):
+            path = self._path(self.shards, part)
+            if not os.path.exists(path + ".tmp"):
+                # the shard was completed after the checkpoint
+                os.replace(path, path + ".tmp")
+            file = open(path + ".tmp", "r+b")
+            file.write(npyHeader((self._shardRows, columns)))
+            file.truncate(_HEADER_SIZE + self.openRows * columns * _FLOAT)
+            file.seek(0, os.SEEK_END)
+            files.append(file)
+        self._files = (files[0], files[1])
+
+    def write(self, x: bytes, y: bytes) -> bool:
+        """Append one row; True when it completed a shard."""
+        if self._files is None:
+            self._open()
+        assert self._files is not None
+        self._files[0].write(x)
+        self._files[1].write(y)
+        self.openRows += 1
+        if self.openRows < self._shardRows:
+            return False
+        self._complete()
+        return True
+
+    def _complete(self) -> None:
+        assert self._files is not None
+        for file, part in zip(self._files, ("x", "y")):
+            file.close()
+            os.replace(self._path(self.shards, part) + ".tmp", self._path(self.shards, part))
+        self._files = None
+        self.shards += 1
+        self.openRows = 0
+
+    def sync(self) -> None:
+        if self._files is not None:
+            for file in self._files:
+                file.flush()
+                os.fsync(file.fileno())
+
+    def finish(self) -> None:
+        """Complete the open shard with the rows it has."""
+        if self._files is None:
+            return
+        for file, columns in zip(self._files, (FEATURES, OUTCOMES)):
+            file.seek(0)
+            file.write(npyHeader((self.openRows, columns)))
+        self._complete()
+
+
+class DatasetWriter:
+    """
+    Shuffles rows through a buffer of bufferRows rows into shards, and
+    checkpoints the run in `directory`.
+    """
+
+    def __init__(self, directory: str, config: DatasetConfig) -> None:
+        self._directory = directory
+        self._config = config
+        self._buffer: list[tuple[bytes, bytes]] = []
+        self._random = random.Random(config.seed)
+        self.nextGame = 0  # games before it are in the shards or the buffer
+        self._checkpointDue = False
+        progress = self._load()
+        if progress is None:
+            self._shards = _ShardWriter(directory, config.shardRows)
+        else:
+            self._shards = _ShardWriter(directory, config.shardRows, progress["shards"], progress["openRows"])
+
+    @property
+    def shards(self) -> int:
+        return self._shards.shards
+
+    def _progressPath(self) -> str:
+        return os.path.join(self._directory, "progress.json")
+
+    def _bufferPath(self, part: str) -> str:
+        return os.path.join(self._directory, f"buffer.{part}.npy")
+
+    def _load(self) -> Optional[dict[str, Any]]:
+        try:
+            with open(self._progressPath(), encoding="utf-8") as file:
+                progress: dict[str, Any] = json.load(file)
+        except FileNotFoundError:
+            return None
+        if progress["config"] != json.loads(json.dumps(asdict(self._config))):
+            raise ValueError(f"{self._directory} holds a dataset of other games: {progress['config']}")
+        self.nextGame = progress["nextGame"]
+        version, state, gauss = progress["random"]
+        self._random.setstate((version, tuple(state), gauss))
+        rows = progress["bufferRows"]
+        if rows:
+            _, x = readNpy(self._bufferPath("x"))
+            _, y = readNpy(self._bufferPath("y"))
+            if sys.byteorder != "little":
+                x.byteswap()
+                y.byteswap()
+            xBytes, yBytes = x.tobytes(), y.tobytes()
+            xSize, ySize = FEATURES * _FLOAT, OUTCOMES * _FLOAT
+            self._buffer = [(xBytes[i * xSize:(i + 1) * xSize], yBytes[i * ySize:(i + 1) * ySize]) for i in range(rows)]
+        return progress
+
+    def _emit(self, x: bytes, y: bytes) -> None:
+        if self._shards.write(x, y):
+            self._checkpointDue = True
+
+    def addGame(self, x: bytes, y: bytes) -> None:
+        """Add the rows of game nextGame."""
+        xSize, ySize = FEATURES * _FLOAT, OUTCOMES * _FLOAT
+        for row in range(len(y) // ySize):
+            item = (x[row * xSize:(row + 1) * xSize], y[row * ySize:(row + 1) * ySize])
+            if len(self._buffer) < self._config.bufferRows:
+                self._buffer.append(item)
+                continue
+            index = self._random.randrange(len(self._buffer))
+            self._emit(*self._buffer[index])
+            self._buffer[index] = item
+        self.nextGame += 1
+        if self._checkpointDue:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Make the games added so far survive a crash."""
+        self._shards.sync()
+        for part, index, columns in (("x", 0, FEATURES), ("y", 1, OUTCOMES)):
+            path = self._bufferPath(part)
+            with open(path + ".tmp", "wb") as file:
+                file.write(npyHeader((len(self._buffer), columns)))
+                file.write(b"".join(item[index] for item in self._buffer))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(path + ".tmp", path)
+        version, state, gauss = self._random.getstate()
+        progress = {
+            "config": asdict(self._config),
+            "nextGame": self.nextGame,
+            "shards": self._shards.shards,
+            "openRows": self._shards.openRows,
+            "bufferRows": len(self._buffer),
+            "random": [version, list(state), gauss],
+        }
+        with open(self._progressPath() + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(progress, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self._progressPath() + ".tmp", self._progressPath())
+        self._checkpointDue = False
+
+    def finish(self) -> None:
+        """Drain the buffer in random order and complete the last shard."""
+        self._random.shuffle(self._buffer)
+        for item in self._buffer:
+            self._shards.write(*item)
+        self._buffer = []
+        self._shards.finish()
+        self.checkpoint()
+
+
+def generateDataset(directory: str, config: DatasetConfig, workers: int, chunkSize: int = 4) -> DatasetWriter:
+    """Play the games of `config` that are not in `directory` yet and write their positions."""
+    os.makedirs(directory, exist_ok=True)
+    writer = DatasetWriter(directory, config)
+    tasks: Iterator[SimulationTask] = islice(
+        makeTasks(config.games, config.seed, list(config.policies), config.players), writer.nextGame, None)
+    # results are added in game order, so a checkpoint is a prefix of the games
+    done: dict[int, tuple[bytes, bytes]] = {}
+    start = writer.nextGame
+    for first, results in runChunks(_playChunk, tasks, workers, chunkSize):
+        for offset, rows in enumerate(results):
+            done[start + first + offset] = rows
+        while writer.nextGame in done:
+            writer.addGame(*done.pop(writer.nextGame))
+    writer.finish()
+    return writer
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a sharded self-play dataset of encoded positions.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--players", type=int, default=2, choices=range(2, 5))
+    parser.add_argument("--policies", default="greedy",
+                        help="comma separated policy names or module:Class paths, assigned to seats in turn")
+    parser.add_argument("--shard-rows", type=int, default=4096)
+    parser.add_argument("--buffer-rows", type=int, default=4096, help="size of the shuffle buffer")
+    parser.add_argument("--output", required=True, help="directory of the shards")
+    args = parser.parse_args(argv)
+
+    policies = tuple(args.policies.split(","))
+    for spec in policies:
+        loadPolicy(spec)  # fail early on unknown policies
+    config = DatasetConfig(args.games, args.seed, policies, args.players, args.shard_rows, args.buffer_rows)
+    start = time.perf_counter()
+    writer = generateDataset(args.output, config, args.workers)
+    seconds = time.perf_counter() - start
+    print(f"{config.games} games, {writer.shards} shards in {seconds:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+Exact solver for the final round.
+
+After the ninth turn every player selects one of their two activation
+patterns, activates the cards of the pattern (each at most once, in any
+order, each with any of its effect options and any way to pay) and then
+selects one of their two scoring methods. solveEndgame searches all of these
+choices on a compact model of the grid, memoizing (grid contents, cards left
+to activate), and returns the best score with the line that achieves it.
+
+The model follows ProcessAction: pollution is placed first, then inputs are
+paid and outputs put on the activated card, so none of the cards an
+activation uses may be deactivated by its own pollution. Pollution goes on
+cards where it keeps them active for as long as there is such room anywhere
+on the grid; only then the solver chooses which unused cards it
+deactivates. With that rule the exact cards polluted do not matter, only
+the total room left, which keeps the search small. Scores are those
+ScoringMethod.calculate would report.
+"""
+from __future__ import annotations
+import operator
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterator, Optional, Sequence
+from .arbitrary_basic import ArbitraryBasic
+from .bots import Activation, GreedyBot, cardOptions, getPlayer, patternActivations
+from .game import Game
+from .grid import GRID_POSITIONS
+from .interfaces import InterfaceCard, InterfaceGrid
+from .payments import distribute
+from .player import Player
+from .scoring_method import BASE_SCORES, ScoringMethod
+from .simple_types import GridPosition, Resource
+from .transformation_fixed import TransformationFixed
+
+_RESOURCES = list(Resource)
+_INDEX = {resource: i for i, resource in enumerate(_RESOURCES)}
+_BASES = [BASE_SCORES[resource] for resource in _RESOURCES]
+
+# resource counts of every card, None for empty cells and inactive cards,
+# and the pollution that still fits on the grid without deactivating a card
+_State = tuple[tuple[Optional[tuple[int, ...]], ...], int]
+# see _Model.key
+_Key = tuple[object, ...]
+# (cell index, resource index, amount)
+_Transfer = tuple[tuple[int, int, int], ...]
+# acting cell index, effect option, payment and cells deactivated by pollution
+_Step = tuple[int, "TransformationFixed | ArbitraryBasic", _Transfer, tuple[int, ...]]
+
+
+@dataclass(frozen=True)
+class EndgameSolution:
+    score: int
+    pattern: int
+    scoring: int
+    activations: list[Activation]
+
+
+def _counts(resources: list[Resource]) -> tuple[int, ...]:
+    counts = [0] * len(_RESOURCES)
+    for resource in resources:
+        counts[_INDEX[resource]] += 1
+    return tuple(counts)
+
+
+def _freeSlots(card: InterfaceCard) -> int:
+    slots = 0
+    while card.canPlacePollution(slots + 1):
+        slots += 1
+    return slots
+
+
+class _Model:
+    """Static part of the grid: cards, effect options and score weights."""
+
+    def __init__(self, grid: InterfaceGrid, scoringMethods: list[ScoringMethod]) -> None:
+        self.positions = GRID_POSITIONS
+        self.cards: list[Optional[InterfaceCard]] = [grid.getCard(p) for p in self.positions]
+        self.options: list[list[TransformationFixed | ArbitraryBasic]] = [
+            [o for o in cardOptions(card) if isinstance(o, (TransformationFixed, ArbitraryBasic))] if card else []
+            for card in self.cards]
+        # ScoringMethod visits every position from -2 to 2, which on the 3x3
+        # grid reaches some cards more than once
+        everywhere = [grid.getCard(GridPosition(x, y)) for x in range(-2, 3) for y in range(-2, 3)]
+        self.weights = [sum(1 for other in everywhere if card is not None and other is card)
+                        for card in self.cards]
+        self.scorings = scoringMethods
+        self.occupied = [i for i, card in enumerate(self.cards) if card is not None]
+        self.forced = [self._forced(options) for options in self.options]
+        self.pollution = [max((o.pollution for o in options), default=0) for options in self.options]
+        # cells by weight, lightest first, to pay from once settled
+        self._payers = sorted(self.occupied, key=lambda i: (self.weights[i], i))
+        self._combinations = [([(_INDEX[r], n) for r, n in Counter(method.resources).items()],
+                               method.pointsPerCombination.value) for method in scoringMethods]
+        # for the bound: per card, (base score produced, fixed cost, arbitrary count, pollution) of
+        # every option, and the most of each resource any option produces
+        self._gains = [[(sum(BASE_SCORES[r] for r in o.to),
+                         sum(BASE_SCORES[r] for r in o.from_) if isinstance(o, TransformationFixed) else 0,
+                         o.from_ if isinstance(o, ArbitraryBasic) else 0, o.pollution) for o in options]
+                       for options in self.options]
+        self._most = [[max((_counts(o.to)[r] for o in options), default=0) for r in range(len(_RESOURCES))]
+                      for options in self.options]
+        self._scores: dict[_State, tuple[int, int]] = {}
+        self._evaluated: dict[_State, tuple[tuple[int, ...], int]] = {}
+
+    @staticmethod
+    def _forced(options: list[TransformationFixed | ArbitraryBasic]) -> Optional[TransformationFixed]:
+        """
+        An option that costs nothing, pollutes nothing and produces at least
+        what every other option does. Resources never lower the score, so the
+        card is best activated with it right away.
+        """
+        for option in options:
+            if (isinstance(option, TransformationFixed) and not option.from_ and not option.pollution
+                    and all(not Counter(other.to) - Counter(option.to) for other in options)):
+                return option
+        return None
+
+    def settled(self, room: int, left: frozenset[int]) -> bool:
+        """
+        Whether the room left takes all pollution the cards in `left` may
+        produce, so that no card is deactivated any more. From then on
+        payments, outputs and scores treat cards of the same weight alike.
+        """
+        return room >= sum(self.pollution[i] for i in left)
+
+    def key(self, state: _State, left: frozenset[int]) -> _Key:
+        """
+        Memo key of a state: cards that will not be activated any more are
+        told apart by their weight only, as scoring, payments and pollution
+        treat cards of the same weight alike. Once settled, the resources of
+        all cards of a weight are pooled.
+        """
+        cells, room = state
+        if self.settled(room, left):
+            pools: dict[int, list[int]] = {}
+            for i in self.occupied:
+                cell = cells[i]
+                if cell is not None:
+                    pool = pools.setdefault(self.weights[i], [0] * len(_RESOURCES))
+                    for r, count in enumerate(cell):
+                        pool[r] += count
+            return (tuple(cells[i] is None for i in self.occupied),
+                    tuple((weight, tuple(pool)) for weight, pool in sorted(pools.items())), room, left)
+        acting: list[Optional[tuple[int, ...]]] = []
+        done: dict[int, list[tuple[int, ...]]] = {}
+        for i in self.occupied:
+            cell = cells[i]
+            if i in left:
+                acting.append(cell)
+            else:
+                # inactive cards sort before all active ones
+                done.setdefault(self.weights[i], []).append((-1,) if cell is None else cell)
+        return (tuple(acting), tuple((weight, tuple(sorted(group))) for weight, group in sorted(done.items())),
+                room, left)
+
+    def state(self) -> _State:
+        cells: list[Optional[tuple[int, ...]]] = []
+        room = 0
+        for card in self.cards:
+            if card is None or not card.isActive():
+                cells.append(None)
+            else:
+                cells.append(_counts(card.resources))
+                # the last free slot deactivates the card
+                room += max(0, _freeSlots(card) - 1)
+        return tuple(cells), room
+
+    def _totals(self, state: _State) -> tuple[tuple[int, ...], int]:
+        """Weighted resource counts on active cards, and their base score less the penalty for inactive ones."""
+        cached = self._evaluated.get(state)
+        if cached is None:
+            totals = [0] * len(_RESOURCES)
+            penalty = 0
+            cells = state[0]
+            for i in self.occupied:
+                cell, weight = cells[i], self.weights[i]
+                if cell is None:
+                    penalty -= weight
+                else:
+                    for r, count in enumerate(cell):
+                        if count:
+                            totals[r] += count * weight
+            cached = self._evaluated[state] = (tuple(totals), penalty + sum(map(operator.mul, _BASES, totals)))
+        return cached
+
+    def _best(self, totals: Sequence[int], base: int) -> tuple[int, int]:
+        best = (0, -1)
+        for index, (combination, points) in enumerate(self._combinations):
+            m = min((totals[r] // n for r, n in combination), default=9999)
+            if best[1] == -1 or base + m * points > best[0]:
+                best = (base + m * points, index)
+        return best
+
+    def score(self, state: _State) -> tuple[int, int]:
+        """Best (points, scoring method index) of the state."""
+        cached = self._scores.get(state)
+        if cached is None:
+            cached = self._scores[state] = self._best(*self._totals(state))
+        return cached
+
+    def bound(self, state: _State, left: frozenset[int]) -> int:
+        """
+        Upper bound of the score reachable by activating the cards in `left`.
+        Each card adds at most the best base score gain of its options, paid
+        with the cheapest resources on the lightest cell, and at most the most
+        of each resource any option produces. Pollution only lowers the score:
+        once the room is used up, every unit deactivates a card, which loses
+        at least the weight of the lightest one.
+        """
+        cells = state[0]
+        if not left:
+            return self.score(state)[0]
+        active = [i for i in self.occupied if cells[i] is not None]
+        if not active:
+            return self.score(state)[0]
+        held, base = self._totals(state)
+        totals = list(held)
+        lightest = min(self.weights[i] for i in active)
+        cheapest = min((_BASES[r] for r, total in enumerate(held) if total), default=0)
+        gains, polluting = 0, lightest * state[1]
+        for i in left:
+            if cells[i] is None:
+                continue
+            weight = self.weights[i]
+            options = [(produced * weight - (fixed + arbitrary * cheapest) * lightest, pollution)
+                       for produced, fixed, arbitrary, pollution in self._gains[i]]
+            gains += max(0, max((gain for gain, _ in options), default=0))
+            polluting += max(0, max((gain - pollution * lightest for gain, pollution in options), default=0))
+            for r, n in enumerate(self._most[i]):
+                totals[r] += n * weight
+        return self._best(totals, base + min(gains, polluting))[0]
+
+    def _payments(self, cells: tuple[Optional[tuple[int, ...]], ...],
+                  option: TransformationFixed | ArbitraryBasic, settled: bool) -> Iterator[_Transfer]:
+        if settled:
+            yield from self._pooledPayments(cells, option)
+            return
+        held = [(i, r, count) for i, cell in enumerate(cells) if cell is not None
+                for r, count in enumerate(cell) if count]
+        if isinstance(option, TransformationFixed):
+            needed = Counter(_INDEX[r] for r in option.from_)
+
+            def fixed(resources: list[int]) -> Iterator[_Transfer]:
+                if not resources:
+                    yield ()
+                    return
+                r = resources[0]
+                sources = [(i, count) for i, res, count in held if res == r]
+                for split in distribute(needed[r], sources):
+                    for rest in fixed(resources[1:]):
+                        yield tuple((i, r, n) for i, n in split) + rest
+
+            yield from fixed(sorted(needed))
+        else:
+            for split in distribute(option.from_, [((i, r), count) for i, r, count in held]):
+                yield tuple((i, r, n) for (i, r), n in split)
+
+    def _pooledPayments(self, cells: tuple[Optional[tuple[int, ...]], ...],
+                        option: TransformationFixed | ArbitraryBasic) -> Iterator[_Transfer]:
+        """
+        Payments once settled: only which resources are paid matters, and
+        each is best taken from the lightest cards holding it, which keeps
+        the heavier ones scoring.
+        """
+        available = [0] * len(_RESOURCES)
+        for i in self._payers:
+            for r, count in enumerate(cells[i] or ()):
+                available[r] += count
+        if isinstance(option, TransformationFixed):
+            splits: Iterator[list[tuple[int, int]]] = iter([list(Counter(_INDEX[r] for r in option.from_).items())])
+        else:
+            splits = distribute(option.from_, [(r, count) for r, count in enumerate(available) if count])
+        for split in splits:
+            transfer: list[tuple[int, int, int]] = []
+            for r, needed in split:
+                if needed > available[r]:
+                    break
+                for i in self._payers:
+                    held = (cells[i] or ())[r:r + 1]
+                    if needed and held and held[0]:
+                        taken = min(needed, held[0])
+                        transfer.append((i, r, taken))
+                        needed -= taken
+            else:
+                yield tuple(transfer)
+
+    def _worstVictims(self, cells: tuple[Optional[tuple[int, ...]], ...], victims: tuple[int, ...],
+                      unused: list[int], rest: frozenset[int]) -> bool:
+        """
+        Whether no card that will not act again could be deactivated instead of
+        such a victim at a lower cost. Sparing a card of no more weight and
+        no more resources of any kind is never better: the spared card can
+        stand in for the other one for the rest of the round.
+        """
+        def cheaper(i: int, j: int) -> bool:
+            ci, cj = cells[i] or (), cells[j] or ()
+            return (self.weights[i] <= self.weights[j] and all(a <= b for a, b in zip(ci, cj))
+                    and (self.weights[i] < self.weights[j] or ci != cj or i < j))
+
+        spared = [i for i in unused if i not in victims and i not in rest]
+        return not any(cheaper(i, j) for j in victims if j not in rest for i in spared)
+
+    def transitions(self, state: _State, acting: int, rest: frozenset[int]) -> Iterator[tuple[_State, _Step]]:
+        """Every distinct legal activation of the card at index `acting`, with `rest` left to activate after it."""
+        cells, room = state
+        if cells[acting] is None:
+            return
+        seen: set[_State] = set()
+        settled = self.settled(room, rest | {acting})
+        for option in self.options[acting]:
+            produced = _counts(option.to)
+            for payment in self._payments(cells, option, settled):
+                paid = list(cells)
+                for i, r, n in payment:
+                    counts = list(paid[i] or ())
+                    counts[r] -= n
+                    paid[i] = tuple(counts)
+                paid[acting] = tuple(map(operator.add, paid[acting] or (), produced))
+
+                if option.pollution <= room:
+                    deactivations: list[tuple[int, ...]] = [()]
+                else:
+                    used = {i for i, _, _ in payment} | {acting}
+                    unused = [i for i, cell in enumerate(cells) if cell is not None and i not in used]
+                    deactivations = [victims for victims in (tuple(i for i, _ in chosen) for chosen in
+                                     distribute(option.pollution - room, [(i, 1) for i in unused]))
+                                     if self._worstVictims(cells, victims, unused, rest)]
+                for deactivated in deactivations:
+                    result = list(paid)
+                    for i in deactivated:
+                        result[i] = None
+                    nextState = (tuple(result), room - option.pollution + len(deactivated))
+                    if nextState not in seen:
+                        seen.add(nextState)
+                        yield nextState, (acting, option, payment, deactivated)
+
+    def activation(self, step: _Step, free: list[int]) -> Activation:
+        """Concrete activation of a step; `free` holds the free pollution slots of every cell and is updated."""
+        acting, option, payment, deactivated = step
+        position = self.positions[acting]
+        inputs = tuple((_RESOURCES[r], self.positions[i]) for i, r, n in payment for _ in range(n))
+        outputs = tuple((resource, position) for resource in option.to)
+        pollution: list[GridPosition] = []
+        for i in deactivated:
+            pollution += [self.positions[i]] * free[i]
+            free[i] = 0
+        while len(pollution) < option.pollution:
+            i = max(range(len(free)), key=lambda j: free[j])
+            pollution.append(self.positions[i])
+            free[i] -= 1
+        return Activation(position, inputs, outputs, tuple(pollution))
+
+
+def _cellIndex(position: GridPosition) -> int:
+    """Index in GRID_POSITIONS of the cell the grid maps `position` to."""
+    return GRID_POSITIONS.index(GridPosition((position.x + 1) % 3 - 1, (position.y + 1) % 3 - 1))
+
+
+class _Solver:
+    def __init__(self, model: _Model) -> None:
+        self.model = model
+        self.memo: dict[_Key, tuple[int, bool]] = {}  # best score, or a bound of it if not exact
+
+    def children(self, state: _State, left: frozenset[int]) -> list[tuple[_State, _Step, frozenset[int], _Key]]:
+        """Activations of the cards in `left`, one per distinct outcome with its memo key, most promising first."""
+        model = self.model
+        for acting in left:
+            forced = model.forced[acting]
+            if forced is not None and state[0][acting] is not None:
+                rest = left - {acting}
+                nextState, step = next(child for child in model.transitions(state, acting, rest) if child[1][1] is forced)
+                return [(nextState, step, rest, model.key(nextState, rest))]
+        children = {}
+        for acting in left:
+            rest = left - {acting}
+            for nextState, step in model.transitions(state, acting, rest):
+                key = model.key(nextState, rest)
+                if key not in children:
+                    children[key] = (nextState, step, rest, key)
+        ordered = list(children.values())
+        # promising children first, so that the bound prunes more of the rest
+        ordered.sort(key=lambda child: model.score(child[0])[0], reverse=True)
+        return ordered
+
+    def best(self, state: _State, left: frozenset[int], floor: int = -(1 << 30), key: Optional[_Key] = None) -> int:
+        """
+        The best score reachable, if it is above `floor`; otherwise at most
+        `floor`. Lines that cannot beat the floor are not searched.
+        """
+        if key is None:
+            key = self.model.key(state, left)
+        cached = self.memo.get(key)
+        if cached is not None:
+            value, exact = cached
+            if exact or value <= floor:
+                return value
+        value = self.model.score(state)[0]
+        ceiling = self.model.bound(state, left)
+        for nextState, _, rest, childKey in self.children(state, left):
+            if value >= ceiling:
+                break
+            # skipping children that cannot beat `value` or `floor` keeps a value above the floor exact
+            cached = self.memo.get(childKey)
+            if cached is not None and not cached[1] and cached[0] <= max(value, floor):
+                continue
+            if self.model.bound(nextState, rest) <= max(value, floor):
+                continue
+            value = max(value, self.best(nextState, rest, max(value, floor), childKey))
+        self.memo[key] = (value, True) if value > floor else (floor, False)
+        return value
+
+    def line(self, state: _State, left: frozenset[int]) -> tuple[_State, list[Activation]]:
+        free = [_freeSlots(card) if card is not None else 0 for card in self.model.cards]
+        activations: list[Activation] = []
+        while True:
+            value = self.best(state, left)
+            if self.model.score(state)[0] == value:
+                return state, activations
+            # the memo holds symmetric states, so follow any child that reaches the value
+            state, step, left, _ = next(child for child in self.children(state, left)
+                                        if self.model.bound(child[0], child[2]) >= value
+                                        and self.best(child[0], child[2], value - 1, child[3]) == value)
+            activations.append(self.model.activation(step, free))
+
+
+def solveActivations(grid: InterfaceGrid, positions: list[GridPosition],
+                     scoringMethods: list[ScoringMethod]) -> tuple[int, int, list[Activation]]:
+    """Best (score, scoring method index, activations) when the cards at `positions` may be activated."""
+    model = _Model(grid, scoringMethods)
+    solver = _Solver(model)
+    left = frozenset(_cellIndex(p) for p in positions)
+    final, activations = solver.line(model.state(), left)
+    score, scoring = model.score(final)
+    return score, scoring, activations
+
+
+def solveEndgame(player: Player) -> EndgameSolution:
+    """Best pattern, activations and scoring method of a player entering the final round."""
+    model = _Model(player.grid, player.scoring_methods)
+    solver = _Solver(model)
+    start = model.state()
+    best, chosen, chosenLeft = 0, -1, frozenset[int]()
+    for index, pattern in enumerate(player.activation_patterns):
+        left = frozenset(_cellIndex(p) for p in patternActivations(player.grid, pattern.pattern))
+        # a later pattern only needs searching as far as it beats the earlier ones
+        score = solver.best(start, left) if chosen < 0 else solver.best(start, left, best)
+        if chosen < 0 or score > best:
+            best, chosen, chosenLeft = score, index, left
+    assert chosen >= 0
+    final, activations = solver.line(start, chosenLeft)
+    score, scoring = model.score(final)
+    return EndgameSolution(score, chosen, scoring, activations)
+
+
+class EndgameBot(GreedyBot):
+    """Greedy during the regular turns, plays the final round with the exact solver."""
+
+    def __init__(self, seed: int = 0) -> None:
+        super().__init__(seed)
+        self._line: Optional[list[Activation]] = None
+
+    def choosePattern(self, game: Game, playerId: int) -> int:
+        solution = solveEndgame(getPlayer(game, playerId))
+        self._line = solution.activations.copy()
+        return solution.pattern
+
+    def chooseActivation(self, game: Game, playerId: int,
+                         positions: list[GridPosition]) -> Optional[Activation]:
+        if self._line is None:
+            return super().chooseActivation(game, playerId, positions)
+        return self._line.pop(0) if self._line else None
+
+    def chooseScoring(self, game: Game, playerId: int) -> int:
+        player = getPlayer(game, playerId)
+        return solveActivations(player.grid, [], player.scoring_methods)[1]
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import random
+from typing import Optional
+from itertools import permutations
+from .activation_pattern import ActivationPattern
+from .card import Card
+from .catalog import ARBITRARY, EITHER, FIXED, CardCatalog, CardSignature, EffectSignature, buildEffect
+from .game import Game
+from .game_observer import GameObserver
+from .grid import Grid, GRID_POSITIONS
+from .interfaces import GameObserverInterface, InterfaceCard, InterfacePile
+from .move_card import MoveCard
+from .pile import Pile
+from .player import Player
+from .process_action import ProcessAction
+from .process_action_assistance import ProcessActionAssistance
+from .scoring_method import ScoringMethod
+from .select_reward import SelectReward
+from .simple_types import Deck, Points, Resource
+
+RAW_RESOURCES = [Resource.YELLOW, Resource.RED, Resource.GREEN]
+PRODUCTS = [Resource.GOODS, Resource.FOOD, Resource.CONSTRUCTION]
+
+
+def catalogCards() -> list[CardSignature]:
+    """Every card GameFactory can deal, for a CardCatalog."""
+    levelI = ([(FIXED, (), (raw,), 0) for raw in RAW_RESOURCES]
+              + [(FIXED, (), pair, 1) for pair in permutations(RAW_RESOURCES, 2)]
+              + [(FIXED, (raw,), (product,), pollution)
+                 for raw in RAW_RESOURCES for product in PRODUCTS for pollution in (0, 1)])
+    lowers: list[Optional[EffectSignature]] = [None] + [(ARBITRARY, 1, (raw,), 0) for raw in RAW_RESOURCES]
+    levelII = ([(FIXED, paid, gained, 1)
+                for paid in permutations(RAW_RESOURCES, 2) for gained in permutations(PRODUCTS, 2)]
+               + [(ARBITRARY, count, (product,), pollution)
+                  for count in (2, 3) for product in PRODUCTS for pollution in (0, 1)]
+               + [(EITHER, (FIXED, (raw,), (product,), 0), (FIXED, (paid,), (gained, Resource.MONEY), 1))
+                  for raw in RAW_RESOURCES for product in PRODUCTS for paid in PRODUCTS for gained in PRODUCTS])
+    return ([(spaces, upper, lower) for spaces in (1, 2, 3) for upper in levelI for lower in lowers]
+            + [(spaces, upper, None) for spaces in (1, 2) for upper in levelII])
+
+
+def createCatalog(name: Optional[str] = None) -> CardCatalog:
+    """A shared catalog of the cards of catalogCards, for the workers of a process pool."""
+    return CardCatalog.create(catalogCards(), name)
+
+
+class GameFactory:
+    """
+    Builds complete, playable games from a seed.
+
+    The same seed always produces the same decks, activation patterns and
+    scoring methods, so hosted games, simulations and tests are reproducible.
+    Players start with an empty grid: the grid has exactly nine cells and the
+    game has exactly nine turns, so every turn places one card.
+    """
+
+    _random: random.Random
+    _deckSize: int
+    _catalog: Optional[CardCatalog]
+
+    def __init__(self, seed: int = 0, deckSize: int = 80, catalog: Optional[CardCatalog] = None) -> None:
+        # 80 cards cover 4 players * 9 turns taking and discarding from one deck
+        if deckSize < 4:
+            raise ValueError("Deck must contain at least the four visible cards")
+        self._random = random.Random(seed)
+        self._deckSize = deckSize
+        # cards of a catalog share their effects, see catalog
+        self._catalog = catalog
+
+    def _levelIEffect(self) -> EffectSignature:
+        rng = self._random
+        kind = rng.randrange(3)
+        if kind == 0:
+            return (FIXED, (), (rng.choice(RAW_RESOURCES),), 0)
+        if kind == 1:
+            return (FIXED, (), tuple(rng.sample(RAW_RESOURCES, 2)), 1)
+        return (FIXED, (rng.choice(RAW_RESOURCES),), (rng.choice(PRODUCTS),), rng.randrange(2))
+
+    def _levelIIEffect(self) -> EffectSignature:
+        rng = self._random
+        kind = rng.randrange(3)
+        if kind == 0:
+            return (FIXED, tuple(rng.sample(RAW_RESOURCES, 2)), tuple(rng.sample(PRODUCTS, 2)), 1)
+        if kind == 1:
+            return (ARBITRARY, rng.randint(2, 3), (rng.choice(PRODUCTS),), rng.randrange(2))
+        return (EITHER,
+                (FIXED, (rng.choice(RAW_RESOURCES),), (rng.choice(PRODUCTS),), 0),
+                (FIXED, (rng.choice(PRODUCTS),), (rng.choice(PRODUCTS), Resource.MONEY), 1))
+
+    def _card(self, signature: CardSignature) -> Card:
+        if self._catalog is not None:
+            return self._catalog.card(self._catalog.cardId(signature))
+        spaces, upper, lower = signature
+        return Card(pollutionSpacesL=spaces, upperEffect=buildEffect(upper),
+                    lowerEffect=None if lower is None else buildEffect(lower))
+
+    def createCard(self, deck: Deck) -> Card:
+        """Create one random card of the given level."""
+        if deck == Deck.LEVEL_I:
+            upper = self._levelIEffect()
+            lower: Optional[EffectSignature] = None
+            if self._random.random() < 0.3:
+                lower = (ARBITRARY, 1, (self._random.choice(RAW_RESOURCES),), 0)
+            return self._card((self._random.randint(1, 3), upper, lower))
+        spaces = self._random.randint(1, 2)
+        return self._card((spaces, self._levelIIEffect(), None))
+
+    def createPile(self, deck: Deck) -> Pile:
+        cards: list[InterfaceCard] = [self.createCard(deck) for _ in range(self._deckSize)]
+        return Pile(cards)
+
+    def createPlayer(self, playerId: int) -> Player:
+        rng = self._random
+        grid = Grid()
+        patterns = [ActivationPattern(grid, rng.sample(GRID_POSITIONS, rng.randint(3, 5))) for _ in range(2)]
+        scorings = [
+            ScoringMethod(rng.sample(RAW_RESOURCES + PRODUCTS, rng.randint(2, 3)), Points(rng.randint(2, 8)), grid)
+            for _ in range(2)
+        ]
+        return Player(id=playerId, activation_patterns=patterns, scoring_methods=scorings, grid=grid)
+
+    def createGame(self, playerIds: list[int], gameObserver: Optional[GameObserverInterface] = None) -> Game:
+        """Create a new game for the given players, who play in the given order."""
+        piles: dict[Deck, InterfacePile] = {deck: self.createPile(deck) for deck in Deck}
+        return Game(
+            players=[self.createPlayer(playerId) for playerId in playerIds],
+            piles=piles,
+            moveCard=MoveCard(),
+            processAction=ProcessAction(),
+            processActionAssistance=ProcessActionAssistance(),
+            selectReward=SelectReward(),
+            gameObserver=gameObserver if gameObserver is not None else GameObserver({}),
+        )
@@ -0,0 +1,220 @@
+"""
+Fixed-size feature vectors of game positions for training value networks.
+
+FeatureEncoder turns a Game into FEATURES float32 values, seen from one
+player (by default the player on turn), who always comes first; the other
+players follow in seat order and missing seats of games with fewer than
+four players are zero:
+
+    per player   present, then for each of the 9 cells: occupied, resource
+                 counts, pollution, pollution capacity, active, activated
+                 this turn and the card's effect signature; then for both
+                 scoring cards their goal resource counts, points per
+                 combination and whether it was selected, and whether each
+                 activation pattern was selected
+    per deck     for each of the 4 visible cards: present, pollution
+                 capacity and effect signature
+    game         turn number and a one-hot GameState
+
+An effect signature describes the first MAX_OPTIONS options of a card (see
+bots.cardOptions): kind (fixed transformation, arbitrary payment or any
+other effect), paid resource counts, number of resources of any kind paid,
+gained resource counts and pollution. featureNames() lists every value.
+
+encodeBatch writes many positions into one flat float32 array. Its view()
+is a (rows, FEATURES) buffer that numpy.asarray, torch.frombuffer and the
+like accept without copying; the encoder itself needs only the standard
+library.
+"""
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Optional, Union
+from .arbitrary_basic import ArbitraryBasic
+from .bots import cardOptions, freePollutionSlots, getPlayer
+from .game import Game
+from .grid import GRID_POSITIONS
+from .interfaces import Effect, InterfaceCard
+from .simple_types import Deck, GameState, Resource
+from .transformation_fixed import TransformationFixed
+
+MAX_PLAYERS = 4
+MAX_OPTIONS = 3
+VISIBLE_CARDS = 4
+
+_RESOURCES: list[Resource] = [resource for resource in Resource if resource != Resource.POLLUTION]
+_RESOURCE_INDEX: dict[Resource, int] = {resource: index for index, resource in enumerate(_RESOURCES)}
+_STATES = list(GameState)
+_DECKS = list(Deck)
+
+_OPTION_FIELDS = (["fixed", "arbitrary", "other"] + [f"pay_{r.name}" for r in _RESOURCES] + ["pay_any"]
+                  + [f"gain_{r.name}" for r in _RESOURCES] + ["pollution"])
+_OPTION = len(_OPTION_FIELDS)
+_SIGNATURE = MAX_OPTIONS * _OPTION
+_CELL_FIELDS = (["occupied"] + [f"resource_{r.name}" for r in _RESOURCES]
+                + ["pollution", "capacity", "active", "activated"])
+_CELL = len(_CELL_FIELDS) + _SIGNATURE
+_SCORING_FIELDS = [f"goal_{r.name}" for r in _RESOURCES] + ["points", "selected"]
+_PLAYER = 1 + len(GRID_POSITIONS) * _CELL + 2 * len(_SCORING_FIELDS) + 2
+_PILE_CARD = 2 + _SIGNATURE
+_GAME = 1 + len(_STATES)
+
+FEATURES = MAX_PLAYERS * _PLAYER + len(_DECKS) * VISIBLE_CARDS * _PILE_CARD + _GAME
+
+
+def featureNames() -> list[str]:
+    """Name of every feature, in vector order."""
+    signature = [f"option{o}_{name}" for o in range(MAX_OPTIONS) for name in _OPTION_FIELDS]
+    names: list[str] = []
+    for seat in range(MAX_PLAYERS):
+        names.append(f"player{seat}_present")
+        for position in GRID_POSITIONS:
+            cell = f"player{seat}_cell{position.x}{position.y}_"
+            names += [cell + name for name in _CELL_FIELDS + signature]
+        for method in range(2):
+            names += [f"player{seat}_scoring{method}_{name}" for name in _SCORING_FIELDS]
+        names += [f"player{seat}_pattern{pattern}_selected" for pattern in range(2)]
+    for deck in _DECKS:
+        for index in range(1, VISIBLE_CARDS + 1):
+            card = f"{deck.name}_card{index}_"
+            names += [card + name for name in ["present", "capacity"] + signature]
+    names.append("turn")
+    names += [f"state_{state.name}" for state in _STATES]
+    return names
+
+
+def _optionSignature(effect: Effect) -> list[float]:
+    values = [0.0] * _OPTION
+    if isinstance(effect, TransformationFixed):
+        values[0] = 1.0
+        for resource in effect.from_:
+            values[3 + _RESOURCE_INDEX[resource]] += 1
+    elif isinstance(effect, ArbitraryBasic):
+        values[1] = 1.0
+        values[3 + len(_RESOURCES)] = effect.from_
+    else:
+        values[2] = 1.0
+        return values
+    gained = 4 + len(_RESOURCES)
+    for resource in effect.to:
+        values[gained + _RESOURCE_INDEX[resource]] += 1
+    values[-1] = effect.pollution
+    return values
+
+
+@dataclass
+class FeatureBatch:
+    values: array[float]  # rows * FEATURES float32 values, row after row
+    rows: int
+
+    def view(self) -> memoryview[float]:
+        """The values as a (rows, FEATURES) buffer."""
+        return memoryview(self.values).cast("B").cast("f", [self.rows, FEATURES])
+
+
+Position = Union[Game, tuple[Game, int]]
+
+
+class FeatureEncoder:
+    """
+    Encodes positions into feature vectors. Effect signatures are cached
+    per card effects; effects are immutable and shared by cloned games.
+    """
+
+    def __init__(self, cacheSize: int = 1 << 16) -> None:
+        self._cacheSize = cacheSize
+        # id of the card's effects -> (the effects, to check the id was not reused; signature)
+        self._signatures: dict[tuple[int, int], tuple[tuple[object, object], list[float]]] = {}
+
+    def _signature(self, card: InterfaceCard) -> list[float]:
+        key = (id(card.upperEffect), id(card.lowerEffect))
+        cached = self._signatures.get(key)
+        if cached is not None and cached[0][0] is card.upperEffect and cached[0][1] is card.lowerEffect:
+            return cached[1]
+        signature: list[float] = []
+        options = cardOptions(card)[:MAX_OPTIONS]
+        for option in options:
+            signature += _optionSignature(option)
+        signature += [0.0] * ((MAX_OPTIONS - len(options)) * _OPTION)
+        if len(self._signatures) >= self._cacheSize:
+            self._signatures.clear()
+        self._signatures[key] = ((card.upperEffect, card.lowerEffect), signature)
+        return signature
+
+    def _encode(self, game: Game, playerId: Optional[int], values: list[float]) -> None:
+        """Write the features of one position into `values`, which is all zeros."""
+        playerId = game.onTurn() if playerId is None else playerId
+        first = getPlayer(game, playerId)
+        seat = game.players.index(first)
+        players = game.players[seat:] + game.players[:seat]
+        if len(players) > MAX_PLAYERS:
+            raise ValueError(f"At most {MAX_PLAYERS} players can be encoded")
+        resourceCount = len(_RESOURCES)
+        for slot, player in enumerate(players):
+            offset = slot * _PLAYER
+            values[offset] = 1.0
+            offset += 1
+            grid = player.grid
+            activated = grid.activationMask
+            for position in GRID_POSITIONS:
+                card = grid.getCard(position)
+                if card is not None:
+                    values[offset] = 1.0
+                    for resource in card.resources:
+                        if resource in _RESOURCE_INDEX:
+                            values[offset + 1 + _RESOURCE_INDEX[resource]] += 1
+                    cell = offset + 1 + resourceCount
+                    active = card.isActive()
+                    # an inactive card holds as many cubes as it has spaces
+                    values[cell] = card.pollutionSpacesL - freePollutionSlots(card) if active else card.pollutionSpacesL
+                    values[cell + 1] = card.pollutionSpacesL
+                    values[cell + 2] = 1.0 if active else 0.0
+                    values[cell + 3] = 1.0 if activated & grid.mask([position]) else 0.0
+                    values[cell + 4:cell + 4 + _SIGNATURE] = self._signature(card)
+                offset += _CELL
+            for method in player.scoring_methods:
+                for resource in method.resources:
+                    if resource in _RESOURCE_INDEX:
+                        values[offset + _RESOURCE_INDEX[resource]] += 1
+                values[offset + resourceCount] = method.pointsPerCombination.value
+                values[offset + resourceCount + 1] = 1.0 if method.calculatedTotal is not None else 0.0
+                offset += len(_SCORING_FIELDS)
+            for pattern in player.activation_patterns:
+                values[offset] = 1.0 if pattern.is_selected() else 0.0
+                offset += 1
+        offset = MAX_PLAYERS * _PLAYER
+        for deck in _DECKS:
+            pile = game.piles[deck]
+            for index in range(1, VISIBLE_CARDS + 1):
+                card = pile.getCard(index)
+                if card is not None:
+                    values[offset] = 1.0
+                    values[offset + 1] = card.pollutionSpacesL
+                    values[offset + 2:offset + 2 + _SIGNATURE] = self._signature(card)
+                offset += _PILE_CARD
+        values[offset] = game.turnNumber
+        values[offset + 1 + _STATES.index(game.state)] = 1.0
+
+    def encode(self, game: Game, playerId: Optional[int] = None) -> array[float]:
+        """Features of the game seen by `playerId`, by default the player on turn."""
+        values = [0.0] * FEATURES
+        self._encode(game, playerId, values)
+        return array("f", values)
+
+    def encodeInto(self, values: array[float], game: Game, playerId: Optional[int] = None) -> None:
+        """Append the features of the game to a float32 array."""
+        row = [0.0] * FEATURES
+        self._encode(game, playerId, row)
+        values.extend(row)
+
+    def encodeBatch(self, positions: Iterable[Position]) -> FeatureBatch:
+        """Features of games, or of (game, playerId) pairs, one row each."""
+        values: array[float] = array("f")
+        rows = 0
+        for position in positions:
+            if isinstance(position, Game):
+                self.encodeInto(values, position)
+            else:
+                self.encodeInto(values, *position)
+            rows += 1
+        return FeatureBatch(values, rows)
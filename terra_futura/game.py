@@ -1,9 +1,23 @@
-from typing import Optional
+import copy
+from collections import OrderedDict
+from typing import Any, Optional
+from .commands import (TURN_METHODS, ActivateCardCommand, DiscardCardCommand, GameCommand, GameFields,
+                       SelectPatternCommand, SelectRewardCommand, SelectScoringCommand, TakeCardCommand,
+                       TurnFinishedCommand, TurnStep)
+from .journal import Journal
 from .player import Player
 from .simple_types import GameState, Deck, CardSource, GridPosition, Resource
-from .interfaces import TerraFuturaInterface, GameObserverInterface, InterfacePile, InterfaceMoveCard, ProcessActionInterface, ProcessActionAssistanceInterface, InterfaceSelectReward
+from .interfaces import TerraFuturaInterface, GameObserverInterface, ActionLogInterface, InterfacePile, InterfaceMoveCard, ProcessActionInterface, ProcessActionAssistanceInterface, InterfaceSelectReward
 # from .select_reward import SelectReward
 
+# results remembered per game for idempotency keys
+IDEMPOTENCY_KEYS = 1024
+
+class _SilentObserver(GameObserverInterface):
+    def notifyAll(self, newState: dict[int, str]) -> None:
+        pass
+
+
 class Game(TerraFuturaInterface):
     _state: GameState
     _players: list[Player]
@@ -14,6 +28,13 @@ class Game(TerraFuturaInterface):
     _processAction: ProcessActionInterface
     _processActionAssistance: ProcessActionAssistanceInterface
     _selectReward: InterfaceSelectReward
+    _undoStack: list[GameCommand]
+    _redoStack: list[GameCommand]
+    _redoing: bool
+    _muted: bool
+    _actionLog: Optional[ActionLogInterface]
+    _version: int
+    _results: "OrderedDict[str, Any]"
 
     def __init__(self, players: list[Player], piles: dict[Deck, InterfacePile], 
                  moveCard: InterfaceMoveCard, processAction: ProcessActionInterface, 
@@ -39,8 +60,123 @@ class Game(TerraFuturaInterface):
         self._onTurn: int = 0         # Index of the player in self.players whose turn it is
         self._turnNumber: int = 1
         self._moveCard = moveCard
+        self._undoStack = []
+        self._redoStack = []
+        self._redoing = False
+        self._muted = False
+        self._actionLog = None
+        self._version = 0
+        self._results = OrderedDict()
 
     
+    def clone(self) -> "Game":
+        """
+        Independent deep copy of the game that notifies nobody, e.g. for
+        exploring moves. History and the action log are not copied.
+        """
+        silent: GameObserverInterface = _SilentObserver()
+        return copy.deepcopy(self, {id(self._gameObserver): silent, id(self._undoStack): [], id(self._redoStack): [],
+                                    id(self._actionLog): None})
+
+    def _fields(self) -> GameFields:
+        return GameFields(self._state, self._onTurn, self._turnNumber, self._assistanceUsed)
+
+    def _record(self, command: GameCommand) -> None:
+        self._version += 1
+        self._undoStack.append(command)
+        if not self._redoing:
+            self._redoStack.clear()
+            self._log(command.method, command.args)
+
+    def _log(self, method: str, args: tuple[Any, ...]) -> None:
+        if self._actionLog is not None and not self._muted:
+            self._actionLog.append(self, method, args)
+
+    def replay(self, method: str, args: tuple[Any, ...]) -> None:
+        """Performs a logged action again without notifying observers or logging it."""
+        muted, self._muted = self._muted, True
+        try:
+            getattr(self, method)(*args)
+        finally:
+            self._muted = muted
+
+    @property
+    def version(self) -> int:
+        """Increases with every change of the game, undo and redo included."""
+        return self._version
+
+    def perform(self, method: str, args: tuple[Any, ...], expectedVersion: Optional[int] = None,
+                idempotencyKey: Optional[str] = None) -> Any:
+        """
+        Performs an action of TerraFuturaInterface for a client. It is
+        rejected (False) without being looked at when the game is no longer
+        at `expectedVersion`, and performed at most once per
+        `idempotencyKey`: retries get the result of the first attempt. A
+        stale version is no attempt, so a retry with the current version
+        may still perform the action.
+        """
+        if idempotencyKey is not None and idempotencyKey in self._results:
+            return self._results[idempotencyKey]
+        if expectedVersion is not None and expectedVersion != self._version:
+            return False
+        result = getattr(self, method)(*args)
+        if idempotencyKey is not None:
+            self.rememberResult(idempotencyKey, result)
+        return result
+
+    def rememberResult(self, idempotencyKey: str, result: Any) -> None:
+        """
+        Records the result of an action performed with `idempotencyKey`. It
+        is logged after the action, so games rebuilt from the action log
+        (GameStore.load, replication) answer retries of the key too.
+        """
+        self._results[idempotencyKey] = result
+        if len(self._results) > IDEMPOTENCY_KEYS:
+            self._results.popitem(last=False)
+        self._log("rememberResult", (idempotencyKey, result))
+
+    @property
+    def history(self) -> tuple[GameCommand, ...]:
+        """Accepted actions that have not been undone, oldest first."""
+        return tuple(self._undoStack)
+
+    def canUndo(self) -> bool:
+        return bool(self._undoStack)
+
+    def canRedo(self) -> bool:
+        return bool(self._redoStack)
+
+    def _revert(self) -> GameCommand:
+        command = self._undoStack.pop()
+        command.revert()
+        before = command.before
+        self._state, self._onTurn = before.state, before.onTurn
+        self._turnNumber, self._assistanceUsed = before.turnNumber, before.assistanceUsed
+        return command
+
+    def undo(self) -> bool:
+        """Takes back the last accepted action."""
+        if not self._undoStack:
+            return False
+        self._redoStack.append(self._revert())
+        self._version += 1
+        self._log("undo", ())
+        self._notifyObservers()
+        return True
+
+    def redo(self) -> bool:
+        """Performs the last undone action again."""
+        if not self._redoStack:
+            return False
+        command = self._redoStack.pop()
+        self._redoing = True
+        try:
+            getattr(self, command.method)(*command.args)
+        finally:
+            self._redoing = False
+        self._log("redo", ())
+        return True
+
     @property
     def currentPlayerId(self) -> int:
         return self._players[self._onTurn].id
@@ -56,6 +192,22 @@ class Game(TerraFuturaInterface):
     @property
     def players(self) -> list[Player]:
         return self._players
+
+    @property
+    def gameObserver(self) -> GameObserverInterface:
+        return self._gameObserver
+
+    @property
+    def actionLog(self) -> Optional[ActionLogInterface]:
+        return self._actionLog
+
+    @actionLog.setter
+    def actionLog(self, actionLog: Optional[ActionLogInterface]) -> None:
+        self._actionLog = actionLog
+
+    @property
+    def piles(self) -> dict[Deck, InterfacePile]:
+        return self._piles
     
     def _getPlayer(self, id: int) -> Optional[Player]:
         for player in self._players:
@@ -75,6 +227,8 @@ class Game(TerraFuturaInterface):
             self._turnNumber += 1
 
     def _notifyObservers(self) -> None:
+        if self._muted:
+            return
         state: dict[int, str] = {}
         for player in self.players:
             state[player.id] = self._getPlayerState(player.id)
@@ -86,7 +240,8 @@ class Game(TerraFuturaInterface):
         if player is None:
             return "{}"
         grid_state = player.grid.state()
-        return f'{{"state": "{self._state.value}", "on_turn": {self.onTurn}, "turn": {self.turnNumber}, "grid": {grid_state}}}'
+        return (f'{{"state": "{self._state.value}", "on_turn": {self.onTurn()}, "turn": {self.turnNumber}, '
+                f'"version": {self._version}, "grid": {grid_state}}}')
 
     def discardLastCardFromDeck(self, playerId: int, deck: Deck) -> bool:
         if not self.isPlayerOnTurn(playerId):
@@ -100,8 +255,11 @@ class Game(TerraFuturaInterface):
             # maybe not needed
             return False
         
+        before = self._fields()
+        last = next(card for index in range(4, 0, -1) if (card := pile.getCard(index)) is not None)
         pile.removeLastCard()
         self._state = GameState.TakeCardCardDiscarded
+        self._record(DiscardCardCommand("discardLastCardFromDeck", (playerId, deck), before, pile, last))
         self._notifyObservers()
         return True
     
@@ -125,10 +283,15 @@ class Game(TerraFuturaInterface):
         
         grid = player.grid
 
+        before = self._fields()
+        taken = pile.getCard(cardIndex)
         if not self._moveCard.moveCard(pile, cardIndex, destination, grid):
             return False
+        assert taken is not None
         
         self._state = GameState.ActivateCard
+        self._record(TakeCardCommand("takeCard", (playerId, source, cardIndex, destination), before,
+                                     pile, cardIndex, taken, grid, destination))
         self._notifyObservers()
         return True
     
@@ -153,6 +316,8 @@ class Game(TerraFuturaInterface):
         if card_obj is None:
             return
         
+        before = self._fields()
+        journal = Journal()
         isAssistance = otherPlayerId is not None and otherCard is not None
         if isAssistance:
             assert otherPlayerId != None # why do i need to assert?
@@ -176,7 +341,8 @@ class Game(TerraFuturaInterface):
                 assisting_card,
                 inputs,
                 outputs,
-                pollution
+                pollution,
+                journal
             ):
                 return
             
@@ -189,9 +355,13 @@ class Game(TerraFuturaInterface):
                 inputs,
                 outputs,
                 pollution,
+                journal,
             ):
                 return
         
+        self._record(ActivateCardCommand("activateCard", (playerId, card, inputs.copy(), outputs.copy(),
+                                                          pollution.copy(), otherPlayerId, otherCard),
+                                         before, journal))
         self._notifyObservers()
 
     def selectReward(self, playerId: int, resource: Resource) -> None:
@@ -204,9 +374,11 @@ class Game(TerraFuturaInterface):
         if not self._selectReward.canSelectReward(resource):
             return
         
+        before = self._fields()
         self._selectReward.selectReward(resource)
         
         self._state = GameState.ActivateCard
+        self._record(SelectRewardCommand("selectReward", (playerId, resource), before, self._selectReward, resource))
         self._notifyObservers()
         return
     
@@ -222,6 +394,8 @@ class Game(TerraFuturaInterface):
             return False
         grid = player.grid
 
+        before = self._fields()
+        activations = grid.activationMask
         grid.endTurn()
         
         if self._turnNumber < 9:
@@ -241,6 +415,7 @@ class Game(TerraFuturaInterface):
             else:
                 self._state = GameState.SelectActivationPattern
 
+        self._record(TurnFinishedCommand("turnFinished", (playerId,), before, grid, activations))
         self._notifyObservers()
         return True
 
@@ -257,8 +432,12 @@ class Game(TerraFuturaInterface):
         player = self._getPlayer(playerId)
         if player is None:
             return False
+        before = self._fields()
+        activations = player.grid.activationMask
         player.activation_patterns[card].select()
         self._state = GameState.ActivateCard
+        self._record(SelectPatternCommand("selectActivationPattern", (playerId, card), before,
+                                          player.activation_patterns[card], player.grid, activations))
         
         self._notifyObservers()
         return True
@@ -277,12 +456,47 @@ class Game(TerraFuturaInterface):
         if player is None:
             return False
 
+        before = self._fields()
         scoring_method = player.scoring_methods[card]
         scoring_method.selectThisMethodAndCalculate()
 
         self._advanceTurn()
         if self._onTurn == 0:
             self._state = GameState.Finish
+        self._record(SelectScoringCommand("selectScoring", (playerId, card), before, scoring_method))
 
         self._notifyObservers()
         return True
+
+    def submitTurn(self, steps: list[TurnStep]) -> bool:
+        """
+        Performs a sequence of actions, e.g. a whole turn, as one: either every
+        step is accepted and observers are notified once, or nothing changes.
+        """
+        if not steps or any(step.method not in TURN_METHODS for step in steps):
+            return False
+        mark, version = len(self._undoStack), self._version
+        redoStack = self._redoStack.copy()
+        accepted = False
+        muted, self._muted = self._muted, True
+        try:
+            for step in steps:
+                count = len(self._undoStack)
+                getattr(self, step.method)(*step.args)
+                # every accepted action records one command
+                if len(self._undoStack) == count:
+                    break
+            else:
+                accepted = True
+        finally:
+            if not accepted:
+                while len(self._undoStack) > mark:
+                    self._revert()
+                self._redoStack = redoStack
+                # nobody saw the steps, so the game is back at its version
+                self._version = version
+            self._muted = muted
+        if accepted:
+            self._log("submitTurn", (steps.copy(),))
+            self._notifyObservers()
+        return accepted
@@ -2,59 +2,96 @@ from terra_futura.interfaces import InterfaceGrid, InterfaceCard
 from typing import Optional, List
 from terra_futura.simple_types import *
 import json
+from functools import lru_cache
+
+# The nine cells of the 3x3 grid, relative to the starting card position.
+GRID_POSITIONS: list[GridPosition] = [GridPosition(x, y) for y in range(-1, 2) for x in range(-1, 2)]
+
+@lru_cache(maxsize=1024)
+def _patternMask(pattern: tuple[GridPosition, ...], start: GridPosition) -> int:
+    """Activation patterns are few and fixed, so their masks are computed once."""
+    mask = 0
+    for position in pattern:
+        mask |= 1 << ((start.y + position.y) % 3 * 3 + (start.x + position.x) % 3)
+    return mask
+
 
 class Grid(InterfaceGrid):
-    _cards: list[list[Optional[InterfaceCard]]] # storing cards in a 2d list
-    _cardActivations: list[list[bool]] # storing cards in a 2d list
+    _cards: list[Optional[InterfaceCard]] # storing cards row by row, 3 cells per row
+    _occupied: int # bit per cell, set if the cell holds a card
+    _activated: int # bit per cell, set if the card was activated this turn
     _startingCardPosition: GridPosition
     
     def __init__(self) -> None:
-        self._cards = [[None] * 3 for _ in range(3)]
-        self._cardActivations = [[False] * 3 for _ in range(3)]
+        self._cards = [None] * 9
+        self._occupied = 0
+        self._activated = 0
         self._startingCardPosition = GridPosition(0, 0)
 
-    def _modifiedCoordinate(self, coordinate: GridPosition) -> GridPosition:
-        return GridPosition((self._startingCardPosition.x + coordinate.x) % 3,
-                            (self._startingCardPosition.y + coordinate.y) % 3)
+    def _index(self, coordinate: GridPosition) -> int:
+        return ((self._startingCardPosition.y + coordinate.y) % 3) * 3 + (self._startingCardPosition.x + coordinate.x) % 3
+
+    def mask(self, positions: List[GridPosition]) -> int:
+        """Bits of the cells at `positions`."""
+        return _patternMask(tuple(positions), self._startingCardPosition)
     
     def getCard(self, coordinate: GridPosition)-> Optional[InterfaceCard]:
-        absoluteCoordinate = self._modifiedCoordinate(coordinate)
-        searchedPosition: Optional[InterfaceCard] = self._cards[absoluteCoordinate.y][absoluteCoordinate.x]
-        return searchedPosition
+        return self._cards[self._index(coordinate)]
 
     def canPutCard(self, coordinate: GridPosition) -> bool:
-        absoluteCoordinate = self._modifiedCoordinate(coordinate)
         # check if position is empty
-        return self._cards[absoluteCoordinate.y][absoluteCoordinate.x] is None
+        return not self._occupied >> self._index(coordinate) & 1
 
     def putCard(self, coordinate: GridPosition, card: InterfaceCard) -> None:
-        absoluteCoordinate = self._modifiedCoordinate(coordinate)
-        if self.canPutCard(absoluteCoordinate):
-            self._cards[absoluteCoordinate.y][absoluteCoordinate.x] = card
+        index = self._index(coordinate)
+        if not self._occupied >> index & 1:
+            self._cards[index] = card
+            self._occupied |= 1 << index
         return
 
+    def removeCard(self, coordinate: GridPosition) -> None:
+        """Takes a card back off the grid, undoing putCard."""
+        index = self._index(coordinate)
+        self._cards[index] = None
+        self._occupied &= ~(1 << index)
+
+    @property
+    def occupiedMask(self) -> int:
+        return self._occupied
+
+    @property
+    def activationMask(self) -> int:
+        return self._activated
+
+    def restoreActivations(self, activations: int) -> None:
+        self._activated = activations
+
+    @property
+    def activatableMask(self) -> int:
+        """Cells holding a card that was not activated this turn."""
+        return self._occupied & ~self._activated
+
+    def positions(self, mask: int) -> list[GridPosition]:
+        """Positions of the cells in `mask`, in the order of GRID_POSITIONS."""
+        return [position for position in GRID_POSITIONS if mask >> self._index(position) & 1]
+
     def canBeActivated(self, coordinate: GridPosition) -> bool:
-        absoluteCoordinate = self._modifiedCoordinate(coordinate)
-        if self.getCard(absoluteCoordinate) is None:
-            return False
-        return not self._cardActivations[absoluteCoordinate.y][absoluteCoordinate.x]
+        return bool(self.activatableMask >> self._index(coordinate) & 1)
         
     def setActivated(self, coordinate: GridPosition) -> None:
-        absoluteCoordinate = self._modifiedCoordinate(coordinate)
-        self._cardActivations[absoluteCoordinate.y][absoluteCoordinate.x] = True
+        self._activated |= 1 << self._index(coordinate)
 
     def setActivationPattern(self, pattern: List[GridPosition]) -> None:
-        for pos in pattern:
-            self.setActivated(pos)
+        self._activated |= self.mask(pattern)
         
     def endTurn(self) -> None:
-        self._cardActivations = [[False] * 3 for _ in range(3)]
+        self._activated = 0
 
     def state(self) -> str:
         cards_state: list[dict[str, str]] = []
         for row in range(3):
             for col in range(3):
-                card = self._cards[row][col]
+                card = self._cards[row * 3 + col]
                 if card is not None:
                     cards_state.append({
                         "position": f"({row},{col})",
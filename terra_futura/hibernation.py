@@ -0,0 +1,192 @@
+"""
+Hibernation of idle hosted games.
+
+HibernatingGames is a mapping of game ids to games that keeps only recently
+used games in memory. A game untouched for `idleSeconds`, or the least
+recently used one when more than `capacity` games are resident, is pickled,
+compressed and written to `directory`. That captures everything the game
+refers to: grids, card resources and pollution, pile order, the reward
+selection, the game state and the undo history. The game observer and
+action log stay in memory, since they hold live connections and files, and
+are attached again when the game is read back on its next access.
+
+Eviction happens on every access and in sweep(), so no background thread
+is needed; a host may still call sweep() periodically to hibernate games
+nobody touches.
+"""
+from __future__ import annotations
+import io
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+from .game import Game
+from .metrics import percentile
+
+
+@dataclass
+class HibernationMetrics:
+    hits: int = 0           # accesses of games in memory
+    misses: int = 0         # accesses that had to rehydrate the game
+    hibernations: int = 0
+    bytesWritten: int = 0
+    rehydrateLatencies: deque[float] = field(default_factory=lambda: deque(maxlen=10000))
+
+    def percentile(self, p: float) -> float:
+        return percentile(self.rehydrateLatencies, p)
+
+    def summary(self) -> str:
+        return (f"hits={self.hits} misses={self.misses} hibernations={self.hibernations} "
+                f"bytes={self.bytesWritten} rehydrate_p50={self.percentile(0.5) * 1000:.3f}ms "
+                f"rehydrate_p99={self.percentile(0.99) * 1000:.3f}ms")
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file: io.BytesIO, external: dict[str, object]) -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self._names = {id(obj): name for name, obj in external.items()}
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        return self._names.get(id(obj))
+
+
+_PACKAGE = __name__.rpartition(".")[0]
+# what games refer to besides the classes of this package
+_BUILTINS = frozenset({("collections", "OrderedDict"), ("collections", "deque"),
+                       ("builtins", "set"), ("builtins", "frozenset")})
+
+
+class _Unpickler(pickle.Unpickler):
+    """Loads nothing but the classes of this package, so foreign data cannot run code."""
+
+    def __init__(self, file: io.BytesIO, external: dict[str, object]) -> None:
+        super().__init__(file)
+        self._external = external
+
+    def find_class(self, module: str, name: str) -> Any:
+        if (module, name) in _BUILTINS:
+            return super().find_class(module, name)
+        if module == _PACKAGE or module.startswith(_PACKAGE + "."):
+            found = super().find_class(module, name)
+            # functions, and classes that are only imported there, may do anything
+            if isinstance(found, type) and found.__module__ == module:
+                return found
+        raise pickle.UnpicklingError(f"Refusing to load {module}.{name}")
+
+    def persistent_load(self, pid: Any) -> object:
+        if pid not in self._external:
+            raise pickle.UnpicklingError(f"Unknown persistent id {pid!r}")
+        return self._external[pid]
+
+
+def hibernate(game: Game) -> bytes:
+    """Compressed image of the game without its observer and action log."""
+    external: dict[str, object] = {"observer": game.gameObserver}
+    if game.actionLog is not None:
+        external["actionLog"] = game.actionLog
+    buffer = io.BytesIO()
+    _Pickler(buffer, external).dump(game)
+    return zlib.compress(buffer.getvalue())
+
+
+def unpickle(data: bytes) -> Any:
+    """Unpickle data made of game classes only, e.g. the arguments of an action."""
+    return _Unpickler(io.BytesIO(data), {}).load()
+
+
+def rehydrate(data: bytes, observer: object, actionLog: Optional[object] = None) -> Game:
+    game = _Unpickler(io.BytesIO(zlib.decompress(data)), {"observer": observer, "actionLog": actionLog}).load()
+    assert isinstance(game, Game)
+    return game
+
+
+class HibernatingGames(MutableMapping[int, Game]):
+    """Games by id, at most `capacity` of them in memory, the rest on disk."""
+
+    def __init__(self, idleSeconds: float = 300.0, capacity: int = 1000, directory: Optional[str] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if capacity < 1:
+            raise ValueError("At least one game must fit in memory")
+        self._idleSeconds = idleSeconds
+        self._capacity = capacity
+        self._directory = directory if directory is not None else tempfile.mkdtemp(prefix="terra-futura-")
+        self._clock = clock
+        # resident games, least recently used first, with the time of their last access
+        self._resident: OrderedDict[int, tuple[Game, float]] = OrderedDict()
+        # observer and action log of hibernated games
+        self._detached: dict[int, tuple[object, Optional[object]]] = {}
+        self.metrics = HibernationMetrics()
+
+    @property
+    def idleSeconds(self) -> float:
+        return self._idleSeconds
+
+    def _path(self, gameId: int) -> str:
+        return os.path.join(self._directory, f"{gameId}.game")
+
+    def isResident(self, gameId: int) -> bool:
+        return gameId in self._resident
+
+    def _hibernate(self, gameId: int) -> None:
+        game, _ = self._resident.pop(gameId)
+        data = hibernate(game)
+        with open(self._path(gameId), "wb") as file:
+            file.write(data)
+        self._detached[gameId] = (game.gameObserver, game.actionLog)
+        self.metrics.hibernations += 1
+        self.metrics.bytesWritten += len(data)
+
+    def sweep(self) -> None:
+        """Hibernate games idle for too long and the least recently used ones over capacity."""
+        now = self._clock()
+        while self._resident:
+            gameId, (_, lastUsed) = next(iter(self._resident.items()))
+            if len(self._resident) <= self._capacity and now - lastUsed <= self._idleSeconds:
+                break
+            self._hibernate(gameId)
+
+    def __getitem__(self, gameId: int) -> Game:
+        entry = self._resident.pop(gameId, None)
+        if entry is not None:
+            self.metrics.hits += 1
+            game = entry[0]
+        else:
+            if gameId not in self._detached:
+                raise KeyError(gameId)
+            start = time.perf_counter()
+            path = self._path(gameId)
+            with open(path, "rb") as file:
+                game = rehydrate(file.read(), *self._detached.pop(gameId))
+            os.remove(path)
+            self.metrics.misses += 1
+            self.metrics.rehydrateLatencies.append(time.perf_counter() - start)
+        self._resident[gameId] = (game, self._clock())
+        self.sweep()
+        return game
+
+    def __setitem__(self, gameId: int, game: Game) -> None:
+        if gameId in self:
+            del self[gameId]
+        self._resident[gameId] = (game, self._clock())
+        self.sweep()
+
+    def __delitem__(self, gameId: int) -> None:
+        if self._resident.pop(gameId, None) is not None:
+            return
+        if self._detached.pop(gameId, None) is None:
+            raise KeyError(gameId)
+        os.remove(self._path(gameId))
+
+    def __contains__(self, gameId: object) -> bool:
+        return gameId in self._resident or gameId in self._detached
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._resident) + list(self._detached))
+
+    def __len__(self) -> int:
+        return len(self._resident) + len(self._detached)
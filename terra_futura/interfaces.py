@@ -1,8 +1,16 @@
 # pylint: disable=unused-argument, duplicate-code
-from typing import List, Tuple, Optional, Protocol
+from typing import Any, Iterator, List, Tuple, Optional, Protocol, TYPE_CHECKING
 from terra_futura.simple_types import *
 
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+if TYPE_CHECKING:
+    from terra_futura.anytime import GameView
+    from terra_futura.commands import TurnStep
+    from terra_futura.game import Game
+    from terra_futura.journal import Journal
+    from terra_futura.mcts import Move
 from typing import List
 
 # Zostalo z pôvodného...
@@ -107,6 +115,12 @@ class InterfacePile(Protocol):
     def removeLastCard(self) -> None:
         ...
 
+    def returnCard(self, index: int, card: InterfaceCard) -> None:
+        ...
+
+    def returnLastCard(self, card: InterfaceCard) -> None:
+        ...
+
     def state(self)-> str:
         ...
 
@@ -170,15 +184,51 @@ class TerraFuturaInterface(Protocol):
     def selectScoring(self, playerId: int, card: int) -> bool:
         ...
 
+    def submitTurn(self, steps: List["TurnStep"]) -> bool:
+        ...
+
+class AnytimeBotInterface(Protocol):
+    def think(self, view: "GameView", deadline: float) -> Iterator[Optional["Move"]]:
+        """
+        Yield the best move found so far (None while there is none), often.
+        The host plays the last move yielded when the iteration ends or when
+        `deadline` (a time.monotonic value) passes, whichever comes first.
+        """
+        ...
+
 class GameObserverInterface(Protocol):
     def notifyAll(self, newState: dict[int, str]) -> None:
         ...
 
+class ActionLogInterface(Protocol):
+    def append(self, game: "Game", method: str, args: Tuple[Any, ...]) -> None:
+        """Called after every accepted action; game.replay(method, args) performs it again."""
+        ...
+
+@dataclass(frozen=True)
+class ActionPlan:
+    """
+    A validated activation with its cards already looked up. It stays valid
+    only as long as the cards hold what they held when it was planned.
+    """
+    pollution: Tuple[Tuple[InterfaceCard, int], ...]
+    inputs: Tuple[Tuple[InterfaceCard, Tuple[Resource, ...]], ...]
+    outputs: Tuple[Tuple[InterfaceCard, Tuple[Resource, ...]], ...]
+
 class ProcessActionInterface(Protocol):
     def activateCard(self, card: InterfaceCard, grid: InterfaceGrid, 
                      inputs: list[tuple[Resource, GridPosition]], 
                      outputs: List[tuple[Resource, GridPosition]], 
-                     pollution: List[GridPosition]) -> bool:
+                     pollution: List[GridPosition], journal: Optional["Journal"] = None) -> bool:
+        ...
+
+    def plan(self, card: InterfaceCard, grid: InterfaceGrid,
+             inputs: List[tuple[Resource, GridPosition]],
+             outputs: List[tuple[Resource, GridPosition]],
+             pollution: List[GridPosition]) -> Optional[ActionPlan]:
+        ...
+
+    def apply(self, plan: ActionPlan, journal: Optional["Journal"] = None) -> bool:
         ...
 
 class PlayerInterface(Protocol):
@@ -189,7 +239,16 @@ class ProcessActionAssistanceInterface(Protocol):
     def activateCard(self, card: InterfaceCard, grid: InterfaceGrid, assistingPlayer: PlayerInterface, 
                      assistingCard: InterfaceCard, inputs: List[tuple[Resource, GridPosition]], 
                      outputs: List[tuple[Resource, GridPosition]], 
-                     pollution: List[GridPosition]) -> bool:
+                     pollution: List[GridPosition], journal: Optional["Journal"] = None) -> bool:
+        ...
+
+    def plan(self, card: InterfaceCard, grid: InterfaceGrid, assistingPlayer: PlayerInterface,
+             assistingCard: InterfaceCard, inputs: List[tuple[Resource, GridPosition]],
+             outputs: List[tuple[Resource, GridPosition]],
+             pollution: List[GridPosition]) -> Optional[ActionPlan]:
+        ...
+
+    def apply(self, plan: ActionPlan, journal: Optional["Journal"] = None) -> bool:
         ...
 
 
@@ -207,5 +266,8 @@ class InterfaceSelectReward(Protocol):
     def selectReward(self, resource: Resource) -> None:
         ...
 
+    def unselectReward(self, resource: Resource) -> None:
+        ...
+
     def state(self)-> str:
         ...
\ No newline at end of file
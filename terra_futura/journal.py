@@ -0,0 +1,54 @@
+"""
+Undo log of card mutations.
+
+Every card is recorded just before it is changed, so rolling back restores
+the cards in reverse order of their changes, in time proportional to what
+changed rather than to the size of the game. ProcessAction and
+ProcessActionAssistance apply activations through a journal, which makes
+them atomic, and trial lets callers try moves on a live grid:
+
+    with trial() as journal:
+        ProcessAction().activateCard(card, grid, inputs, outputs, pollution, journal)
+        value = gridValue(grid)
+    # the grid is as it was
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any, Iterator
+from .interfaces import InterfaceCard
+
+
+class Journal:
+    def __init__(self) -> None:
+        self._entries: list[tuple[InterfaceCard, dict[str, Any]]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, card: InterfaceCard) -> None:
+        """Remember the card as it is now; call before every change of it."""
+        self._entries.append((card, {**vars(card), "resources": card.resources.copy()}))
+
+    def mark(self) -> int:
+        """Position to roll back to later."""
+        return len(self._entries)
+
+    def rollback(self, mark: int = 0) -> None:
+        """Undo every change recorded since `mark`."""
+        while len(self._entries) > mark:
+            card, attributes = self._entries.pop()
+            vars(card).update(attributes)
+
+    def commit(self) -> None:
+        """Keep the changes and forget how to undo them."""
+        self._entries.clear()
+
+
+@contextmanager
+def trial() -> Iterator[Journal]:
+    """Journal whose changes are rolled back when the block ends, however it ends."""
+    journal = Journal()
+    try:
+        yield journal
+    finally:
+        journal.rollback()
@@ -0,0 +1,173 @@
+"""
+Load generator for the JSON-lines game server.
+
+Opens a number of connections and plays many complete games over each of
+them concurrently, measuring round-trip latency of every request:
+
+    python -m terra_futura.load_client --games 200 --connections 4 --players 2
+
+Every game is scripted: each turn a player takes the newest card of a deck,
+tries to activate it and finishes the turn; at the end everyone picks their
+first activation pattern and scoring method. This drives the whole
+request -> validate -> notify path of the server without any game logic
+on the client side. With --batch every turn is sent as one submitTurn.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from .grid import GRID_POSITIONS
+from .metrics import percentile
+from .protocol import encodePosition
+
+
+@dataclass
+class LoadReport:
+    games: int = 0
+    failedGames: int = 0
+    notifications: int = 0
+    latencies: list[float] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def percentile(self, p: float) -> float:
+        return percentile(self.latencies, p)
+
+    def summary(self) -> str:
+        rate = len(self.latencies) / self.seconds if self.seconds else 0.0
+        return (f"games={self.games} failed={self.failedGames} requests={len(self.latencies)} "
+                f"notifications={self.notifications} seconds={self.seconds:.3f} req/s={rate:.0f} "
+                f"p50={self.percentile(0.5) * 1000:.3f}ms p99={self.percentile(0.99) * 1000:.3f}ms")
+
+
+class ClientConnection:
+    """One pipelined connection: requests are matched to responses by id."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, report: LoadReport) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._report = report
+        self._pending: dict[int, asyncio.Future[dict[str, Any]]] = {}
+        self._nextId = 0
+        self._readerTask = asyncio.create_task(self._readResponses())
+
+    @classmethod
+    async def open(cls, host: str, port: int, report: LoadReport) -> ClientConnection:
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        return cls(reader, writer, report)
+
+    async def _readResponses(self) -> None:
+        while line := await self._reader.readline():
+            message = json.loads(line)
+            if message.get("event") == "notify":
+                self._report.notifications += 1
+                continue
+            future = self._pending.pop(message["id"], None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        for future in self._pending.values():
+            future.set_exception(ConnectionError("Server closed the connection"))
+
+    async def call(self, method: str, params: dict[str, Any], game: Optional[int] = None) -> Any:
+        requestId = self._nextId
+        self._nextId += 1
+        request: dict[str, Any] = {"id": requestId, "method": method, "params": params}
+        if game is not None:
+            request["game"] = game
+        future: asyncio.Future[dict[str, Any]] = asyncio.get_running_loop().create_future()
+        self._pending[requestId] = future
+        start = time.perf_counter()
+        self._writer.write(json.dumps(request).encode() + b"\n")
+        response = await future
+        self._report.latencies.append(time.perf_counter() - start)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    async def close(self) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._readerTask.cancel()
+
+
+def _turn(playerId: int, deck: str, position: list[int]) -> list[dict[str, Any]]:
+    return [
+        {"method": "takeCard", "params": {"playerId": playerId, "source": {"deck": deck, "index": 1},
+                                          "cardIndex": 1, "destination": position}},
+        {"method": "turnFinished", "params": {"playerId": playerId}},
+    ]
+
+
+async def playGame(connection: ClientConnection, players: list[int], seed: int, batch: bool = False) -> bool:
+    """
+    Play one scripted game to the end. Returns True if every step was accepted.
+    With batch, every turn is a single submitTurn request.
+    """
+    game = await connection.call("createGame", {"players": players, "seed": seed})
+    for playerId in players:
+        await connection.call("subscribe", {"playerId": playerId}, game)
+
+    ok = True
+    for turn, position in enumerate(GRID_POSITIONS):
+        deck = "LEVEL_I" if turn < 5 else "LEVEL_II"
+        for playerId in players:
+            if batch:
+                ok &= await connection.call("submitTurn", {
+                    "steps": _turn(playerId, deck, encodePosition(position))}, game) is True
+                continue
+            ok &= await connection.call("takeCard", {
+                "playerId": playerId, "source": {"deck": deck, "index": 1},
+                "cardIndex": 1, "destination": encodePosition(position)}, game) is True
+            await connection.call("activateCard", {
+                "playerId": playerId, "card": encodePosition(position),
+                "inputs": [], "outputs": [], "pollution": []}, game)
+            ok &= await connection.call("turnFinished", {"playerId": playerId}, game) is True
+    for playerId in players:
+        if batch:
+            ok &= await connection.call("submitTurn", {"steps": [
+                {"method": "selectActivationPattern", "params": {"playerId": playerId, "card": 0}},
+                {"method": "turnFinished", "params": {"playerId": playerId}}]}, game) is True
+            continue
+        ok &= await connection.call("selectActivationPattern", {"playerId": playerId, "card": 0}, game) is True
+        ok &= await connection.call("turnFinished", {"playerId": playerId}, game) is True
+    for playerId in players:
+        ok &= await connection.call("selectScoring", {"playerId": playerId, "card": 0}, game) is True
+    await connection.call("closeGame", {}, game)
+    return ok
+
+
+async def runLoad(host: str, port: int, games: int, connections: int, players: int, seed: int = 0,
+                  batch: bool = False) -> LoadReport:
+    report = LoadReport()
+    clients = [await ClientConnection.open(host, port, report) for _ in range(connections)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        playGame(clients[i % connections], list(range(1, players + 1)), seed + i, batch) for i in range(games)
+    ))
+    report.seconds = time.perf_counter() - start
+    report.games = len(results)
+    report.failedGames = results.count(False)
+    for client in clients:
+        await client.close()
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate load against a Terra Futura game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--players", type=int, default=2, choices=range(2, 5))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", action="store_true", help="submit every turn as one submitTurn request")
+    args = parser.parse_args(argv)
+    report = asyncio.run(runLoad(args.host, args.port, args.games, args.connections, args.players, args.seed,
+                                 args.batch))
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Monte Carlo Tree Search player.
+
+Every decision (which card to take and where, the next activation or
+finishing the turn, the activation pattern, the scoring method) is searched
+with UCT from a clone of the current game, using random playouts to the end of
+the game. Nodes keep rewards per player, so opponents are modelled as
+maximizing their own share of the win.
+
+Search is root parallel: every worker process grows its own tree from the
+same root for the whole time budget and only the visit counts and rewards
+of the root moves are merged. The budget is anytime: the best move found so
+far is played when it runs out. The root position is written once into a
+shared StateBuffer and workers read it by offset (see state_buffer).
+
+MCTSBot also implements AnytimeBotInterface: hosted as a bot seat (see
+anytime.BotHost) it grows a single tree cooperatively and the host plays
+its best move at the deadline.
+
+Use it in the simulator as "terra_futura.mcts:MCTSBot".
+"""
+from __future__ import annotations
+import math
+import random
+import time
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from types import TracebackType
+from typing import TYPE_CHECKING, Iterator, Optional
+from .bots import Activation, GameDriver, RandomBot, activationsFor, cardChoices, finalScores, getPlayer
+from .catalog import CardCatalog, attachCatalog, processCatalog
+from .factories import createCatalog
+from .game import Game
+from .simple_types import Deck, GameState, GridPosition
+from .state_buffer import StateBuffer, sharedGame
+
+if TYPE_CHECKING:
+    from .anytime import GameView
+
+# playouts between the moves MCTSBot.think yields
+_THINK_ITERATIONS = 4
+
+
+@dataclass(frozen=True)
+class Move:
+    """One decision of the player on turn."""
+    card: Optional[tuple[Deck, int, GridPosition]] = None
+    activation: Optional[Activation] = None
+    pattern: Optional[int] = None
+    scoring: Optional[int] = None
+
+    @property
+    def method(self) -> str:
+        """Name of the Game method the move calls."""
+        if self.card is not None:
+            return "takeCard"
+        if self.activation is not None:
+            return "activateCard"
+        if self.pattern is not None:
+            return "selectActivationPattern"
+        if self.scoring is not None:
+            return "selectScoring"
+        return "turnFinished"
+
+    def apply(self, driver: GameDriver) -> None:
+        playerId = driver.game.onTurn()
+        if self.card is not None:
+            driver.takeCard(playerId, *self.card)
+        elif self.activation is not None:
+            driver.activate(playerId, self.activation)
+        elif self.pattern is not None:
+            driver.selectPattern(playerId, self.pattern)
+        elif self.scoring is not None:
+            driver.selectScoring(playerId, self.scoring)
+        else:
+            driver.finishTurn(playerId)
+
+
+FINISH_TURN = Move()
+
+
+def legalMoves(driver: GameDriver) -> list[Move]:
+    """Decisions available to the player on turn, in a deterministic order."""
+    game = driver.game
+    state = game.state
+    if state in (GameState.TakeCardNoCardDiscarded, GameState.TakeCardCardDiscarded):
+        return [Move(card=choice) for choice in cardChoices(game, game.onTurn())]
+    if state == GameState.ActivateCard:
+        grid = getPlayer(game, game.onTurn()).grid
+        # different effect options may lead to the same activation
+        activations = dict.fromkeys(a for position in driver.allowed for a in activationsFor(grid, position))
+        return [FINISH_TURN] + [Move(activation=a) for a in activations]
+    if state == GameState.SelectActivationPattern:
+        return [Move(pattern=0), Move(pattern=1)]
+    if state == GameState.SelectScoringMethod:
+        return [Move(scoring=0), Move(scoring=1)]
+    return []
+
+
+def winShares(game: Game) -> dict[int, float]:
+    """1 for the sole winner, split evenly between tied winners, 0 for the others."""
+    scores = finalScores(game)
+    best = max(scores.values())
+    winners = [playerId for playerId, score in scores.items() if score == best]
+    return {playerId: (1 / len(winners) if playerId in winners else 0.0) for playerId in scores}
+
+
+class _Node:
+    __slots__ = ("move", "parent", "player", "children", "untried", "visits", "reward")
+
+    def __init__(self, move: Optional[Move], parent: Optional[_Node], player: Optional[int],
+                 untried: list[Move]) -> None:
+        self.move = move
+        self.parent = parent
+        self.player = player  # who made the move leading here
+        self.children: list[_Node] = []
+        self.untried = untried
+        self.visits = 0
+        self.reward = 0.0  # summed reward of `player`
+
+    def select(self, exploration: float) -> _Node:
+        logVisits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.reward / child.visits
+                   + exploration * math.sqrt(logVisits / child.visits))
+
+
+class SearchTree:
+    """One UCT tree, grown a number of iterations at a time."""
+
+    def __init__(self, game: Game, allowed: list[GridPosition], seed: int, exploration: float = 1.4) -> None:
+        self._game = game
+        self._allowed = allowed
+        self._exploration = exploration
+        self._random = random.Random(seed)
+        self._playout = RandomBot(seed)
+        self.moves = legalMoves(GameDriver(game, allowed.copy()))
+        self._root = _Node(None, None, None, self.moves.copy())
+
+    def grow(self, iterations: int = 1) -> None:
+        for _ in range(iterations):
+            driver = GameDriver(self._game.clone(), self._allowed.copy())
+            node = self._root
+            while not node.untried and node.children:
+                node = node.select(self._exploration)
+                assert node.move is not None
+                node.move.apply(driver)
+            if node.untried:
+                move = node.untried.pop(self._random.randrange(len(node.untried)))
+                player = driver.game.onTurn()
+                move.apply(driver)
+                child = _Node(move, node, player, legalMoves(driver))
+                node.children.append(child)
+                node = child
+            while driver.game.state != GameState.Finish:
+                driver.step(self._playout)
+            rewards = winShares(driver.game)
+            backtrack: Optional[_Node] = node
+            while backtrack is not None:
+                backtrack.visits += 1
+                if backtrack.player is not None:
+                    backtrack.reward += rewards[backtrack.player]
+                backtrack = backtrack.parent
+
+    def statistics(self) -> list[tuple[int, float]]:
+        """(visits, reward) of every root move, in the order of legalMoves."""
+        statistics = {child.move: (child.visits, child.reward) for child in self._root.children}
+        return [statistics.get(move, (0, 0.0)) for move in self.moves]
+
+
+def bestMove(moves: list[Move], statistics: list[tuple[int, float]]) -> Move:
+    """The most visited move, ties broken by the mean reward."""
+    best = max(range(len(moves)), key=lambda i: (statistics[i][0],
+                                                 statistics[i][1] / statistics[i][0] if statistics[i][0] else 0.0))
+    return moves[best]
+
+
+def search(game: Game, allowed: list[GridPosition], deadline: float, seed: int,
+           maxIterations: Optional[int] = None, exploration: float = 1.4) -> list[tuple[int, float]]:
+    """
+    Grow one UCT tree from the given position until `deadline` (a time.monotonic
+    value) or `maxIterations`. Returns (visits, reward) of every root move, in
+    the order of legalMoves.
+    """
+    tree = SearchTree(game, allowed, seed, exploration)
+    iterations = 0
+    while time.monotonic() < deadline and (maxIterations is None or iterations < maxIterations):
+        iterations += 1
+        tree.grow()
+    return tree.statistics()
+
+
+def _searchTask(game: Game, allowed: list[GridPosition], budget: float, seed: int,
+                maxIterations: Optional[int], exploration: float) -> list[tuple[int, float]]:
+    # the deadline is taken in the worker, so pickling time does not eat the budget of others
+    return search(game, allowed, time.monotonic() + budget, seed, maxIterations, exploration)
+
+
+def _searchSharedTask(states: str, offset: int, allowed: list[GridPosition], budget: float, seed: int,
+                      maxIterations: Optional[int], exploration: float) -> list[tuple[int, float]]:
+    deadline = time.monotonic() + budget
+    catalog = processCatalog()
+    assert catalog is not None
+    return search(sharedGame(states, offset, catalog), allowed, deadline, seed, maxIterations, exploration)
+
+
+class MCTSBot:
+    """
+    Bot policy choosing every decision with root parallel MCTS.
+
+    timeBudget is the number of seconds per decision, maxIterations optionally
+    caps the playouts per worker (which makes the search reproducible). With
+    several workers it holds a process pool and shared memory: close it, or
+    use it as a context manager. A bot that is collected unclosed releases
+    them too.
+    """
+
+    def __init__(self, seed: int = 0, timeBudget: float = 1.0, workers: int = 1,
+                 maxIterations: Optional[int] = None, exploration: float = 1.4) -> None:
+        self._random = random.Random(seed)
+        self._timeBudget = timeBudget
+        self._workers = workers
+        self._maxIterations = maxIterations
+        self._exploration = exploration
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # what the pool reads positions from, see state_buffer
+        self._catalog: Optional[CardCatalog] = None
+        self._states: Optional[StateBuffer] = None
+        self._finalizer: Optional[weakref.finalize[[ProcessPoolExecutor, StateBuffer, CardCatalog], MCTSBot]] = None
+
+    @staticmethod
+    def _release(pool: ProcessPoolExecutor, states: StateBuffer, catalog: CardCatalog) -> None:
+        pool.shutdown()
+        states.close()
+        catalog.close()
+
+    def close(self) -> None:
+        if self._finalizer is not None:
+            self._finalizer()
+        self._finalizer = self._pool = self._states = self._catalog = None
+
+    def __enter__(self) -> MCTSBot:
+        return self
+
+    def __exit__(self, excType: Optional[type[BaseException]], exc: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    def _submit(self, game: Game, allowed: list[GridPosition],
+                seeds: list[int]) -> list[Future[list[tuple[int, float]]]]:
+        if self._pool is None:
+            self._catalog = createCatalog()
+            self._states = StateBuffer.create()
+            self._pool = ProcessPoolExecutor(self._workers, initializer=attachCatalog,
+                                             initargs=(self._catalog.name,))
+            self._finalizer = weakref.finalize(self, MCTSBot._release, self._pool, self._states, self._catalog)
+        assert self._catalog is not None and self._states is not None
+        arguments = (allowed, self._timeBudget)
+        options = (self._maxIterations, self._exploration)
+        try:
+            # the previous decision was waited for, so its record is not read any more
+            self._states.reset()
+            offset = self._states.write(game, self._catalog)
+        except ValueError:
+            # cards that are not in the catalog: send the game itself
+            root = game.clone()
+            return [self._pool.submit(_searchTask, root, *arguments, seed, *options) for seed in seeds]
+        return [self._pool.submit(_searchSharedTask, self._states.name, offset, *arguments, seed, *options)
+                for seed in seeds]
+
+    def _decide(self, game: Game, playerId: int, allowed: list[GridPosition]) -> Move:
+        # the search plays the moves of the player on turn
+        if game.onTurn() != playerId:
+            raise ValueError(f"Player {playerId} is not on turn")
+        moves = legalMoves(GameDriver(game, allowed.copy()))
+        if len(moves) == 1:
+            return moves[0]
+        seeds = [self._random.getrandbits(32) for _ in range(self._workers)]
+        if self._workers == 1:
+            results = [search(game.clone(), allowed, time.monotonic() + self._timeBudget, seeds[0],
+                              self._maxIterations, self._exploration)]
+        else:
+            results = [future.result() for future in self._submit(game, allowed, seeds)]
+
+        visits = [0] * len(moves)
+        rewards = [0.0] * len(moves)
+        for result in results:
+            for index, (moveVisits, moveReward) in enumerate(result):
+                visits[index] += moveVisits
+                rewards[index] += moveReward
+        return bestMove(moves, list(zip(visits, rewards)))
+
+    def think(self, view: GameView, deadline: float) -> Iterator[Move]:
+        """
+        Anytime search for hosts (see anytime.BotHost): one tree in this
+        process, yielding the best move after every few iterations until
+        the deadline.
+        """
+        driver = view.explore()
+        tree = SearchTree(driver.game, driver.allowed, self._random.getrandbits(32), self._exploration)
+        if len(tree.moves) == 1:
+            yield tree.moves[0]
+            return
+        left = self._maxIterations
+        while (left is None or left > 0) and time.monotonic() < deadline:
+            batch = _THINK_ITERATIONS if left is None else min(_THINK_ITERATIONS, left)
+            tree.grow(batch)
+            left = None if left is None else left - batch
+            yield bestMove(tree.moves, tree.statistics())
+
+    def chooseCard(self, game: Game, playerId: int) -> tuple[Deck, int, GridPosition]:
+        move = self._decide(game, playerId, [])
+        assert move.card is not None
+        return move.card
+
+    def chooseActivation(self, game: Game, playerId: int,
+                         positions: list[GridPosition]) -> Optional[Activation]:
+        return self._decide(game, playerId, positions).activation
+
+    def choosePattern(self, game: Game, playerId: int) -> int:
+        move = self._decide(game, playerId, [])
+        assert move.pattern is not None
+        return move.pattern
+
+    def chooseScoring(self, game: Game, playerId: int) -> int:
+        move = self._decide(game, playerId, [])
+        assert move.scoring is not None
+        return move.scoring
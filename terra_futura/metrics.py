@@ -0,0 +1,14 @@
+"""
+Latency statistics shared by the metrics of the server, its load client,
+hibernation, the game store, replication and hosted bots.
+"""
+from __future__ import annotations
+from typing import Iterable
+
+
+def percentile(values: Iterable[float], p: float) -> float:
+    """The value at fraction `p` of the sorted values, 0 when there are none."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
@@ -0,0 +1,82 @@
+"""
+Payment enumeration.
+
+ProcessAction.activateCard takes the paid resources as explicit
+(Resource, GridPosition) pairs. payments yields every way the active cards
+of a grid can pay an effect, each distinct choice of resources per card
+exactly once: paying two greens from a card holding three is one payment,
+not three. The generator is lazy and skips sources that cannot complete a
+payment, so callers that only need the first few stop early.
+"""
+from __future__ import annotations
+from collections import Counter
+from typing import Iterator, TypeVar
+from .arbitrary_basic import ArbitraryBasic
+from .grid import GRID_POSITIONS
+from .interfaces import Effect, InterfaceGrid
+from .scoring_method import BASE_SCORES
+from .simple_types import GridPosition, Resource
+from .transformation_fixed import TransformationFixed
+
+Payment = tuple[tuple[Resource, GridPosition], ...]
+
+_Key = TypeVar("_Key")
+
+
+def distribute(amount: int, capacities: list[tuple[_Key, int]]) -> Iterator[list[tuple[_Key, int]]]:
+    """Every way to take `amount` items from (key, capacity) sources, as (key, taken) lists."""
+    if amount == 0:
+        yield []
+        return
+    if not capacities:
+        return
+    (key, capacity), rest = capacities[0], capacities[1:]
+    if sum(c for _, c in rest) + capacity < amount:
+        return
+    for taken in range(min(amount, capacity), -1, -1):
+        for tail in distribute(amount - taken, rest):
+            yield ([(key, taken)] if taken else []) + tail
+
+
+def _splits(needed: list[tuple[Resource, int]],
+            holders: dict[Resource, list[tuple[GridPosition, int]]]) -> Iterator[list[tuple[Resource, GridPosition, int]]]:
+    """Every way to take the needed amount of each resource from the cards holding it."""
+    if not needed:
+        yield []
+        return
+    (resource, amount), rest = needed[0], needed[1:]
+    for split in distribute(amount, holders[resource]):
+        for tail in _splits(rest, holders):
+            yield [(resource, position, taken) for position, taken in split] + tail
+
+
+def payments(grid: InterfaceGrid, effect: Effect, cheapestFirst: bool = False) -> Iterator[Payment]:
+    """
+    Every distinct payment of a TransformationFixed or ArbitraryBasic effect
+    from the active cards of the grid; other effects have none. With
+    cheapestFirst, payments come in order of the base score of the paid
+    resources, least valuable first.
+    """
+    holders: dict[Resource, list[tuple[GridPosition, int]]] = {}
+    for position in GRID_POSITIONS:
+        card = grid.getCard(position)
+        if card is not None and card.isActive():
+            for resource, count in Counter(card.resources).items():
+                holders.setdefault(resource, []).append((position, count))
+
+    if isinstance(effect, TransformationFixed):
+        needed = Counter(effect.from_)
+        if any(sum(c for _, c in holders.get(r, [])) < n for r, n in needed.items()):
+            return
+        kinds: Iterator[list[tuple[Resource, int]]] = iter([sorted(needed.items(), key=lambda item: item[0].value)])
+    elif isinstance(effect, ArbitraryBasic):
+        totals = [(resource, sum(c for _, c in holders[resource])) for resource in Resource if resource in holders]
+        kinds = distribute(effect.from_, totals)
+        if cheapestFirst:
+            kinds = iter(sorted(kinds, key=lambda kind: sum(BASE_SCORES[r] * n for r, n in kind)))
+    else:
+        return
+
+    for kind in kinds:
+        for split in _splits(kind, holders):
+            yield tuple((resource, position) for resource, position, taken in split for _ in range(taken))
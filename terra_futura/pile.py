@@ -16,7 +16,7 @@ class Pile(InterfacePile):
         assert len(self._visibleCards) == 4
 
     def getCard(self, index: int) -> Optional[InterfaceCard]:
-        if index not in range(1, 5):
+        if index not in range(1, len(self._visibleCards) + 1):
             return None
         return self._visibleCards[index-1]
 
@@ -32,6 +32,18 @@ class Pile(InterfacePile):
         self._visibleCards.pop() # remove last card
         self._visibleCards.insert(0, self._hiddenCards.pop()) # new card is interted into the first position
 
+    def returnCard(self, index: int, card: InterfaceCard) -> None:
+        """Undoes takeCard(index) that took `card`."""
+        if len(self._visibleCards) == 4:
+            # a hidden card replaced the taken one
+            self._hiddenCards.append(self._visibleCards.pop(0))
+        self._visibleCards.insert(index - 1, card)
+
+    def returnLastCard(self, card: InterfaceCard) -> None:
+        """Undoes removeLastCard that removed `card`."""
+        self._hiddenCards.append(self._visibleCards.pop(0))
+        self._visibleCards.append(card)
+
     def state(self) -> str:
         visible_cards_state: list[dict[str, Any]] = []
         for i, card in enumerate(self._visibleCards, start=1):
@@ -0,0 +1,240 @@
+"""
+Per-turn activation planner.
+
+Given the cards a player may still activate this turn, TurnPlanner searches
+every activation order and, for every card, every effect option with every
+payment and pollution placement the grid allows to find the sequence that
+maximizes an objective of the grid at the end of the turn. Every step is
+validated and applied by ProcessAction.activateCard on the player's grid
+and rolled back from a journal afterwards, so the plan only contains activations the game
+accepts.
+
+Visited (grid contents, cards already activated) states are memoized, and
+with the default objective branches that cannot beat the best line found so
+far are pruned.
+
+Use it in the simulator as "terra_futura.planner:PlannerBot".
+"""
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from .arbitrary_basic import ArbitraryBasic
+from .bots import Activation, GreedyBot, cardOptions, freePollutionSlots, getPlayer
+from .game import Game
+from .grid import GRID_POSITIONS
+from .interfaces import InterfaceCard, InterfaceGrid, ProcessActionInterface
+from .journal import Journal
+from .payments import distribute, payments
+from .process_action import ProcessAction
+from .scoring_method import BASE_SCORES
+from .simple_types import GridPosition, Resource
+from .transformation_fixed import TransformationFixed
+
+Objective = Callable[[InterfaceGrid], int]
+
+
+def gridValue(grid: InterfaceGrid) -> int:
+    """
+    Base score of the grid, as ScoringMethod counts it for every card once,
+    less one point for every pollution cube.
+    """
+    value = 0
+    for position in GRID_POSITIONS:
+        card = grid.getCard(position)
+        if card is None:
+            continue
+        if card.isActive():
+            value += sum(BASE_SCORES[resource] for resource in card.resources)
+            value -= card.pollutionSpacesL - freePollutionSlots(card)
+        else:
+            value -= 1 + card.pollutionSpacesL
+    return value
+
+
+def _effects(card: InterfaceCard) -> list[TransformationFixed | ArbitraryBasic]:
+    return [option for option in cardOptions(card) if isinstance(option, (TransformationFixed, ArbitraryBasic))]
+
+
+@dataclass(frozen=True)
+class TurnPlan:
+    value: int  # objective of the grid after all activations
+    activations: tuple[Activation, ...]
+
+
+class TurnPlanner:
+    """
+    Best activation sequence of one turn. The grid is changed while planning
+    but always restored before plan returns.
+    """
+
+    def __init__(self, grid: InterfaceGrid, objective: Objective = gridValue,
+                 processAction: Optional[ProcessActionInterface] = None) -> None:
+        self._grid = grid
+        self._objective = objective
+        self._processAction = processAction if processAction is not None else ProcessAction()
+        self._journal = Journal()
+        # cards do not move during a turn
+        self._cards = [grid.getCard(position) for position in GRID_POSITIONS]
+        # (grid key, cards left) -> (best value, first activation of the best line or None to stop, whether
+        # the value is exact rather than a bound of it)
+        self._memo: dict[tuple[tuple[Any, ...], frozenset[GridPosition]],
+                         tuple[int, Optional[Activation], bool]] = {}
+
+    def _key(self) -> tuple[Any, ...]:
+        key: list[Any] = []
+        for card in self._cards:
+            if card is None or not card.isActive():
+                key.append(card is not None)
+            else:
+                key.append((tuple(sorted(r.value for r in card.resources)), freePollutionSlots(card)))
+        return tuple(key)
+
+    def _gains(self, left: frozenset[GridPosition]) -> dict[GridPosition, int]:
+        """
+        Most the objective gridValue can grow by activating each card in
+        `left` once: the output of an option less the cheapest payment of it
+        from the resources on the grid or produced by the cards in `left`,
+        and less a point for every pollution cube.
+        """
+        available: Counter[Resource] = Counter()
+        for card in self._cards:
+            if card is not None and card.isActive():
+                available.update(card.resources)
+        effects: dict[GridPosition, list[TransformationFixed | ArbitraryBasic]] = {}
+        for position in left:
+            card = self._grid.getCard(position)
+            if card is not None and card.isActive():
+                effects[position] = _effects(card)
+                most: Counter[Resource] = Counter()
+                for option in effects[position]:
+                    most |= Counter(option.to)
+                available.update(most)
+        cheapest = sorted(BASE_SCORES[r] for r in available.elements())
+        gains: dict[GridPosition, int] = {}
+        for position, options in effects.items():
+            gain = 0
+            for option in options:
+                if isinstance(option, TransformationFixed):
+                    if Counter(option.from_) - available:
+                        continue
+                    cost = sum(BASE_SCORES[r] for r in option.from_)
+                else:
+                    if option.from_ > len(cheapest):
+                        continue
+                    cost = sum(cheapest[:option.from_])
+                gain = max(gain, sum(BASE_SCORES[r] for r in option.to) - cost - option.pollution)
+            gains[position] = gain
+        return gains
+
+    def _placements(self, amount: int) -> list[tuple[int, tuple[GridPosition, ...]]]:
+        """
+        Every placement of `amount` pollution cubes with the least it costs
+        gridValue: a point per cube and one more per card it deactivates,
+        cheapest first.
+        """
+        free = [(position, room) for position, card in zip(GRID_POSITIONS, self._cards)
+                if card is not None and (room := freePollutionSlots(card)) > 0]
+        slots = dict(free)
+        placements = [(amount + sum(1 for p, n in placement if n == slots[p]),
+                       tuple(p for p, n in placement for _ in range(n)))
+                      for placement in distribute(amount, free)]
+        placements.sort(key=lambda placement: placement[0])
+        return placements
+
+    def _search(self, activation: Activation, rest: frozenset[GridPosition],
+                reached: set[tuple[Any, ...]], floor: int) -> Optional[int]:
+        """Best value after the activation, or None if it is invalid or leaves a grid already searched."""
+        mark = self._apply(activation)
+        if mark is None:
+            return None
+        after = self._key()
+        candidate = None
+        if after not in reached:
+            reached.add(after)
+            candidate = self._best(rest, floor)
+        self._journal.rollback(mark)
+        return candidate
+
+    def _apply(self, activation: Activation) -> Optional[int]:
+        """Apply an activation if it is valid and return the journal mark to undo it."""
+        card = self._grid.getCard(activation.card)
+        assert card is not None
+        mark = self._journal.mark()
+        if self._processAction.activateCard(card, self._grid, list(activation.inputs), list(activation.outputs),
+                                            list(activation.pollution), self._journal):
+            return mark
+        return None
+
+    def _best(self, left: frozenset[GridPosition], floor: int = -(1 << 30)) -> int:
+        """
+        The best value reachable, if it is above `floor`; otherwise at most
+        `floor`. With gridValue, lines that cannot beat the floor are not searched.
+        """
+        key = (self._key(), left)
+        cached = self._memo.get(key)
+        if cached is not None and (cached[2] or cached[0] <= floor):
+            return cached[0]
+        here = value = self._objective(self._grid)
+        best: Optional[Activation] = None
+        gains = self._gains(left) if self._objective is gridValue else None
+        for position in left:
+            card = self._grid.getCard(position)
+            if card is None or not card.isActive():
+                continue
+            rest = left - {position}
+            # with gridValue an activation adds at most its output less what it pays and pollutes,
+            # so lines that cannot beat the best one found so far or the floor are not searched
+            ceiling = here + sum(gains.get(p, 0) for p in rest) if gains is not None else None
+            # payments and placements that leave the same grid are searched once
+            reached: set[tuple[Any, ...]] = set()
+            for option in _effects(card):
+                produced = sum(BASE_SCORES[r] for r in option.to)
+                outputs = tuple((resource, position) for resource in option.to)
+                placements = self._placements(option.pollution)
+                # cheapest payments and placements first: once one cannot beat the best line, the rest cannot
+                # either; the list is taken first as the grid changes while the lines are searched
+                for inputs in list(payments(self._grid, option, cheapestFirst=True)):
+                    gain = produced - sum(BASE_SCORES[resource] for resource, _ in inputs)
+                    if not placements or (ceiling is not None
+                                          and ceiling + gain - placements[0][0] <= max(value, floor)):
+                        break
+                    for cost, pollution in placements:
+                        if ceiling is not None and ceiling + gain - cost <= max(value, floor):
+                            break
+                        activation = Activation(position, inputs, outputs, pollution)
+                        candidate = self._search(activation, rest, reached, max(value, floor))
+                        if candidate is not None and candidate > value:
+                            value, best = candidate, activation
+        self._memo[key] = (value, best, True) if value > floor else (floor, None, False)
+        return value
+
+    def plan(self, positions: list[GridPosition]) -> TurnPlan:
+        """Best plan when each card at `positions` may be activated at most once."""
+        left = frozenset(positions)
+        value = self._best(left)
+        activations: list[Activation] = []
+        while True:
+            activation = self._memo[(self._key(), left)][1]
+            if activation is None:
+                break
+            mark = self._apply(activation)
+            assert mark is not None
+            activations.append(activation)
+            left = left - {activation.card}
+            self._best(left)
+        self._journal.rollback()
+        return TurnPlan(value, tuple(activations))
+
+
+def planTurn(grid: InterfaceGrid, positions: list[GridPosition], objective: Objective = gridValue) -> TurnPlan:
+    return TurnPlanner(grid, objective).plan(positions)
+
+
+class PlannerBot(GreedyBot):
+    """Greedy card choices, activations planned for the whole turn."""
+
+    def chooseActivation(self, game: Game, playerId: int,
+                         positions: list[GridPosition]) -> Optional[Activation]:
+        plan = planTurn(getPlayer(game, playerId).grid, positions)
+        return plan.activations[0] if plan.activations else None
@@ -1,73 +1,98 @@
+from typing import Optional
 from .simple_types import Resource, GridPosition
 from collections import Counter
-from .interfaces import InterfaceGrid, ProcessActionInterface, InterfaceCard
+from .interfaces import ActionPlan, InterfaceGrid, ProcessActionInterface, InterfaceCard
+from .journal import Journal
 
 class ProcessAction(ProcessActionInterface):
     def activateCard(self, card: InterfaceCard, grid: InterfaceGrid, 
                      inputs: list[tuple[Resource, GridPosition]], 
                      outputs: list[tuple[Resource, GridPosition]], 
-                     pollution: list[GridPosition]) -> bool:
+                     pollution: list[GridPosition], journal: Optional[Journal] = None) -> bool:
         """Checks whether the action is valid, and if so performs it."""
+        plan = self.plan(card, grid, inputs, outputs, pollution)
+        if plan is None:
+            return False
+        return self.apply(plan, journal)
+
+    def plan(self, card: InterfaceCard, grid: InterfaceGrid,
+             inputs: list[tuple[Resource, GridPosition]],
+             outputs: list[tuple[Resource, GridPosition]],
+             pollution: list[GridPosition]) -> Optional[ActionPlan]:
+        """Checks whether the action is valid, and if so returns it with its cards resolved."""
 
         if not card.isActive():
-            return False
+            return None
 
         #check pollution for each position
-        counted_pollution = Counter(pollution)
-        for position, count in counted_pollution.items():
+        pollution_plan: list[tuple[InterfaceCard, int]] = []
+        for position, count in Counter(pollution).items():
             pollution_card = grid.getCard(position)
             if pollution_card is None:
-                return False
+                return None
             if not pollution_card.canPlacePollution(count):
-                return False
+                return None
+            pollution_plan.append((pollution_card, count))
 
         #check inputs for each position
         inputs_grouped: dict[GridPosition, list[Resource]] = {}
         for resource, position in inputs:
             inputs_grouped.setdefault(position, []).append(resource)
 
+        inputs_plan: list[tuple[InterfaceCard, tuple[Resource, ...]]] = []
         for position, resources in inputs_grouped.items():
             input_card = grid.getCard(position)
             if input_card is None:
-                return False
+                return None
             if not input_card.canGetResources(resources):
-                return False
+                return None
+            inputs_plan.append((input_card, tuple(resources)))
 
         #check outputs for each position
         outputs_grouped: dict[GridPosition, list[Resource]] = {}
         outputs_resources: list[Resource] = []
+        outputs_plan: list[tuple[InterfaceCard, tuple[Resource, ...]]] = []
         for resource, position in outputs:
             outputs_grouped.setdefault(position, []).append(resource)
         if len(outputs_grouped) > 1:
-            return False
+            return None
         elif len(outputs_grouped) == 1:
             output_card_position = next(iter(outputs_grouped))
             outputs_resources = outputs_grouped[output_card_position]
             output_card = grid.getCard(output_card_position)
             if output_card is None:
-                return False
+                return None
             if output_card.state() != card.state() or not card.canPutResources(outputs_resources):
-                return False
+                return None
+            outputs_plan.append((output_card, tuple(outputs_resources)))
 
         inputs_resources: list[Resource] = [input[0] for input in inputs]
 
         if card.check(inputs_resources, outputs_resources, len(pollution)) or card.checkLower(inputs_resources, outputs_resources, len(pollution)):
-            #perform action
-            for position, count in counted_pollution.items():
-                pollution_card = grid.getCard(position)
-                if pollution_card is None:
-                    return False
-                pollution_card.placePollution(count)
-            for position, resources in inputs_grouped.items():
-                output_card = grid.getCard(position)
-                if output_card is None:
-                    return False
-                output_card.getResources(resources)
-            for position, resources in outputs_grouped.items():
-                input_card = grid.getCard(position)
-                if input_card is None:
-                    return False
-                input_card.putResources(resources)
-            return True
+            return ActionPlan(tuple(pollution_plan), tuple(inputs_plan), tuple(outputs_plan))
+
+        return None
 
-        return False
+    def apply(self, plan: ActionPlan, journal: Optional[Journal] = None) -> bool:
+        """
+        Performs a planned action: pollution first, then inputs and outputs.
+        Changes are recorded in the journal; if a step fails, all of them are
+        rolled back and False is returned.
+        """
+        journal = journal if journal is not None else Journal()
+        mark = journal.mark()
+        try:
+            for pollution_card, count in plan.pollution:
+                journal.record(pollution_card)
+                pollution_card.placePollution(count)
+            for input_card, resources in plan.inputs:
+                journal.record(input_card)
+                input_card.getResources(list(resources))
+            for output_card, resources in plan.outputs:
+                journal.record(output_card)
+                output_card.putResources(list(resources))
+        except ValueError:
+            # e.g. pollution deactivated a card the action pays from
+            journal.rollback(mark)
+            return False
+        return True
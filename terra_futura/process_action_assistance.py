@@ -1,43 +1,56 @@
+from typing import Optional
 from .simple_types import Resource, GridPosition
-from .interfaces import ProcessActionAssistanceInterface, InterfaceGrid, InterfaceCard, PlayerInterface
+from .interfaces import ActionPlan, ProcessActionAssistanceInterface, InterfaceGrid, InterfaceCard, PlayerInterface
+from .journal import Journal
 from collections import Counter
 
 class ProcessActionAssistance(ProcessActionAssistanceInterface):
     def activateCard(self, card: InterfaceCard, grid: InterfaceGrid, assistingPlayer: PlayerInterface, 
                      assistingCard: InterfaceCard, inputs: list[tuple[Resource, GridPosition]], 
                      outputs: list[tuple[Resource, GridPosition]], 
-                     pollution: list[GridPosition]) -> bool:
-        
-        
+                     pollution: list[GridPosition], journal: Optional[Journal] = None) -> bool:
         """Checks whether the action is valid, and if so performs it."""
-        if card.hasAssistance() == False:
+        plan = self.plan(card, grid, assistingPlayer, assistingCard, inputs, outputs, pollution)
+        if plan is None:
             return False
+        return self.apply(plan, journal)
+
+    def plan(self, card: InterfaceCard, grid: InterfaceGrid, assistingPlayer: PlayerInterface,
+             assistingCard: InterfaceCard, inputs: list[tuple[Resource, GridPosition]],
+             outputs: list[tuple[Resource, GridPosition]],
+             pollution: list[GridPosition]) -> Optional[ActionPlan]:
+        """Checks whether the action is valid, and if so returns it with its cards resolved."""
+        if card.hasAssistance() == False:
+            return None
 
         otherGrid = assistingPlayer.getGrid()
         
         if not card.isActive() or not assistingCard.isActive():
-            return False
+            return None
 
         #check pollution for each position
-        counted_pollution = Counter(pollution)
-        for position, count in counted_pollution.items():
+        pollution_plan: list[tuple[InterfaceCard, int]] = []
+        for position, count in Counter(pollution).items():
             pollution_card = grid.getCard(position)
             if pollution_card is None:
-                return False
+                return None
             if not pollution_card.canPlacePollution(count):
-                return False
+                return None
+            pollution_plan.append((pollution_card, count))
 
         #check inputs for each position
         inputs_grouped: dict[GridPosition, list[Resource]] = {}
         for resource, position in inputs:
             inputs_grouped.setdefault(position, []).append(resource)
 
+        inputs_plan: list[tuple[InterfaceCard, tuple[Resource, ...]]] = []
         for position, resources in inputs_grouped.items():
             input_card = grid.getCard(position)
             if input_card is None:
-                return False
+                return None
             if not input_card.canGetResources(resources):
-                return False
+                return None
+            inputs_plan.append((input_card, tuple(resources)))
 
         otherPlayerCard = None
         for row in range(-2, 3):
@@ -47,45 +60,53 @@ class ProcessActionAssistance(ProcessActionAssistanceInterface):
                     otherPlayerCard = otherGrid.getCard(GridPosition(row, col))
         
         if not otherPlayerCard:
-            return False
+            return None
 
         #check outputs for each position
         outputs_grouped: dict[GridPosition, list[Resource]] = {}
         outputs_resources: list[Resource] = []
+        outputs_plan: list[tuple[InterfaceCard, tuple[Resource, ...]]] = []
         for resource, position in outputs:
             outputs_grouped.setdefault(position, []).append(resource)
         if len(outputs_grouped) > 1:
-            return False
+            return None
 
         elif len(outputs_grouped) == 1:
             output_card_position = next(iter(outputs_grouped))
             outputs_resources = outputs_grouped[output_card_position]
             output_card = grid.getCard(output_card_position)
             if output_card is None:
-                return False
+                return None
             if not card.canPutResources(outputs_resources) or not output_card.hasAssistance() or not card.state() == output_card.state():
-                return False
+                return None
+            outputs_plan.append((output_card, tuple(outputs_resources)))
 
         inputs_resources: list[Resource] = [input[0] for input in inputs]
 
         if assistingCard.check(inputs_resources, outputs_resources, len(pollution)) or assistingCard.checkLower(inputs_resources, outputs_resources, len(pollution)):
-            #perform action
-            for position, resources in inputs_grouped.items():
-                output_card = grid.getCard(position)
-                if output_card is None:
-                    return False
-                output_card.getResources(resources)
-            for position, resources in outputs_grouped.items():
-                input_card = grid.getCard(position)
-                if input_card is None:
-                    return False
-                input_card.putResources(resources)
-            for position, count in counted_pollution.items():
-                pollution_card = grid.getCard(position)
-                if pollution_card is None:
-                    return False
-                pollution_card.placePollution(count)
-            #SelectReward()  
-            return True
+            return ActionPlan(tuple(pollution_plan), tuple(inputs_plan), tuple(outputs_plan))
 
-        return False
+        return None
+
+    def apply(self, plan: ActionPlan, journal: Optional[Journal] = None) -> bool:
+        """
+        Performs a planned action: inputs, outputs, then pollution. Changes are
+        recorded in the journal; if a step fails, all of them are rolled back
+        and False is returned.
+        """
+        journal = journal if journal is not None else Journal()
+        mark = journal.mark()
+        try:
+            for input_card, resources in plan.inputs:
+                journal.record(input_card)
+                input_card.getResources(list(resources))
+            for output_card, resources in plan.outputs:
+                journal.record(output_card)
+                output_card.putResources(list(resources))
+            for pollution_card, count in plan.pollution:
+                journal.record(pollution_card)
+                pollution_card.placePollution(count)
+        except ValueError:
+            journal.rollback(mark)
+            return False
+        return True
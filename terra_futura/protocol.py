@@ -0,0 +1,133 @@
+from __future__ import annotations
+from typing import Any, Optional
+from .commands import TURN_METHODS, TurnStep
+from .game import Game
+from .simple_types import CardSource, Deck, GridPosition, Resource
+
+# Methods of TerraFuturaInterface that clients may call remotely.
+ACTIONS = TURN_METHODS | {"submitTurn"}
+
+
+class ProtocolError(ValueError):
+    """Raised when a message cannot be decoded into a game action."""
+
+
+def encodePosition(position: GridPosition) -> list[int]:
+    return [position.x, position.y]
+
+
+def decodePosition(value: Any) -> GridPosition:
+    if not isinstance(value, list) or len(value) != 2 or not all(isinstance(v, int) for v in value):
+        raise ProtocolError(f"Invalid grid position: {value!r}")
+    try:
+        return GridPosition(value[0], value[1])
+    except ValueError as e:
+        raise ProtocolError(f"Grid position out of range: {value!r}") from e
+
+
+def decodeResource(value: Any) -> Resource:
+    if not isinstance(value, str) or value not in Resource.__members__:
+        raise ProtocolError(f"Invalid resource: {value!r}")
+    return Resource[value]
+
+
+def decodeDeck(value: Any) -> Deck:
+    if not isinstance(value, str) or value not in Deck.__members__:
+        raise ProtocolError(f"Invalid deck: {value!r}")
+    return Deck[value]
+
+
+def _int(params: dict[str, Any], name: str) -> int:
+    value = params.get(name)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ProtocolError(f"Parameter '{name}' must be an integer")
+    return value
+
+
+def _optionalInt(params: dict[str, Any], name: str) -> Optional[int]:
+    if params.get(name) is None:
+        return None
+    return _int(params, name)
+
+
+def _list(params: dict[str, Any], name: str) -> list[Any]:
+    value = params.get(name, [])
+    if not isinstance(value, list):
+        raise ProtocolError(f"Parameter '{name}' must be a list")
+    return value
+
+
+def _placements(params: dict[str, Any], name: str) -> list[tuple[Resource, GridPosition]]:
+    placements: list[tuple[Resource, GridPosition]] = []
+    for item in _list(params, name):
+        if not isinstance(item, list) or len(item) != 2:
+            raise ProtocolError(f"Parameter '{name}' must hold [resource, position] pairs")
+        placements.append((decodeResource(item[0]), decodePosition(item[1])))
+    return placements
+
+
+def decodeArgs(method: str, params: dict[str, Any]) -> tuple[Any, ...]:
+    """
+    Decode JSON parameters of `method` into its arguments.
+
+    Parameter names are the argument names of TerraFuturaInterface. Positions
+    are [x, y] pairs, resources and decks are enum member names, for example
+    {"playerId": 1, "source": {"deck": "LEVEL_I", "index": 2}, "cardIndex": 2,
+    "destination": [0, 1]} for takeCard.
+    """
+    if method not in TURN_METHODS:
+        raise ProtocolError(f"Unknown method: {method!r}")
+    playerId = _int(params, "playerId")
+
+    if method == "takeCard":
+        source = params.get("source")
+        if not isinstance(source, dict):
+            raise ProtocolError("Parameter 'source' must be an object")
+        return (playerId, CardSource(decodeDeck(source.get("deck")), _int(source, "index")),
+                _int(params, "cardIndex"), decodePosition(params.get("destination")))
+    if method == "discardLastCardFromDeck":
+        return (playerId, decodeDeck(params.get("deck")))
+    if method == "activateCard":
+        otherCard = params.get("otherCard")
+        return (playerId, decodePosition(params.get("card")),
+                _placements(params, "inputs"), _placements(params, "outputs"),
+                [decodePosition(p) for p in _list(params, "pollution")],
+                _optionalInt(params, "otherPlayerId"),
+                None if otherCard is None else decodePosition(otherCard))
+    if method == "selectReward":
+        return (playerId, decodeResource(params.get("resource")))
+    if method == "turnFinished":
+        return (playerId,)
+    return (playerId, _int(params, "card"))
+
+
+def decodeSteps(params: dict[str, Any]) -> list[TurnStep]:
+    """
+    Decode the steps of submitTurn, e.g. {"steps": [{"method": "takeCard",
+    "params": {...}}, {"method": "turnFinished", "params": {"playerId": 1}}]}.
+    """
+    steps: list[TurnStep] = []
+    for step in _list(params, "steps"):
+        if not isinstance(step, dict) or not isinstance(step.get("params"), dict):
+            raise ProtocolError("Every step must be an object with 'method' and 'params'")
+        method = step.get("method")
+        if not isinstance(method, str):
+            raise ProtocolError(f"Invalid step method: {method!r}")
+        steps.append(TurnStep(method, decodeArgs(method, step["params"])))
+    return steps
+
+
+def callAction(game: Game, method: str, params: dict[str, Any]) -> Any:
+    """
+    Decode JSON parameters of `method` and perform it on `game`. The optional
+    parameters "expectedVersion" and "idempotencyKey" are those of Game.perform.
+    """
+    expectedVersion = _optionalInt(params, "expectedVersion")
+    idempotencyKey = params.get("idempotencyKey")
+    if idempotencyKey is not None and not isinstance(idempotencyKey, str):
+        raise ProtocolError("Parameter 'idempotencyKey' must be a string")
+    if method == "submitTurn":
+        args: tuple[Any, ...] = (decodeSteps(params),)
+    else:
+        args = decodeArgs(method, params)
+    return game.perform(method, args, expectedVersion, idempotencyKey)
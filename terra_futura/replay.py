@@ -0,0 +1,227 @@
+"""
+Replay files for reviewing games.
+
+A replay holds the stream of accepted actions of one game and a full
+checkpoint of the game every `checkpointEvery` actions, so the state after
+any action is one checkpoint load plus a short replay away:
+
+    with ReplayReader("game.tfr") as replay:
+        game = replay.stateAfter(replay.find(turn=7, method="activateCard", occurrence=2))
+
+Layout, all integers little endian:
+
+    b"TFREPLAY" version:u32
+    records, each length:u32 followed by a pickled action or a checkpoint
+    action index, one _ENTRY per action in order
+    checkpoint index, one _CHECKPOINT per checkpoint in order
+    footer: _FOOTER
+
+Actions are indexed by the turn number and the player on turn when they
+were made, and by method, so find only reads the index. The reader maps the
+file and decodes nothing but the index entries it searches and the records
+it replays. A submitTurn batch is one action of the stream.
+
+Record a game by attaching a ReplayWriter before the first action, or with
+`python -m terra_futura.simulate --replays DIR`; show a recorded state with
+`python -m terra_futura.replay FILE --turn 7 --method activateCard --occurrence 2`.
+"""
+from __future__ import annotations
+import argparse
+import mmap
+import pickle
+import struct
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Any, BinaryIO, Optional
+from .commands import TURN_METHODS
+from .game import Game
+from .game_observer import GameObserver
+from .hibernation import hibernate, rehydrate
+from .interfaces import GameObserverInterface
+
+_MAGIC = b"TFREPLAY"
+_VERSION = 1
+_HEADER = struct.Struct("<8sI")
+_LENGTH = struct.Struct("<I")
+# record offset, turn number, player on turn, method
+_ENTRY = struct.Struct("<QIqB")
+# actions before the checkpoint, record offset
+_CHECKPOINT = struct.Struct("<QQ")
+# action count, checkpoint count, action index offset, magic
+_FOOTER = struct.Struct("<QQQ8s")
+
+# method codes of the action index; only ever append to this tuple
+METHODS = ("takeCard", "discardLastCardFromDeck", "activateCard", "selectReward", "turnFinished",
+           "selectActivationPattern", "selectScoring", "submitTurn", "undo", "redo", "rememberResult")
+assert TURN_METHODS <= set(METHODS)
+
+
+@dataclass(frozen=True)
+class ReplayAction:
+    number: int    # position in the stream, from 0
+    turn: int      # turn number when the action was made
+    playerId: int  # player on turn when the action was made
+    method: str
+    args: tuple[Any, ...]
+
+
+class ReplayWriter:
+    """
+    Records the game into a replay file: attaches itself as the action log of
+    the game and writes the index when closed.
+    """
+
+    def __init__(self, path: str, game: Game, checkpointEvery: int = 16) -> None:
+        if checkpointEvery < 1:
+            raise ValueError("Checkpoints must be written at least every action")
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION))
+        self._game = game
+        self._checkpointEvery = checkpointEvery
+        self._entries: list[bytes] = []
+        self._checkpoints: list[bytes] = []
+        # the action about to be made is made in this turn by this player
+        self._turn = game.turnNumber
+        self._playerId = game.onTurn()
+        self._checkpoint(game)
+        game.actionLog = self
+
+    def __enter__(self) -> ReplayWriter:
+        return self
+
+    def __exit__(self, excType: Optional[type[BaseException]], exc: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    def _write(self, data: bytes) -> int:
+        offset = self._file.tell()
+        self._file.write(_LENGTH.pack(len(data)))
+        self._file.write(data)
+        return offset
+
+    def _checkpoint(self, game: Game) -> None:
+        self._checkpoints.append(_CHECKPOINT.pack(len(self._entries), self._write(hibernate(game))))
+
+    def append(self, game: Game, method: str, args: tuple[Any, ...]) -> None:
+        offset = self._write(pickle.dumps((method, args), pickle.HIGHEST_PROTOCOL))
+        self._entries.append(_ENTRY.pack(offset, self._turn, self._playerId, METHODS.index(method)))
+        self._turn, self._playerId = game.turnNumber, game.onTurn()
+        if len(self._entries) % self._checkpointEvery == 0:
+            self._checkpoint(game)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        if self._game.actionLog is self:
+            self._game.actionLog = None
+        indexOffset = self._file.tell()
+        self._file.write(b"".join(self._entries))
+        self._file.write(b"".join(self._checkpoints))
+        self._file.write(_FOOTER.pack(len(self._entries), len(self._checkpoints), indexOffset, _MAGIC))
+        self._file.close()
+
+
+class ReplayReader:
+    """Random access to a replay file through a read-only memory map."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size + _FOOTER.size:
+            raise ValueError(f"{path} is not a complete replay")
+        magic, version = _HEADER.unpack_from(self._map, 0)
+        footer: tuple[int, int, int, bytes] = _FOOTER.unpack_from(self._map, len(self._map) - _FOOTER.size)
+        self._actions, self._checkpoints, self._indexOffset, end = footer
+        if magic != _MAGIC or end != _MAGIC:
+            raise ValueError(f"{path} is not a complete replay")
+        if version != _VERSION:
+            raise ValueError(f"Unsupported replay version {version}")
+        self._checkpointOffset = self._indexOffset + self._actions * _ENTRY.size
+
+    def __enter__(self) -> ReplayReader:
+        return self
+
+    def __exit__(self, excType: Optional[type[BaseException]], exc: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self._actions
+
+    def _record(self, offset: int) -> bytes:
+        (length,) = _LENGTH.unpack_from(self._map, offset)
+        start = offset + _LENGTH.size
+        return self._map[start:start + length]
+
+    def _entry(self, number: int) -> tuple[int, int, int, int]:
+        if not 0 <= number < self._actions:
+            raise IndexError(number)
+        entry: tuple[int, int, int, int] = _ENTRY.unpack_from(self._map, self._indexOffset + number * _ENTRY.size)
+        return entry
+
+    def action(self, number: int) -> ReplayAction:
+        offset, turn, playerId, _ = self._entry(number)
+        method, args = pickle.loads(self._record(offset))
+        return ReplayAction(number, turn, playerId, method, args)
+
+    def find(self, turn: int, method: Optional[str] = None, occurrence: int = 1,
+             playerId: Optional[int] = None) -> int:
+        """
+        Number of the `occurrence`-th action of the turn, counted from 1, that
+        calls `method` (any method by default) by `playerId` (anyone by default).
+        """
+        code = METHODS.index(method) if method is not None else None
+        seen = 0
+        # turn numbers may go back after an undo, so every entry is checked
+        for number in range(self._actions):
+            _, actionTurn, actionPlayer, actionCode = self._entry(number)
+            if actionTurn == turn and (code is None or actionCode == code) and \
+                    (playerId is None or actionPlayer == playerId):
+                seen += 1
+                if seen == occurrence:
+                    return number
+        raise KeyError(f"No action {occurrence} of {method or 'any method'} in turn {turn}")
+
+    def stateAfter(self, number: int, observer: Optional[GameObserverInterface] = None) -> Game:
+        """The game after action `number`, or before the first one for -1."""
+        if not -1 <= number < self._actions:
+            raise IndexError(number)
+        # the last checkpoint made after at most number + 1 actions
+        low, high = 0, self._checkpoints
+        while high - low > 1:
+            middle = (low + high) // 2
+            if _CHECKPOINT.unpack_from(self._map, self._checkpointOffset + middle * _CHECKPOINT.size)[0] <= number + 1:
+                low = middle
+            else:
+                high = middle
+        done, offset = _CHECKPOINT.unpack_from(self._map, self._checkpointOffset + low * _CHECKPOINT.size)
+        game = rehydrate(self._record(offset), observer if observer is not None else GameObserver({}))
+        for following in range(done, number + 1):
+            action = self.action(following)
+            game.replay(action.method, action.args)
+        return game
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Show the state of a recorded Terra Futura game.")
+    parser.add_argument("replay")
+    parser.add_argument("--turn", type=int, required=True)
+    parser.add_argument("--method", default=None, choices=METHODS)
+    parser.add_argument("--occurrence", type=int, default=1)
+    parser.add_argument("--player", type=int, default=None)
+    args = parser.parse_args(argv)
+    with ReplayReader(args.replay) as replay:
+        number = replay.find(args.turn, args.method, args.occurrence, args.player)
+        action = replay.action(number)
+        game = replay.stateAfter(number)
+    print(f"after action {number}: {action.method} by player {action.playerId} in turn {action.turn}")
+    print(f"state {game.state.name}, turn {game.turnNumber}, player {game.onTurn()} on turn")
+    for player in game.players:
+        print(f"player {player.id}: {player.grid.state()}")
+
+
+if __name__ == "__main__":
+    main()
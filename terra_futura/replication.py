@@ -0,0 +1,353 @@
+"""
+Hot-standby replication of hosted games.
+
+A GameServer given a Replicator streams every game it hosts to a follower
+process over a loopback socket: an image of the game when hosting starts (see
+hibernation), then every accepted action as the game's action log reports
+it, and finally the closing of the game. The follower performs the actions
+again with Game.replay, which neither notifies nor logs, and acknowledges
+what it applied. Frames are unpickled like hibernated games, refusing
+anything but game classes. A frame it cannot apply, e.g. an action of a
+game it has no image of, is counted and skipped; only losing the
+connection ends the stream. The stream is not authenticated, so the
+follower listens on loopback only, whatever host it serves on once
+promoted. If the primary fails, Follower.promote hosts the replicas on a
+server of the follower with their full state, undo history included.
+
+On the primary, an action costs one pickle of its arguments and an append
+to a buffer. The buffer is written to the socket once per event loop
+iteration, after the action was answered, and acknowledgements are read
+by a task of their own. Replication is asynchronous, so an answered action
+that was not sent yet is lost with the primary. ReplicationMetrics tells
+how far behind the follower is: the actions sent but not acknowledged yet
+and the age of the oldest of them. A follower that goes away stops the
+replication; the primary keeps serving.
+
+    python -m terra_futura.replication --listen 9000 --port 8765
+    python -m terra_futura.server --port 8764 --replicate-to 127.0.0.1:9000
+
+runs a follower that takes over serving on port 8765 when the stream of its
+primary ends. `python -m terra_futura.replication --benchmark` measures what
+replication adds to the primary's actions and the lag of a follower process.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import multiprocessing
+import pickle
+import struct
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from typing import TYPE_CHECKING, Any, Optional
+from .bots import GameDriver, RandomBot
+from .factories import GameFactory
+from .game import Game
+from .game_observer import GameObserver
+from .hibernation import hibernate, rehydrate, unpickle
+from .interfaces import ActionLogInterface
+from .metrics import percentile
+from .replay import METHODS
+from .simple_types import GameState
+
+if TYPE_CHECKING:
+    from .server import GameServer
+
+SNAPSHOT = 0
+ACTION = 1
+CLOSE = 2
+
+_FRAME = struct.Struct("<BIQI")  # kind, game, sequence number, payload length
+_ACK = struct.Struct("<Q")       # sequence number of the last frame applied
+
+
+@dataclass
+class ReplicationMetrics:
+    sent: int = 0          # frames: snapshots, actions and closings
+    acknowledged: int = 0  # sequence number of the last frame the follower applied
+    actions: int = 0       # actions sent
+    connected: bool = True
+    # sequence number and time.monotonic() of every action sent and not acknowledged yet
+    pending: deque[tuple[int, float]] = field(default_factory=deque)
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=10000))  # until acknowledged
+
+    @property
+    def lagActions(self) -> int:
+        return len(self.pending)
+
+    @property
+    def lagSeconds(self) -> float:
+        return time.monotonic() - self.pending[0][1] if self.pending else 0.0
+
+    def percentile(self, p: float) -> float:
+        return percentile(self.latencies, p)
+
+    def summary(self) -> str:
+        return (f"connected={self.connected} actions={self.actions} lag_actions={self.lagActions} "
+                f"lag={self.lagSeconds * 1000:.3f}ms replication_p50={self.percentile(0.5) * 1000:.3f}ms "
+                f"replication_p99={self.percentile(0.99) * 1000:.3f}ms")
+
+
+class _ReplicatedLog:
+    """Action log of a replicated game, in front of the log it had before (e.g. a GameStore's)."""
+
+    def __init__(self, replicator: Replicator, gameId: int, inner: Optional[ActionLogInterface]) -> None:
+        self._replicator = replicator
+        self._gameId = gameId
+        self.inner = inner
+
+    def append(self, game: Game, method: str, args: tuple[Any, ...]) -> None:
+        if self.inner is not None:
+            self.inner.append(game, method, args)
+        self._replicator._action(self._gameId, method, args)  # pylint: disable=protected-access
+
+
+class Replicator:
+    """The primary's end of a replication stream; create it with connect."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writer = writer
+        self._loop = asyncio.get_running_loop()
+        self._buffer = bytearray()
+        self._flushing = False
+        self._seq = 0
+        self._caughtUp = asyncio.Event()
+        self.metrics = ReplicationMetrics()
+        self._acks = self._loop.create_task(self._readAcks(reader))
+
+    @classmethod
+    async def connect(cls, host: str, port: int) -> Replicator:
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    def _send(self, kind: int, gameId: int, payload: bytes) -> int:
+        self._seq += 1
+        self.metrics.sent += 1
+        if self.metrics.connected:
+            self._buffer += _FRAME.pack(kind, gameId, self._seq, len(payload))
+            self._buffer += payload
+            if not self._flushing:
+                self._flushing = True
+                self._loop.call_soon(self._flush)
+        return self._seq
+
+    def _flush(self) -> None:
+        self._flushing = False
+        if self.metrics.connected and self._buffer:
+            self._writer.write(bytes(self._buffer))
+        self._buffer.clear()
+
+    def _action(self, gameId: int, method: str, args: tuple[Any, ...]) -> None:
+        seq = self._send(ACTION, gameId, pickle.dumps((method, args), pickle.HIGHEST_PROTOCOL))
+        self.metrics.actions += 1
+        if self.metrics.connected:
+            self.metrics.pending.append((seq, time.monotonic()))
+
+    def attach(self, gameId: int, game: Game) -> None:
+        """Replicate the game from now on."""
+        game.actionLog = _ReplicatedLog(self, gameId, game.actionLog)
+        self._send(SNAPSHOT, gameId, hibernate(game))
+
+    def detach(self, gameId: int) -> None:
+        self._send(CLOSE, gameId, b"")
+
+    async def _readAcks(self, reader: asyncio.StreamReader) -> None:
+        metrics = self.metrics
+        try:
+            while True:
+                (seq,) = _ACK.unpack(await reader.readexactly(_ACK.size))
+                metrics.acknowledged = seq
+                now = time.monotonic()
+                while metrics.pending and metrics.pending[0][0] <= seq:
+                    metrics.latencies.append(now - metrics.pending.popleft()[1])
+                if seq == self._seq:
+                    self._caughtUp.set()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            metrics.connected = False
+            self._buffer.clear()
+            self._caughtUp.set()
+
+    async def synced(self) -> None:
+        """Wait until the follower applied everything sent so far, or is gone."""
+        while self.metrics.connected and self.metrics.acknowledged < self._seq:
+            self._caughtUp.clear()
+            await self._caughtUp.wait()
+
+    async def close(self) -> None:
+        self._flush()
+        self._writer.close()
+        self._acks.cancel()
+
+
+class Follower:
+    """Replicas of the games of one primary at a time."""
+
+    def __init__(self) -> None:
+        self._replicas: dict[int, tuple[Game, GameObserver]] = {}
+        self.applied = 0  # frames
+        self.rejected = 0  # frames that could not be applied
+        self.lastRejection: Optional[Exception] = None
+        self._seq = 0
+        self._ackDue = False
+        self._ended: Optional[asyncio.Event] = None
+
+    @property
+    def games(self) -> dict[int, Game]:
+        return {gameId: game for gameId, (game, _) in self._replicas.items()}
+
+    def _apply(self, kind: int, gameId: int, payload: bytes) -> None:
+        if kind == SNAPSHOT:
+            observer = GameObserver({})
+            self._replicas[gameId] = (rehydrate(payload, observer), observer)
+        elif kind == ACTION:
+            if gameId not in self._replicas:
+                raise ValueError(f"Action of unknown game {gameId}")
+            method, args = unpickle(payload)
+            if method not in METHODS:
+                raise ValueError(f"Unknown action {method!r}")
+            self._replicas[gameId][0].replay(method, args)
+        elif kind == CLOSE:
+            self._replicas.pop(gameId, None)
+        else:
+            raise ValueError(f"Unknown replication frame {kind}")
+        self.applied += 1
+
+    def _acknowledge(self, writer: asyncio.StreamWriter) -> None:
+        self._ackDue = False
+        writer.write(_ACK.pack(self._seq))
+
+    async def handleStream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    kind, gameId, seq, length = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+                    payload = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                try:
+                    self._apply(kind, gameId, payload)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    # a bad frame is no sign of a failed primary, the stream goes on
+                    self.rejected += 1
+                    self.lastRejection = e
+                self._seq = seq
+                # one acknowledgement for all frames that arrived together
+                if not self._ackDue:
+                    self._ackDue = True
+                    loop.call_soon(self._acknowledge, writer)
+        finally:
+            writer.close()
+            self.ended.set()
+
+    @property
+    def ended(self) -> asyncio.Event:
+        """Set when the stream of a primary ends, e.g. because the primary failed."""
+        if self._ended is None:
+            self._ended = asyncio.Event()
+        return self._ended
+
+    async def start(self, host: str = "127.0.0.1", port: int = 9000) -> asyncio.Server:
+        self.ended.clear()
+        return await asyncio.start_server(self.handleStream, host, port, limit=1 << 20)
+
+    def promote(self, server: GameServer) -> None:
+        """Hand every replica to `server` to host; the follower is empty afterwards."""
+        for gameId, (game, observer) in sorted(self._replicas.items()):
+            server.hostGame(gameId, game, observer)
+        self._replicas = {}
+
+
+def _runFollower(connection: Connection) -> None:
+    async def follow() -> None:
+        follower = Follower()
+        tcp = await follower.start(port=0)
+        connection.send(tcp.sockets[0].getsockname()[1])
+        async with tcp:
+            await follower.ended.wait()
+
+    asyncio.run(follow())
+
+
+async def _playTimed(game: Game, seed: int, latencies: list[float]) -> None:
+    driver, bot = GameDriver(game), RandomBot(seed)
+    while game.state != GameState.Finish:
+        start = time.perf_counter()
+        driver.step(bot)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+
+
+async def _benchmarkRun(games: int, replicator: Optional[Replicator]) -> list[float]:
+    played = [GameFactory(seed).createGame([1, 2]) for seed in range(games)]
+    if replicator is not None:
+        for gameId, game in enumerate(played):
+            replicator.attach(gameId, game)
+    latencies: list[float] = []
+    await asyncio.gather(*(_playTimed(game, seed, latencies) for seed, game in enumerate(played)))
+    if replicator is not None:
+        await replicator.synced()
+    return latencies
+
+
+async def benchmark(games: int) -> str:
+    """Steps of `games` concurrent games with and without a follower process."""
+    baseline = await _benchmarkRun(games, None)
+    context = multiprocessing.get_context()
+    parent, child = context.Pipe()
+    process = context.Process(target=_runFollower, args=(child,), daemon=True)
+    process.start()
+    try:
+        port = await asyncio.get_running_loop().run_in_executor(None, parent.recv)
+        replicator = await Replicator.connect("127.0.0.1", port)
+        replicated = await _benchmarkRun(games, replicator)
+        await replicator.close()
+    finally:
+        process.join(5)
+        process.terminate()
+
+    def mean(values: list[float]) -> float:
+        return sum(values) / len(values) * 1e6
+
+    return (f"{len(replicated)} actions: {mean(baseline):.1f}us per action alone, {mean(replicated):.1f}us "
+            f"replicated\n{replicator.metrics.summary()}")
+
+
+async def _follow(listen: int, host: str, port: int) -> None:
+    from .server import GameServer  # pylint: disable=import-outside-toplevel
+    follower = Follower()
+    stream = await follower.start("127.0.0.1", listen)
+    print(f"Following on 127.0.0.1:{listen}")
+    async with stream:
+        await follower.ended.wait()
+    server = GameServer()
+    follower.promote(server)
+    tcp = await server.start(host, port)
+    async with tcp:
+        print(f"Promoted: serving {len(server.games)} games on {host}:{port}")
+        await tcp.serve_forever()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Follow a Terra Futura server and take over when it fails.")
+    parser.add_argument("--host", default="127.0.0.1", help="host to serve on once promoted")
+    parser.add_argument("--listen", type=int, default=9000, help="loopback port the primary streams to")
+    parser.add_argument("--port", type=int, default=8765, help="port to serve on once promoted")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="measure the cost of replication on the primary instead of following")
+    parser.add_argument("--games", type=int, default=64, help="concurrent games of the benchmark")
+    args = parser.parse_args(argv)
+    try:
+        if args.benchmark:
+            print(asyncio.run(benchmark(args.games)))
+        else:
+            asyncio.run(_follow(args.listen, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,16 @@ from terra_futura.simple_types import Resource, Points, GridPosition
 from typing import Optional
 from terra_futura.interfaces import InterfaceGrid
 
+# Points for every resource left on an active card at the end of the game.
+BASE_SCORES: dict[Resource, int] = {Resource.RED: 1,
+                                    Resource.GREEN: 1,
+                                    Resource.YELLOW: 1,
+                                    Resource.CONSTRUCTION: 5,
+                                    Resource.FOOD: 5,
+                                    Resource.GOODS: 6,
+                                    Resource.POLLUTION: 0,
+                                    Resource.MONEY: 0}
+
 class ScoringMethod:
     resources: list[Resource]
     pointsPerCombination: Points
@@ -21,16 +31,9 @@ class ScoringMethod:
         self.calculatedTotal = None
         self.grid = grid
 
-    def selectThisMethodAndCalculate(self) -> None:
+    def calculate(self) -> Points:
+        """Points the grid would score with this method, without selecting it."""
         resources = {resource: 0 for resource in Resource}
-        baseScores = {Resource.RED: 1,
-                      Resource.GREEN: 1,
-                      Resource.YELLOW: 1,
-                      Resource.CONSTRUCTION: 5,
-                      Resource.FOOD: 5,
-                      Resource.GOODS: 6,
-                      Resource.POLLUTION: 0,
-                      Resource.MONEY: 0}
         calculatedTotal = 0
 
         for row in range(-2, 3):
@@ -45,9 +48,7 @@ class ScoringMethod:
 
 
         for resource in Resource:
-            calculatedTotal += baseScores[resource]*resources[resource]
-
-        self.calculatedTotal = Points(calculatedTotal)
+            calculatedTotal += BASE_SCORES[resource]*resources[resource]
 
         assert self.pointsPerCombination.value >= 0
         
@@ -59,7 +60,10 @@ class ScoringMethod:
         for resource in combinations.keys():
             m = min(m, resources[resource]//combinations[resource])
 
-        self.calculatedTotal = Points(self.calculatedTotal.value + m*self.pointsPerCombination.value)
+        return Points(calculatedTotal + m*self.pointsPerCombination.value)
+
+    def selectThisMethodAndCalculate(self) -> None:
+        self.calculatedTotal = self.calculate()
 
     def state(self) -> str:
         if self.calculatedTotal == None:
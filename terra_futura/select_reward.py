@@ -46,6 +46,12 @@ class SelectReward(InterfaceSelectReward):
         if self._card is not None:
             self._card.putResources([resource])
 
+    def unselectReward(self, resource: Resource) -> None:
+        """Undoes selectReward(resource)."""
+        if self._card is not None:
+            self._card.getResources([resource])
+        self._selection.append(resource)
+
     def state(self)-> str:
         resources_str = ', '.join([f'"{r.name}"' for r in self._selection])
         return f'{{"player": {self._player}, "available_resources": [{resources_str}]}}'
\ No newline at end of file
@@ -0,0 +1,447 @@
+"""
+Local TCP game server speaking newline-delimited JSON.
+
+Every request is one JSON object per line:
+
+    {"id": 1, "method": "createGame", "params": {"players": [1, 2], "seed": 7}}
+    {"id": 2, "method": "subscribe", "game": 0, "params": {"playerId": 1}}
+    {"id": 3, "method": "takeCard", "game": 0, "params": {"playerId": 1, ...}}
+
+and is answered with {"id": ..., "result": ...} or {"id": ..., "error": "..."}.
+Game methods and their parameters are those of TerraFuturaInterface (see
+protocol.callAction). Observer updates of subscribed seats are pushed on the
+same connection as {"event": "notify", "game": ..., "player": ..., "state": ...},
+so one connection can drive and watch any number of games.
+
+Responses to actions carry the version of the game (Game.version), which
+is also part of every notified state. Clients racing on a shared game pass
+the version they acted on as "expectedVersion": the action is rejected
+with result false when somebody else changed the game first. An
+"idempotencyKey" makes retries of an action safe: a key that was seen
+before gets the first response again instead of performing the action twice.
+
+Seats can be played by bots hosted on the server:
+
+    {"id": 4, "method": "addBot", "game": 0, "params": {"playerId": 2, "bot": "mcts", "budget": 0.5}}
+
+A bot (see anytime.BOTS) moves whenever its player is on turn and has at
+most `budget` seconds per move; all bots share the event loop through one
+anytime.BotHost, so thinking bots do not hold up other games.
+
+With a TimeControl, every game is played on chess clocks (see clocks):
+a player who runs out of time gets a default move (the first card on
+offer, finishing the turn, the first pattern or scoring card, or the
+first fitting reward for the assisting player), and
+{"method": "clock", "game": 0} returns the seconds left per player.
+
+With a GameStore, games survive restarts of the server: every action is
+committed before it is answered, and stored games are hosted again on start.
+
+With a Replicator, every hosted game is streamed to a hot standby (see
+replication), and {"method": "replication"} returns how far behind it is.
+
+Run with `python -m terra_futura.server --port 8765`.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+from collections.abc import MutableMapping
+from typing import Any, Optional
+from .anytime import BOTS, BotHost, GameView
+from .bots import GameDriver, closePolicy
+from .catalog import processCatalog
+from .clocks import GameClocks, TimeControl
+from .factories import GameFactory
+from .game import Game
+from .game_observer import GameObserver
+from .hibernation import HibernatingGames, hibernate, rehydrate
+from .interfaces import AnytimeBotInterface, TerraFuturaObserverInterface
+from .protocol import ACTIONS, ProtocolError, callAction
+from .replication import Replicator
+from .simple_types import GameState, Resource
+from .store import GameStore
+
+
+class _Connection:
+    """Outgoing side of one client connection."""
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self._writer = writer
+
+    def send(self, message: dict[str, Any]) -> None:
+        self._writer.write(json.dumps(message).encode() + b"\n")
+
+    async def drain(self) -> None:
+        await self._writer.drain()
+
+
+class _SeatObserver(TerraFuturaObserverInterface):
+    """Pushes notifications of one player of one game to all subscribed connections."""
+
+    def __init__(self, gameId: int, playerId: int) -> None:
+        self._gameId = gameId
+        self._playerId = playerId
+        self.connections: set[_Connection] = set()
+        self.changed = asyncio.Event()  # set on every notification, for bots playing the seat
+
+    def notify(self, game_state: str) -> None:
+        self.changed.set()
+        for connection in self.connections:
+            connection.send({"event": "notify", "game": self._gameId,
+                             "player": self._playerId, "state": game_state})
+
+
+class GameServer:
+    """Hosts many games and dispatches requests from any number of connections."""
+
+    _games: MutableMapping[int, Game]
+    _seats: dict[int, dict[int, _SeatObserver]]
+    _nextGameId: int
+    _store: Optional[GameStore]
+    _bots: dict[int, list[asyncio.Task[None]]]
+    _botHost: BotHost
+    _clocks: Optional[GameClocks]
+    _replicator: Optional[Replicator]
+    _ticker: Optional[asyncio.Task[None]]
+
+    # longest time a bot may think about one move
+    MAX_BOT_BUDGET = 60.0
+
+    def __init__(self, games: Optional[MutableMapping[int, Game]] = None, store: Optional[GameStore] = None,
+                 botHost: Optional[BotHost] = None, timeControl: Optional[TimeControl] = None,
+                 replicator: Optional[Replicator] = None) -> None:
+        # e.g. HibernatingGames to keep idle games out of memory
+        self._games = games if games is not None else {}
+        self._seats = {}
+        self._nextGameId = 0
+        self._store = store
+        self._bots = {}
+        self._botHost = botHost if botHost is not None else BotHost()
+        self._clocks = GameClocks(timeControl, self._timeout) if timeControl is not None else None
+        self._replicator = replicator
+        self._ticker = None
+        if store is not None:
+            for gameId in store.gameIds():
+                self._restore(store, gameId)
+
+    def _restore(self, store: GameStore, gameId: int) -> None:
+        gameObserver = GameObserver({})
+        # clocks are not stored, restored games start on fresh ones
+        self._host(gameId, store.load(gameId, gameObserver), gameObserver)
+
+    def _host(self, gameId: int, game: Game, gameObserver: GameObserver) -> None:
+        """Serve a game whose observer notifies nobody yet."""
+        seats = {player.id: _SeatObserver(gameId, player.id) for player in game.players}
+        for playerId, seat in seats.items():
+            gameObserver.register_observer(playerId, seat)
+        self._games[gameId] = game
+        self._seats[gameId] = seats
+        self._nextGameId = max(self._nextGameId, gameId + 1)
+        if self._clocks is not None:
+            self._clocks.start(gameId, game)
+        if self._replicator is not None:
+            self._replicator.attach(gameId, game)
+
+    @property
+    def games(self) -> MutableMapping[int, Game]:
+        return self._games
+
+    @property
+    def botHost(self) -> BotHost:
+        return self._botHost
+
+    @property
+    def clocks(self) -> Optional[GameClocks]:
+        return self._clocks
+
+    @property
+    def replicator(self) -> Optional[Replicator]:
+        return self._replicator
+
+    def hostGame(self, gameId: int, game: Game, gameObserver: GameObserver) -> None:
+        """Host a game made elsewhere, e.g. a replica; `gameObserver` must be its observer."""
+        if gameId in self._games:
+            raise ValueError(f"Game {gameId} exists")
+        if self._store is not None:
+            self._store.attach(gameId, game)
+        self._host(gameId, game, gameObserver)
+
+    def createGame(self, playerIds: list[int], seed: int, gameId: Optional[int] = None) -> int:
+        """Host a new game, by default under the next free id."""
+        if gameId is None:
+            gameId = self._nextGameId
+        elif gameId in self._games:
+            raise ValueError(f"Game {gameId} exists")
+        gameObserver = GameObserver({})
+        game = GameFactory(seed, catalog=processCatalog()).createGame(playerIds, gameObserver)
+        self.hostGame(gameId, game, gameObserver)
+        return gameId
+
+    def exportGame(self, gameId: int) -> bytes:
+        """Stop hosting the game and return its image for importGame, e.g. on another server."""
+        data = hibernate(self._games[gameId])
+        self.closeGame(gameId)
+        return data
+
+    def importGame(self, gameId: int, data: bytes) -> None:
+        if gameId in self._games:
+            raise ValueError(f"Game {gameId} exists")
+        gameObserver = GameObserver({})
+        self.hostGame(gameId, rehydrate(data, gameObserver), gameObserver)
+
+    def closeGame(self, gameId: int) -> None:
+        if gameId in self._games:
+            del self._games[gameId]
+            if self._store is not None:
+                self._store.delete(gameId)
+            if self._replicator is not None:
+                self._replicator.detach(gameId)
+        self._seats.pop(gameId, None)
+        for task in self._bots.pop(gameId, []):
+            task.cancel()
+        if self._clocks is not None:
+            self._clocks.stop(gameId)
+
+    def _timeout(self, gameId: int, playerId: int) -> None:
+        game = self._games.get(gameId)
+        if game is None or game.state == GameState.Finish or game.onTurn() != playerId:
+            return
+        assert self._clocks is not None
+        if game.state == GameState.SelectReward:
+            # the player on turn waits for the assisting player, who gets the first reward that fits
+            reward = game._selectReward  # pylint: disable=protected-access
+            resource = next((resource for resource in Resource if reward.canSelectReward(resource)), None)
+            if resource is None:
+                return
+            game.selectReward(reward.player, resource)
+            self._clocks.update(gameId, game, "selectReward")
+            return
+        driver = GameDriver(game)
+        moves = GameView(driver).legalMoves()
+        if not moves:
+            return
+        moves[0].apply(driver)
+        self._clocks.update(gameId, game, moves[0].method)
+
+    def addBot(self, gameId: int, playerId: int, bot: AnytimeBotInterface, budget: float) -> None:
+        """Let `bot` play `playerId` from now on; must be called on the event loop."""
+        task = asyncio.get_running_loop().create_task(self._playSeat(gameId, playerId, bot, budget))
+        self._bots.setdefault(gameId, []).append(task)
+
+    async def _playSeat(self, gameId: int, playerId: int, bot: AnytimeBotInterface, budget: float) -> None:
+        try:
+            seat = self._seats[gameId][playerId]
+            driver: Optional[GameDriver] = None
+            while True:
+                seat.changed.clear()
+                game = self._games.get(gameId)
+                if game is None or game.state == GameState.Finish:
+                    return
+                if game.onTurn() != playerId:
+                    await seat.changed.wait()
+                    continue
+                if driver is None or driver.game is not game:
+                    # a hibernated game comes back as a new object
+                    driver = GameDriver(game, driver.allowed if driver is not None else None)
+                timeLeft = budget
+                if self._clocks is not None and gameId in self._clocks:
+                    timeLeft = min(budget, self._clocks.remaining(gameId)[playerId])
+                move = await self._botHost.decide(driver, bot, timeLeft)
+                if seat.changed.is_set() or self._games.get(gameId) is not game:
+                    continue  # somebody else moved while the bot was thinking
+                move.apply(driver)
+                if self._clocks is not None:
+                    self._clocks.update(gameId, game, move.method)
+                if self._store is not None:
+                    await self._store.durable()
+        finally:
+            # the bot retires with its seat
+            closePolicy(bot)
+
+    def _disconnect(self, connection: _Connection) -> None:
+        for seats in self._seats.values():
+            for seat in seats.values():
+                seat.connections.discard(connection)
+
+    def _game(self, request: dict[str, Any]) -> int:
+        gameId = request.get("game")
+        if not isinstance(gameId, int) or gameId not in self._games:
+            raise ProtocolError(f"Unknown game: {gameId!r}")
+        return gameId
+
+    def handleRequest(self, connection: _Connection, request: dict[str, Any]) -> Any:
+        """Perform one request and return its result. Raises ProtocolError on bad requests."""
+        method = request.get("method")
+        params = request.get("params", {})
+        if not isinstance(params, dict):
+            raise ProtocolError("'params' must be an object")
+
+        if method == "createGame":
+            players = params.get("players")
+            seed = params.get("seed", 0)
+            gameId = params.get("gameId")
+            if not isinstance(players, list) or not all(isinstance(p, int) for p in players):
+                raise ProtocolError("'players' must be a list of player ids")
+            if not isinstance(seed, int):
+                raise ProtocolError("'seed' must be an integer")
+            if gameId is not None and (not isinstance(gameId, int) or gameId < 0):
+                raise ProtocolError("'gameId' must be a non-negative integer")
+            try:
+                return self.createGame(players, seed, gameId)
+            except ValueError as e:
+                raise ProtocolError(str(e)) from e
+        if method == "closeGame":
+            self.closeGame(self._game(request))
+            return True
+        if method == "subscribe":
+            seats = self._seats[self._game(request)]
+            playerId = params.get("playerId")
+            if playerId not in seats:
+                raise ProtocolError(f"Unknown player: {playerId!r}")
+            seats[playerId].connections.add(connection)
+            return True
+        if method == "addBot":
+            gameId = self._game(request)
+            playerId = params.get("playerId")
+            name = params.get("bot")
+            budget = params.get("budget", 1.0)
+            seed = params.get("seed", 0)
+            if playerId not in self._seats[gameId]:
+                raise ProtocolError(f"Unknown player: {playerId!r}")
+            if name not in BOTS:
+                raise ProtocolError(f"Unknown bot: {name!r}, expected one of {sorted(BOTS)}")
+            if not isinstance(budget, (int, float)) or not 0 < budget <= self.MAX_BOT_BUDGET:
+                raise ProtocolError(f"'budget' must be a number of seconds up to {self.MAX_BOT_BUDGET}")
+            if not isinstance(seed, int):
+                raise ProtocolError("'seed' must be an integer")
+            self.addBot(gameId, playerId, BOTS[name](seed), float(budget))
+            return True
+        if method == "clock":
+            gameId = self._game(request)
+            if self._clocks is None or gameId not in self._clocks:
+                raise ProtocolError(f"Game {gameId} is not timed")
+            return {str(playerId): left for playerId, left in self._clocks.remaining(gameId).items()}
+        if method == "replication":
+            if self._replicator is None:
+                raise ProtocolError("The server is not replicated")
+            metrics = self._replicator.metrics
+            return {"connected": metrics.connected, "lagActions": metrics.lagActions,
+                    "lagMs": metrics.lagSeconds * 1000}
+        if not isinstance(method, str):
+            raise ProtocolError("'method' must be a string")
+        gameId = self._game(request)
+        game = self._games[gameId]
+        result = callAction(game, method, params)
+        if self._clocks is not None and result is not False:
+            self._clocks.update(gameId, game, method)
+        return result
+
+    def _respond(self, connection: _Connection, line: bytes) -> dict[str, Any]:
+        requestId: Optional[Any] = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ProtocolError("Request must be a JSON object")
+            requestId = request.get("id")
+            result = self.handleRequest(connection, request)
+        except (ProtocolError, json.JSONDecodeError) as e:
+            return {"id": requestId, "error": str(e)}
+        except Exception as e: # pylint: disable=broad-exception-caught
+            # a failing game must not take the whole connection down
+            return {"id": requestId, "error": f"Internal error: {e!r}"}
+        response = {"id": requestId, "result": result}
+        if request.get("method") in ACTIONS:
+            response["version"] = self._games[request["game"]].version
+        return response
+
+    async def handleConnection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = _Connection(writer)
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    response = self._respond(connection, line)
+                    if self._store is not None:
+                        await self._store.durable()
+                    connection.send(response)
+                    await connection.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._disconnect(connection)
+            writer.close()
+
+    async def _tickClocks(self, clocks: GameClocks) -> None:
+        while True:
+            await asyncio.sleep(clocks.wheel.tickSeconds)
+            # default moves of players out of time are committed like any other action
+            if clocks.advance() and self._store is not None:
+                await self._store.durable()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.Server:
+        if self._clocks is not None and self._ticker is None:
+            self._ticker = asyncio.get_running_loop().create_task(self._tickClocks(self._clocks))
+        return await asyncio.start_server(self.handleConnection, host, port, limit=1 << 20)
+
+
+async def _sweep(games: HibernatingGames, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        games.sweep()
+
+
+async def _serve(host: str, port: int, games: Optional[HibernatingGames], store: Optional[GameStore],
+                 timeControl: Optional[TimeControl], replicateTo: Optional[str]) -> None:
+    replicator = None
+    if replicateTo is not None:
+        followerHost, _, followerPort = replicateTo.rpartition(":")
+        replicator = await Replicator.connect(followerHost, int(followerPort))
+    server = await GameServer(games, store, timeControl=timeControl, replicator=replicator).start(host, port)
+    sweeper = asyncio.create_task(_sweep(games, games.idleSeconds / 2)) if games is not None else None
+    async with server:
+        print(f"Terra Futura server listening on {host}:{port}")
+        try:
+            await server.serve_forever()
+        finally:
+            if sweeper is not None:
+                sweeper.cancel()
+            if games is not None:
+                print(games.metrics.summary())
+            if store is not None:
+                print(store.metrics.summary())
+            if replicator is not None:
+                print(replicator.metrics.summary())
+                await replicator.close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Host Terra Futura games over a JSON-lines TCP socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--hibernate-after", type=float, default=None, metavar="SECONDS",
+                        help="write games idle for this long to disk")
+    parser.add_argument("--max-resident", type=int, default=1000, help="most games kept in memory when hibernating")
+    parser.add_argument("--hibernation-dir", default=None)
+    parser.add_argument("--store", default=None, metavar="PATH",
+                        help="SQLite database that keeps games across restarts")
+    parser.add_argument("--time-control", default=None, metavar="SECONDS[+INCREMENT]",
+                        help="play every game on chess clocks, e.g. 300+5")
+    parser.add_argument("--replicate-to", default=None, metavar="HOST:PORT",
+                        help="stream every game to a follower (python -m terra_futura.replication)")
+    args = parser.parse_args(argv)
+    timeControl = TimeControl.parse(args.time_control) if args.time_control is not None else None
+    games = None
+    if args.hibernate_after is not None:
+        games = HibernatingGames(args.hibernate_after, args.max_resident, args.hibernation_dir)
+    store = GameStore(args.store) if args.store is not None else None
+    try:
+        asyncio.run(_serve(args.host, args.port, games, store, timeControl, args.replicate_to))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Parallel self-play simulator.
+
+    python -m terra_futura.simulate --games 10000 --workers 8 --seed 1 \
+        --policies greedy,random --output results.jsonl
+
+Plays complete games (nine turns, the activation pattern round and scoring)
+with bot policies on a process pool and streams one JSON line per game to
+the results file, in completion order. Workers share one card catalog (see
+catalog). Games are sent to workers in chunks
+and only a bounded number of chunks is in flight, so memory does not grow
+with the number of games and throughput scales with the number of workers.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Iterator, Optional, TextIO, TypeVar
+from .archive import ArchiveWriter, GameRecord
+from .bots import BotPolicy, closePolicy, finalScores, loadPolicy, playGame
+from .catalog import attachCatalog, processCatalog
+from .factories import GameFactory, createCatalog
+from .replay import ReplayWriter
+
+_Task = TypeVar("_Task")
+_Result = TypeVar("_Result")
+
+
+@dataclass(frozen=True)
+class SimulationTask:
+    gameIndex: int
+    seed: int
+    policies: tuple[str, ...]  # one policy spec per seat, players are numbered from 1
+    replayPath: Optional[str] = None  # where to record the game, see replay.ReplayWriter
+    archive: bool = False  # whether to return the game's archive.GameRecord too
+
+
+def _playTask(task: SimulationTask) -> tuple[dict[str, Any], Optional[GameRecord]]:
+    start = time.perf_counter()
+    playerIds = list(range(1, len(task.policies) + 1))
+    game = GameFactory(task.seed, catalog=processCatalog()).createGame(playerIds)
+    policies: dict[int, BotPolicy] = {
+        playerId: loadPolicy(spec)(task.seed + playerId) for playerId, spec in zip(playerIds, task.policies)
+    }
+    try:
+        if task.replayPath is not None:
+            with ReplayWriter(task.replayPath, game):
+                playGame(game, policies)
+        else:
+            playGame(game, policies)
+    finally:
+        for policy in policies.values():
+            closePolicy(policy)
+    result = {
+        "game": task.gameIndex,
+        "seed": task.seed,
+        "policies": {str(playerId): spec for playerId, spec in zip(playerIds, task.policies)},
+        "scores": {str(playerId): score for playerId, score in finalScores(game).items()},
+        "actions": len(game.history),  # every game ends after the same turns, but not the same activations
+        "seconds": time.perf_counter() - start,
+    }
+    return result, GameRecord.fromGame(game) if task.archive else None
+
+
+def simulateGame(task: SimulationTask) -> dict[str, Any]:
+    """Play one game and describe its result as a JSON-serializable dict."""
+    return _playTask(task)[0]
+
+
+def _simulateChunk(tasks: list[SimulationTask]) -> list[tuple[dict[str, Any], Optional[GameRecord]]]:
+    return [_playTask(task) for task in tasks]
+
+
+def makeTasks(games: int, seed: int, policies: list[str], players: int,
+              replays: Optional[str] = None, archive: bool = False) -> Iterator[SimulationTask]:
+    """
+    Tasks with per-game seeds derived from `seed`; seats cycle through
+    `policies`. With `replays`, every game is recorded to a file in that
+    directory; with `archive`, results come with game records.
+    """
+    rng = random.Random(seed)
+    for gameIndex in range(games):
+        # rotate seats so that no policy always moves first
+        seats = tuple(policies[(gameIndex + seat) % len(policies)] for seat in range(players))
+        replayPath = None if replays is None else os.path.join(replays, f"game-{gameIndex}.tfr")
+        yield SimulationTask(gameIndex, rng.getrandbits(63), seats, replayPath, archive)
+
+
+def runChunks(function: Callable[[list[_Task]], list[_Result]], tasks: Iterator[_Task], workers: int,
+              chunkSize: int) -> Iterator[tuple[int, list[_Result]]]:
+    """
+    Run `function` on chunks of `tasks` on `workers` processes that share
+    one card catalog, keeping two chunks per worker in flight. Yields the
+    index of each chunk's first task with its results, in completion order.
+    """
+    with createCatalog() as catalog, \
+            ProcessPoolExecutor(max_workers=workers, initializer=attachCatalog, initargs=(catalog.name,)) as pool:
+        pending: dict[Future[list[_Result]], int] = {}
+        submitted = 0
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < 2 * workers:
+                chunk = list(islice(tasks, chunkSize))
+                if not chunk:
+                    exhausted = True
+                    break
+                pending[pool.submit(function, chunk)] = submitted
+                submitted += len(chunk)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def runSimulation(tasks: Iterator[SimulationTask], workers: int, output: TextIO,
+                  chunkSize: int = 16, archive: Optional[ArchiveWriter] = None) -> int:
+    """
+    Run tasks on `workers` processes, writing results, and the records of
+    archived tasks to `archive`, as they complete. Returns the game count.
+    """
+    written = 0
+    for _, results in runChunks(_simulateChunk, tasks, workers, chunkSize):
+        for result, record in results:
+            output.write(json.dumps(result) + "\n")
+            if archive is not None and record is not None:
+                archive.add(record)
+            written += 1
+        output.flush()
+    return written
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run Terra Futura self-play games in parallel.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--players", type=int, default=2, choices=range(2, 5))
+    parser.add_argument("--policies", default="greedy",
+                        help="comma separated policy names or module:Class paths, assigned to seats in turn")
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--output", default="-", help="results file, '-' for standard output")
+    parser.add_argument("--replays", default=None, metavar="DIR", help="record every game to a replay file in DIR")
+    parser.add_argument("--archive", default=None, metavar="DIR", help="write a columnar archive of the games to DIR")
+    args = parser.parse_args(argv)
+
+    policies = args.policies.split(",")
+    for spec in policies:
+        loadPolicy(spec)  # fail early on unknown policies
+    if args.replays is not None:
+        os.makedirs(args.replays, exist_ok=True)
+    tasks = makeTasks(args.games, args.seed, policies, args.players, args.replays, args.archive is not None)
+
+    start = time.perf_counter()
+    archive = ArchiveWriter(args.archive) if args.archive is not None else None
+    try:
+        if args.output == "-":
+            written = runSimulation(tasks, args.workers, sys.stdout, args.chunk_size, archive)
+        else:
+            with open(args.output, "w", encoding="utf-8") as output:
+                written = runSimulation(tasks, args.workers, output, args.chunk_size, archive)
+    finally:
+        if archive is not None:
+            archive.close()
+    seconds = time.perf_counter() - start
+    print(f"{written} games in {seconds:.2f}s ({written / seconds:.1f} games/s, {args.workers} workers)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
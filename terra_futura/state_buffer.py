@@ -0,0 +1,269 @@
+"""
+Flat encoding of the mutable state of a game, for handing positions to
+worker processes without pickling them.
+
+encodeGame writes a game as a flat record of bytes: cards are their
+CardCatalog id, followed by their pollution and resources on grids (cards
+in piles carry neither), and everything else is the game's turn
+bookkeeping, the players' grids, activation patterns and scoring methods,
+the piles and the pending reward, as fixed size integers (see the structs
+below). The static data of cards, their effects, stays in the catalog
+that both sides share. decodeGame builds a game from such a record read
+through a memoryview; like Game.clone, it has no history, action log or
+observers, so it is meant for exploring moves.
+
+StateBuffer is a shared memory block of records: the parent writes a
+position once and workers attached to the block read it by offset, so a
+position searched by N workers costs one encoding instead of N pickles.
+"""
+from __future__ import annotations
+import struct
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, Union
+from .activation_pattern import ActivationPattern
+from .card import Card
+from .catalog import CardCatalog
+from .game import Game
+from .game_observer import GameObserver
+from .grid import GRID_POSITIONS, Grid
+from .interfaces import InterfaceCard, InterfacePile
+from .move_card import MoveCard
+from .pile import Pile
+from .player import Player
+from .process_action import ProcessAction
+from .process_action_assistance import ProcessActionAssistance
+from .scoring_method import ScoringMethod
+from .select_reward import SelectReward
+from .simple_types import Deck, GameState, GridPosition, Points, Resource
+
+_MAGIC = b"TFGS"
+_VERSION = 1
+# magic, version, length of the record, state, player on turn, turn number, game version, assistance used, players
+_HEADER = struct.Struct("<4sBIBBHIBB")
+_CARD = struct.Struct("<HBB")     # catalog id, pollution, resources
+_PLAYER = struct.Struct("<iBH")   # id, has been assisted, activated cells
+_PATTERN = struct.Struct("<BB")   # selected, positions
+_POSITION = struct.Struct("<bb")
+_COUNT = struct.Struct("<B")
+_SCORING = struct.Struct("<iBi")  # points per combination, calculated, calculated total
+_PILE = struct.Struct("<BH")      # visible cards, hidden cards, then the catalog id of each
+_ID = struct.Struct("<H")
+_REWARD = struct.Struct("<BiBBB") # has a player, player, seat and cell of the card (0xFF for none), resources
+_NO_CARD = 0xFFFF
+_NONE = 0xFF
+_STATES = list(GameState)
+_DECKS = list(Deck)
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def _resources(resources: list[Resource]) -> bytes:
+    return bytes(resource.value for resource in resources)
+
+
+def _writeCard(out: bytearray, card: Optional[InterfaceCard], catalog: CardCatalog) -> None:
+    if card is None:
+        out += _CARD.pack(_NO_CARD, 0, 0)
+        return
+    if not isinstance(card, Card):
+        raise ValueError(f"Only Card instances can be encoded, not {card!r}")
+    out += _CARD.pack(catalog.identify(card), card.pollution, len(card.resources))
+    out += _resources(card.resources)
+
+
+def encodeGame(game: Game, catalog: CardCatalog) -> bytes:
+    """The state of `game` as a flat record; its cards must be in `catalog`."""
+    out = bytearray(_HEADER.size)
+    cells: dict[int, tuple[int, int]] = {}  # id of a grid card -> (seat, cell)
+    for seat, player in enumerate(game.players):
+        grid = player.grid
+        out += _PLAYER.pack(player.id, player.hasBeenAssisted, grid.activationMask)
+        for cell, position in enumerate(GRID_POSITIONS):
+            card = grid.getCard(position)
+            if card is not None:
+                cells[id(card)] = (seat, cell)
+            _writeCard(out, card, catalog)
+        for pattern in player.activation_patterns:
+            positions = pattern.pattern
+            out += _PATTERN.pack(pattern.is_selected(), len(positions))
+            for position in positions:
+                out += _POSITION.pack(position.x, position.y)
+        for method in player.scoring_methods:
+            out += _COUNT.pack(len(method.resources)) + _resources(method.resources)
+            total = method.calculatedTotal
+            out += _SCORING.pack(method.pointsPerCombination.value, total is not None,
+                                 0 if total is None else total.value)
+    for deck in _DECKS:
+        pile = game.piles[deck]
+        if not isinstance(pile, Pile):
+            raise ValueError(f"Only Pile instances can be encoded, not {pile!r}")
+        visible, hidden = pile._visibleCards, pile._hiddenCards  # pylint: disable=protected-access
+        out += _PILE.pack(len(visible), len(hidden))
+        for card in visible + hidden:
+            if card.resources or not isinstance(card, Card) or card.pollution:
+                raise ValueError(f"Cards in piles have no resources or pollution: {card.state()}")
+            out += _ID.pack(catalog.identify(card))
+    reward = game._selectReward  # pylint: disable=protected-access
+    if not isinstance(reward, SelectReward):
+        raise ValueError(f"Only SelectReward instances can be encoded, not {reward!r}")
+    rewarded, rewardCard, selection = reward._player, reward._card, reward._selection  # pylint: disable=protected-access
+    seat, cell = (_NONE, _NONE) if rewardCard is None else cells[id(rewardCard)]
+    out += _REWARD.pack(rewarded is not None, rewarded or 0, seat, cell, len(selection)) + _resources(selection)
+    fields = game._fields()  # pylint: disable=protected-access
+    _HEADER.pack_into(out, 0, _MAGIC, _VERSION, len(out), _STATES.index(fields.state), fields.onTurn,
+                      fields.turnNumber, game.version, fields.assistanceUsed, len(game.players))
+    return bytes(out)
+
+
+class _Reader:
+    __slots__ = ("_buffer", "at")
+
+    def __init__(self, buffer: Buffer, at: int) -> None:
+        self._buffer = buffer
+        self.at = at
+
+    def unpack(self, layout: struct.Struct) -> tuple[int, ...]:
+        values = layout.unpack_from(self._buffer, self.at)
+        self.at += layout.size
+        return values
+
+    def resources(self, count: int) -> list[Resource]:
+        resources = [Resource(value) for value in self._buffer[self.at:self.at + count]]
+        self.at += count
+        return resources
+
+    def ids(self, count: int) -> tuple[int, ...]:
+        ids: tuple[int, ...] = struct.unpack_from(f"<{count}H", self._buffer, self.at)
+        self.at += count * _ID.size
+        return ids
+
+    def card(self, catalog: CardCatalog) -> Optional[Card]:
+        cardId, pollution, count = self.unpack(_CARD)
+        if cardId == _NO_CARD:
+            return None
+        card = catalog.card(cardId)
+        card.placePollution(pollution)
+        card.resources = self.resources(count)
+        return card
+
+
+def recordLength(buffer: Buffer, offset: int = 0) -> int:
+    """Length of the record at `offset`."""
+    magic, version, length = _HEADER.unpack_from(buffer, offset)[:3]
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"No version {_VERSION} game record at offset {offset}")
+    return int(length)
+
+
+def decodeGame(buffer: Buffer, catalog: CardCatalog, offset: int = 0) -> Game:
+    """The game encoded at `offset` of `buffer`, notifying nobody."""
+    recordLength(buffer, offset)
+    read = _Reader(buffer, offset)
+    _, _, _, state, onTurn, turnNumber, version, assistanceUsed, playerCount = read.unpack(_HEADER)
+    players: list[Player] = []
+    for _ in range(playerCount):
+        playerId, assisted, activated = read.unpack(_PLAYER)
+        grid = Grid()
+        for position in GRID_POSITIONS:
+            card = read.card(catalog)
+            if card is not None:
+                grid.putCard(position, card)
+        patterns: list[ActivationPattern] = []
+        for _ in range(2):
+            selected, count = read.unpack(_PATTERN)
+            pattern = ActivationPattern(grid, [GridPosition(*read.unpack(_POSITION)) for _ in range(count)])
+            if selected:
+                pattern.select()
+            patterns.append(pattern)
+        scorings: list[ScoringMethod] = []
+        for _ in range(2):
+            goal = read.resources(read.unpack(_COUNT)[0])
+            points, calculated, total = read.unpack(_SCORING)
+            method = ScoringMethod(goal, Points(points), grid)
+            method.calculatedTotal = Points(total) if calculated else None
+            scorings.append(method)
+        grid.restoreActivations(activated)
+        players.append(Player(playerId, patterns, scorings, grid, bool(assisted)))
+    piles: dict[Deck, InterfacePile] = {}
+    for deck in _DECKS:
+        visibleCount, hiddenCount = read.unpack(_PILE)
+        cards: list[InterfaceCard] = [catalog.card(cardId) for cardId in read.ids(visibleCount + hiddenCount)]
+        pile = Pile.__new__(Pile)
+        pile._visibleCards = cards[:visibleCount]  # pylint: disable=protected-access
+        pile._hiddenCards = cards[visibleCount:]  # pylint: disable=protected-access
+        piles[deck] = pile
+    reward = SelectReward()
+    hasPlayer, rewardPlayer, seat, cell, count = read.unpack(_REWARD)
+    selection = read.resources(count)
+    if hasPlayer:
+        rewardCard = None if seat == _NONE else players[seat].grid.getCard(GRID_POSITIONS[cell])
+        assert rewardCard is not None
+        reward.setReward(rewardPlayer, rewardCard, selection)
+    game = Game(players, piles, MoveCard(), ProcessAction(), ProcessActionAssistance(), reward, GameObserver({}))
+    # pylint: disable=protected-access
+    game._state, game._onTurn, game._turnNumber = _STATES[state], onTurn, turnNumber
+    game._assistanceUsed, game._version = bool(assistanceUsed), version
+    return game
+
+
+class StateBuffer:
+    """Game records in a shared memory block, written by one process and read by any."""
+
+    def __init__(self, memory: SharedMemory, owner: bool) -> None:
+        self._memory = memory
+        self._owner = owner
+        buffer = memory.buf
+        assert buffer is not None
+        self._buffer = buffer
+        self._end = 0  # where the next record goes
+
+    @classmethod
+    def create(cls, size: int = 1 << 20) -> StateBuffer:
+        return cls(SharedMemory(create=True, size=size), owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> StateBuffer:
+        return cls(SharedMemory(name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def write(self, game: Game, catalog: CardCatalog) -> int:
+        """Append the record of `game` and return its offset; starts over when the block is full."""
+        record = encodeGame(game, catalog)
+        if len(record) > self._memory.size:
+            raise ValueError(f"A record of {len(record)} bytes does not fit into {self._memory.size}")
+        if self._end + len(record) > self._memory.size:
+            self._end = 0
+        offset = self._end
+        self._buffer[offset:offset + len(record)] = record
+        self._end += len(record)
+        return offset
+
+    def view(self, offset: int) -> memoryview:
+        """The record at `offset`, without copying it."""
+        return self._buffer[offset:offset + recordLength(self._buffer, offset)]
+
+    def read(self, offset: int, catalog: CardCatalog) -> Game:
+        return decodeGame(self._buffer, catalog, offset)
+
+    def reset(self) -> None:
+        """Let the next write start at the beginning again."""
+        self._end = 0
+
+    def close(self) -> None:
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+_attached: dict[str, StateBuffer] = {}
+
+
+def sharedGame(name: str, offset: int, catalog: CardCatalog) -> Game:
+    """Read a record from the StateBuffer called `name`, attaching to it once per process."""
+    states = _attached.get(name)
+    if states is None:
+        states = _attached[name] = StateBuffer.attach(name)
+    return states.read(offset, catalog)
@@ -0,0 +1,307 @@
+"""
+Durable game store.
+
+GameStore keeps hosted games in a local SQLite database: a snapshot of each
+game and an append-only table of the actions accepted since. A game attached
+to the store logs every accepted action (see Game.actionLog); the action is
+encoded at once but written together with the actions of all other games
+at the next commit, so concurrent games share one transaction and one sync
+of the disk. The database runs in WAL mode with full synchronization, so a
+committed action survives a crash of the process or the machine.
+
+Every `snapshotEvery` actions a game is snapshotted again and the actions
+before the snapshot are dropped. load rebuilds a game from its latest
+snapshot and replays the actions that followed.
+
+The asyncio server awaits durable() before answering an action: it waits
+for the commit that includes everything logged so far. Commits run in a
+worker thread, so the actions of other connections arriving meanwhile are
+batched into the next one.
+
+Run `python -m terra_futura.store` for a commit throughput benchmark.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from .bots import GameDriver, RandomBot
+from .factories import GameFactory
+from .game import Game
+from .game_observer import GameObserver
+from .hibernation import hibernate, rehydrate
+from .interfaces import GameObserverInterface
+from .metrics import percentile
+from .simple_types import GameState
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    game INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS actions (
+    game INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    args BLOB NOT NULL,
+    PRIMARY KEY (game, seq)
+) WITHOUT ROWID;
+"""
+
+_Statement = tuple[str, tuple[Any, ...]]
+
+
+@dataclass
+class _Batch:
+    statements: list[_Statement]
+    actions: int
+    snapshots: int
+    logged: int  # GameStore._logged when the batch was taken
+
+
+@dataclass
+class StoreMetrics:
+    commits: int = 0
+    actions: int = 0    # actions committed
+    snapshots: int = 0  # snapshots committed
+    commitLatencies: deque[float] = field(default_factory=lambda: deque(maxlen=10000))
+
+    def percentile(self, p: float) -> float:
+        return percentile(self.commitLatencies, p)
+
+    def summary(self) -> str:
+        perCommit = self.actions / self.commits if self.commits else 0.0
+        return (f"commits={self.commits} actions={self.actions} snapshots={self.snapshots} "
+                f"actions_per_commit={perCommit:.1f} commit_p50={self.percentile(0.5) * 1000:.3f}ms "
+                f"commit_p99={self.percentile(0.99) * 1000:.3f}ms")
+
+
+class _GameLog:
+    """Action log of one attached game."""
+
+    def __init__(self, store: GameStore, gameId: int) -> None:
+        self._store = store
+        self._gameId = gameId
+
+    def append(self, game: Game, method: str, args: tuple[Any, ...]) -> None:
+        self._store._append(self._gameId, game, method, args)
+
+
+class GameStore:
+    """Snapshots and action logs of games in the SQLite database at `path`."""
+
+    def __init__(self, path: str, snapshotEvery: int = 64) -> None:
+        if snapshotEvery < 1:
+            raise ValueError("Games must be snapshotted at least every action")
+        self._snapshotEvery = snapshotEvery
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()  # the connection is also used by commits in worker threads
+        self._seqs: dict[int, int] = {}       # last logged action of each attached game
+        self._snapshotSeqs: dict[int, int] = {}
+        self._dueSnapshots: dict[int, Game] = {}
+        self._pending: list[_Statement] = []
+        self._pendingActions = 0
+        self._logged = 0     # changes handed to the store so far
+        self._committed = 0  # of them written
+        self._committing: Optional[asyncio.Future[None]] = None
+        self.metrics = StoreMetrics()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _queue(self, sql: str, params: tuple[Any, ...]) -> None:
+        self._pending.append((sql, params))
+        self._logged += 1
+
+    def attach(self, gameId: int, game: Game) -> None:
+        """Store a new game and log its actions from now on."""
+        self._seqs[gameId] = 0
+        self._snapshotSeqs[gameId] = 0
+        self._dueSnapshots[gameId] = game
+        self._logged += 1  # the snapshot itself is taken at the next commit
+        game.actionLog = _GameLog(self, gameId)
+
+    def delete(self, gameId: int) -> None:
+        self._seqs.pop(gameId, None)
+        self._snapshotSeqs.pop(gameId, None)
+        self._dueSnapshots.pop(gameId, None)
+        self._queue("DELETE FROM snapshots WHERE game = ?", (gameId,))
+        self._queue("DELETE FROM actions WHERE game = ?", (gameId,))
+
+    def _append(self, gameId: int, game: Game, method: str, args: tuple[Any, ...]) -> None:
+        if gameId not in self._seqs:
+            return
+        seq = self._seqs[gameId] = self._seqs[gameId] + 1
+        self._queue("INSERT INTO actions VALUES (?, ?, ?, ?)",
+                    (gameId, seq, method, pickle.dumps(args, pickle.HIGHEST_PROTOCOL)))
+        self._pendingActions += 1
+        if seq - self._snapshotSeqs[gameId] >= self._snapshotEvery:
+            # the latest object of the game, which may have been hibernated and read back since
+            self._dueSnapshots[gameId] = game
+
+    def _batch(self) -> _Batch:
+        """Take everything logged so far, with snapshots of the games that are due one."""
+        for gameId, game in self._dueSnapshots.items():
+            seq = self._seqs[gameId]
+            self._snapshotSeqs[gameId] = seq
+            self._pending.append(("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)", (gameId, seq, hibernate(game))))
+            self._pending.append(("DELETE FROM actions WHERE game = ? AND seq <= ?", (gameId, seq)))
+        batch = _Batch(self._pending, self._pendingActions, len(self._dueSnapshots), self._logged)
+        self._pending, self._pendingActions, self._dueSnapshots = [], 0, {}
+        return batch
+
+    def _write(self, statements: list[_Statement]) -> None:
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    connection.execute(sql, params)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def _committedBatch(self, batch: _Batch, seconds: float) -> None:
+        self._committed = batch.logged
+        self.metrics.commitLatencies.append(seconds)
+        self.metrics.commits += 1
+        self.metrics.actions += batch.actions
+        self.metrics.snapshots += batch.snapshots
+
+    def _failedBatch(self, batch: _Batch) -> None:
+        # keep the statements for the next commit
+        self._pending[:0] = batch.statements
+        self._pendingActions += batch.actions
+
+    def commit(self) -> None:
+        """Write everything logged so far in one transaction."""
+        if self._committed == self._logged:
+            return
+        batch = self._batch()
+        start = time.perf_counter()
+        try:
+            self._write(batch.statements)
+        except BaseException:
+            self._failedBatch(batch)
+            raise
+        self._committedBatch(batch, time.perf_counter() - start)
+
+    async def _commitNext(self) -> None:
+        try:
+            batch = self._batch()
+            start = time.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, batch.statements)
+            except BaseException:
+                self._failedBatch(batch)
+                raise
+            self._committedBatch(batch, time.perf_counter() - start)
+        finally:
+            self._committing = None
+
+    async def durable(self) -> None:
+        """Wait until everything logged so far is committed, sharing commits with other waiters."""
+        target = self._logged
+        while self._committed < target:
+            if self._committing is None:
+                self._committing = asyncio.ensure_future(self._commitNext())
+            await asyncio.shield(self._committing)
+
+    def gameIds(self) -> list[int]:
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT game FROM snapshots ORDER BY game")]
+
+    def load(self, gameId: int, observer: GameObserverInterface) -> Game:
+        """Rebuild a stored game from its snapshot and later actions and attach it again."""
+        with self._lock:
+            row = self._connection.execute("SELECT seq, data FROM snapshots WHERE game = ?", (gameId,)).fetchone()
+            if row is None:
+                raise KeyError(gameId)
+            actions = self._connection.execute("SELECT seq, method, args FROM actions WHERE game = ? AND seq > ? "
+                                               "ORDER BY seq", (gameId, row[0])).fetchall()
+        snapshotSeq, data = row
+        game = rehydrate(data, observer)
+        seq = snapshotSeq
+        for seq, method, args in actions:
+            game.replay(method, pickle.loads(args))
+        self._seqs[gameId] = seq
+        self._snapshotSeqs[gameId] = snapshotSeq
+        game.actionLog = _GameLog(self, gameId)
+        return game
+
+
+@dataclass
+class BenchmarkReport:
+    games: int
+    actions: int
+    seconds: float
+    baselineSeconds: float  # of the same games without the store
+    metrics: StoreMetrics
+
+    def summary(self) -> str:
+        added = (self.seconds - self.baselineSeconds) / self.actions * 1e6 if self.actions else 0.0
+        return (f"{self.games} games, {self.actions} actions in {self.seconds:.2f}s "
+                f"({self.actions / self.seconds:.0f} actions/s, {self.metrics.commits / self.seconds:.0f} commits/s), "
+                f"{added:.0f}us added per action\n{self.metrics.summary()}")
+
+
+async def _playDurably(game: Game, store: Optional[GameStore], seed: int) -> None:
+    driver = GameDriver(game)
+    bot = RandomBot(seed)
+    while game.state != GameState.Finish:
+        driver.step(bot)
+        if store is not None:
+            await store.durable()
+        else:
+            await asyncio.sleep(0)
+
+
+async def _playAll(games: list[Game], store: Optional[GameStore]) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(_playDurably(game, store, seed) for seed, game in enumerate(games)))
+    return time.perf_counter() - start
+
+
+def benchmark(path: str, games: int = 64, snapshotEvery: int = 64) -> BenchmarkReport:
+    """Play `games` concurrent games with every action made durable before the next one."""
+    baseline = asyncio.run(_playAll([GameFactory(seed).createGame([1, 2]) for seed in range(games)], None))
+    store = GameStore(path, snapshotEvery)
+    try:
+        played = [GameFactory(seed).createGame([1, 2], GameObserver({})) for seed in range(games)]
+        for gameId, game in enumerate(played):
+            store.attach(gameId, game)
+        store.commit()
+        seconds = asyncio.run(_playAll(played, store))
+        return BenchmarkReport(games, store.metrics.actions, seconds, baseline, store.metrics)
+    finally:
+        store.close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark group commits of the SQLite game store.")
+    parser.add_argument("--games", type=int, default=64)
+    parser.add_argument("--snapshot-every", type=int, default=64)
+    parser.add_argument("--db", default=None, help="database file, a temporary one by default")
+    args = parser.parse_args(argv)
+    if args.db is not None:
+        print(benchmark(args.db, args.games, args.snapshot_every).summary())
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        print(benchmark(os.path.join(directory, "games.db"), args.games, args.snapshot_every).summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Tournaments of bot policies with Elo ratings.
+
+    python -m terra_futura.tournament --entrants greedy,random,my.bots:Bot \
+        --seats 3 --format swiss --rounds 6 --workers 8 --checkpoint run.json
+
+Entrants are policy specs (see bots.loadPolicy). Every round is a list of
+tables of 2 to 4 entrants; a table plays one game per seat rotation, so
+every entrant moves first equally often:
+
+    round-robin  every combination of `seats` entrants sits at a table, in
+                 every round
+    swiss        entrants are sorted by rating and seated in groups of
+                 `seats`; left over entrants form a smaller table, or sit
+                 the round out when only one is left
+
+The games of a round run on a process pool (see simulate.runChunks) and
+ratings are updated as results arrive. A game of n players counts as the
+n(n-1)/2 duels between them, each decided by the final scores and weighted
+1/(n-1) so that a game moves a rating as much as one two-player game.
+
+With a checkpoint file the tournament is saved every `checkpointEvery`
+games and at the end of every round; running it again continues with the
+games that were not played yet.
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from itertools import combinations
+from typing import Any, Callable, Literal, Optional
+from .bots import loadPolicy
+from .simulate import SimulationTask, runChunks, simulateGame
+
+Format = Literal["round-robin", "swiss"]
+FORMATS: tuple[Format, ...] = ("round-robin", "swiss")
+MIN_SEATS = 2
+MAX_SEATS = 4
+
+
+class EloRatings:
+    """Elo ratings of entrants, updated one game at a time."""
+
+    def __init__(self, entrants: list[str], initial: float = 1500.0, k: float = 24.0) -> None:
+        self.k = k
+        self.ratings: dict[str, float] = {entrant: initial for entrant in entrants}
+        self.games: dict[str, int] = {entrant: 0 for entrant in entrants}
+
+    @staticmethod
+    def expected(rating: float, opponent: float) -> float:
+        """Expected duel score of a player of `rating` against `opponent`."""
+        return 1.0 / (1.0 + math.pow(10.0, (opponent - rating) / 400.0))
+
+    def update(self, scores: dict[str, int]) -> None:
+        """Rate one game from the final score of every entrant in it."""
+        weight = self.k / (len(scores) - 1)
+        changes = {entrant: 0.0 for entrant in scores}
+        for first, second in combinations(scores, 2):
+            actual = 1.0 if scores[first] > scores[second] else 0.5 if scores[first] == scores[second] else 0.0
+            change = weight * (actual - self.expected(self.ratings[first], self.ratings[second]))
+            changes[first] += change
+            changes[second] -= change
+        for entrant, change in changes.items():
+            self.ratings[entrant] += change
+            self.games[entrant] += 1
+
+    def standings(self) -> list[tuple[str, float, int]]:
+        """(entrant, rating, games) from the best rated entrant down."""
+        return sorted(((e, r, self.games[e]) for e, r in self.ratings.items()), key=lambda row: -row[1])
+
+
+def roundRobin(entrants: list[str], seats: int) -> list[tuple[str, ...]]:
+    return list(combinations(entrants, seats))
+
+
+def swissTables(ratings: EloRatings, seats: int, rng: random.Random) -> list[tuple[str, ...]]:
+    # ties are broken at random so that equally rated entrants do not always meet
+    order = sorted(ratings.ratings, key=lambda entrant: (-ratings.ratings[entrant], rng.random()))
+    tables = [tuple(order[start:start + seats]) for start in range(0, len(order), seats)]
+    if len(tables[-1]) < MIN_SEATS:
+        tables.pop()
+    return tables
+
+
+def tableGames(table: tuple[str, ...]) -> list[tuple[str, ...]]:
+    """The seatings a table plays: one per rotation."""
+    return [table[seat:] + table[:seat] for seat in range(len(table))]
+
+
+@dataclass(frozen=True)
+class TournamentConfig:
+    entrants: tuple[str, ...]
+    seats: int = 2
+    format: Format = "round-robin"
+    rounds: int = 1
+    seed: int = 0
+    k: float = 24.0
+
+    def __post_init__(self) -> None:
+        if not MIN_SEATS <= self.seats <= MAX_SEATS:
+            raise ValueError(f"Games have {MIN_SEATS} to {MAX_SEATS} players, not {self.seats}")
+        if len(set(self.entrants)) != len(self.entrants):
+            raise ValueError("Entrants must be distinct")
+        if len(self.entrants) < self.seats:
+            raise ValueError(f"{self.seats} seat games need at least {self.seats} entrants")
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown format: {self.format!r}")
+
+
+@dataclass
+class TournamentReport:
+    games: int = 0
+    seconds: float = 0.0      # wall time of this run
+    gameSeconds: float = 0.0  # time spent playing, summed over workers
+    workers: int = 1
+    standings: list[tuple[str, float, int]] = field(default_factory=list)
+
+    @property
+    def gamesPerSecond(self) -> float:
+        return self.games / self.seconds if self.seconds else 0.0
+
+    @property
+    def gamesPerCoreSecond(self) -> float:
+        return self.gamesPerSecond / self.workers
+
+    def __str__(self) -> str:
+        lines = [f"{'entrant':30} {'rating':>8} {'games':>6}"]
+        lines += [f"{entrant:30} {rating:8.1f} {games:6d}" for entrant, rating, games in self.standings]
+        utilization = self.gameSeconds / (self.seconds * self.workers) if self.seconds else 0.0
+        lines.append(f"{self.games} games in {self.seconds:.2f}s: {self.gamesPerSecond:.1f} games/s, "
+                     f"{self.gamesPerCoreSecond:.1f} games/s per core ({self.workers} workers, "
+                     f"{utilization:.0%} busy)")
+        return "\n".join(lines)
+
+
+def _playChunk(tasks: list[SimulationTask]) -> list[dict[str, Any]]:
+    return [simulateGame(task) for task in tasks]
+
+
+class Tournament:
+    """A tournament that can be saved to and resumed from `checkpointPath`."""
+
+    def __init__(self, config: TournamentConfig, checkpointPath: Optional[str] = None,
+                 checkpointEvery: int = 64) -> None:
+        self.config = config
+        self._checkpointPath = checkpointPath
+        self._checkpointEvery = checkpointEvery
+        self.ratings = EloRatings(list(config.entrants), k=config.k)
+        self._rng = random.Random(config.seed)
+        self.round = 0
+        self._schedule: list[tuple[str, ...]] = []  # seatings of the games of the current round
+        self._done: set[int] = set()                # games of the current round that were rated
+        self.games = 0
+        if checkpointPath is not None and os.path.exists(checkpointPath):
+            self._load(checkpointPath)
+
+    @property
+    def finished(self) -> bool:
+        return self.round >= self.config.rounds
+
+    def _load(self, path: str) -> None:
+        with open(path, encoding="utf-8") as file:
+            saved: dict[str, Any] = json.load(file)
+        if saved["config"] != json.loads(json.dumps(asdict(self.config))):
+            raise ValueError(f"{path} is the checkpoint of another tournament: {saved['config']}")
+        self.ratings.ratings = saved["ratings"]
+        self.ratings.games = saved["games"]
+        version, state, gauss = saved["random"]
+        self._rng.setstate((version, tuple(state), gauss))
+        self.round = saved["round"]
+        self._schedule = [tuple(seating) for seating in saved["schedule"]]
+        self._done = set(saved["done"])
+        self.games = saved["played"]
+
+    def checkpoint(self) -> None:
+        if self._checkpointPath is None:
+            return
+        version, state, gauss = self._rng.getstate()
+        saved = {
+            "config": asdict(self.config),
+            "ratings": self.ratings.ratings,
+            "games": self.ratings.games,
+            "random": [version, list(state), gauss],
+            "round": self.round,
+            "schedule": self._schedule,
+            "done": sorted(self._done),
+            "played": self.games,
+        }
+        with open(self._checkpointPath + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(saved, file)
+        os.replace(self._checkpointPath + ".tmp", self._checkpointPath)
+
+    def _scheduleRound(self) -> None:
+        if self.config.format == "round-robin":
+            tables = roundRobin(list(self.config.entrants), self.config.seats)
+        else:
+            tables = swissTables(self.ratings, self.config.seats, self._rng)
+        self._schedule = [seating for table in tables for seating in tableGames(table)]
+        self._done = set()
+
+    def _task(self, game: int) -> SimulationTask:
+        # seeds depend only on the tournament, round and game, so resumed games are the same games
+        seed = random.Random(f"{self.config.seed}:{self.round}:{game}").getrandbits(63)
+        return SimulationTask(game, seed, self._schedule[game])
+
+    def _rate(self, result: dict[str, Any]) -> None:
+        self.ratings.update({result["policies"][player]: score for player, score in result["scores"].items()})
+        self._done.add(result["game"])
+        self.games += 1
+        if self.games % self._checkpointEvery == 0:
+            self.checkpoint()
+
+    def run(self, workers: int = 1, chunkSize: int = 4,
+            onResult: Optional[Callable[[dict[str, Any]], object]] = None) -> TournamentReport:
+        """Play the remaining rounds; `onResult` sees every game result as it is rated."""
+        report = TournamentReport(workers=workers)
+        start = time.perf_counter()
+        while not self.finished:
+            if not self._schedule:
+                self._scheduleRound()
+            remaining = (self._task(game) for game in range(len(self._schedule)) if game not in self._done)
+            for _, results in runChunks(_playChunk, remaining, workers, chunkSize):
+                for result in results:
+                    self._rate(result)
+                    report.games += 1
+                    report.gameSeconds += result["seconds"]
+                    if onResult is not None:
+                        onResult(result)
+            # Swiss pairings of the next round need every result of this one
+            self.round += 1
+            self._schedule = []
+            self.checkpoint()
+        report.seconds = time.perf_counter() - start
+        report.standings = self.ratings.standings()
+        return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run a tournament of Terra Futura bot policies.")
+    parser.add_argument("--entrants", required=True,
+                        help="comma separated policy names or module:Class paths")
+    parser.add_argument("--seats", type=int, default=2, choices=range(MIN_SEATS, MAX_SEATS + 1))
+    parser.add_argument("--format", default="round-robin", choices=FORMATS)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=float, default=24.0, help="Elo K-factor")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    parser.add_argument("--checkpoint", default=None, metavar="PATH", help="save progress to and resume from PATH")
+    parser.add_argument("--results", default=None, metavar="PATH", help="append one JSON line per game to PATH")
+    args = parser.parse_args(argv)
+
+    entrants = tuple(args.entrants.split(","))
+    for spec in entrants:
+        loadPolicy(spec)  # fail early on unknown policies
+    config = TournamentConfig(entrants, args.seats, args.format, args.rounds, args.seed, args.k)
+    tournament = Tournament(config, args.checkpoint)
+    if args.results is None:
+        report = tournament.run(args.workers, args.chunk_size)
+    else:
+        with open(args.results, "a", encoding="utf-8") as results:
+            report = tournament.run(args.workers, args.chunk_size,
+                                    lambda result: results.write(json.dumps(result) + "\n"))
+    print(report, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 
 from dataclasses import dataclass
-from typing import List
+from typing import Any, List
 from collections import Counter
 from abc import ABC, abstractmethod
 from terra_futura.interfaces import Effect, Resource
@@ -65,6 +65,10 @@ class TransformationFixed(Effect):
 
         return True
 
+    def __deepcopy__(self, memo: dict[int, Any]) -> "TransformationFixed":
+        # immutable, so copies of games can share their effects
+        return self
+
     def hasAssistance(self) -> bool:
         """
         A pure fixed transformation is not an Assistance effect.
@@ -0,0 +1,13 @@
+from terra_futura.game import Game
+
+
+def gameState(game: Game) -> tuple[object, ...]:
+    """What a copy of the game must agree on, from grids and piles to patterns, scoring and the pending reward."""
+    return (
+        game.state, game.onTurn(), game.turnNumber, game.version, game.canUndo(), game.canRedo(),
+        tuple((player.grid.state(), player.hasBeenAssisted,
+               tuple(pattern.state() for pattern in player.activation_patterns),
+               tuple(method.state() for method in player.scoring_methods)) for player in game.players),
+        tuple(pile.state() for pile in game.piles.values()),
+        game._selectReward.state(),  # pylint: disable=protected-access
+    )
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from typing import Iterator, Optional
+from terra_futura.anytime import BotHost, GameView, PolicyBot
+from terra_futura.bots import GameDriver, GreedyBot, finalScores, playGame
+from terra_futura.factories import GameFactory
+from terra_futura.mcts import MCTSBot, Move
+from terra_futura.simple_types import GameState
+
+
+class _Stuck:
+    """Thinks forever without finding a move."""
+
+    def think(self, view: GameView, deadline: float) -> Iterator[Optional[Move]]:
+        while True:
+            time.sleep(0.001)
+            yield None
+
+
+def test_hosted_policies_play_like_policies() -> None:
+    game = GameFactory(4).createGame([1, 2])
+    asyncio.run(BotHost().playGame(game, {1: PolicyBot(GreedyBot(1)), 2: PolicyBot(GreedyBot(2))}, 1.0))
+    expected = GameFactory(4).createGame([1, 2])
+    playGame(expected, {1: GreedyBot(1), 2: GreedyBot(2)})
+    assert game.state == GameState.Finish
+    assert finalScores(game) == finalScores(expected)
+
+
+def test_deadline_is_enforced_without_blocking_other_games() -> None:
+    stuckHost, fastHost = BotHost(), BotHost()
+
+    async def stuckDecisions() -> list[Move]:
+        driver = GameDriver(GameFactory(1).createGame([1, 2]))
+        return [await stuckHost.decide(driver, _Stuck(), 0.05) for _ in range(4)]
+
+    async def scenario() -> list[Move]:
+        game = GameFactory(2).createGame([1, 2])
+        stuck, _ = await asyncio.gather(stuckDecisions(), fastHost.playGame(
+            game, {1: PolicyBot(GreedyBot(1)), 2: PolicyBot(GreedyBot(2))}, 1.0))
+        return stuck
+
+    moves = asyncio.run(scenario())
+    # the first card on offer
+    assert moves[0] == GameView(GameDriver(GameFactory(1).createGame([1, 2]))).legalMoves()[0]
+    assert stuckHost.metrics.timeouts == stuckHost.metrics.defaults == 4
+    assert stuckHost.metrics.percentile(1.0) < 0.05 + 0.05
+    # the other game only waited for slices of the stuck bot
+    assert fastHost.metrics.timeouts == 0
+    assert fastHost.metrics.percentile(0.5) < 0.02
+
+
+def test_mcts_thinks_anytime() -> None:
+    game = GameFactory(3).createGame([1, 2])
+    view = GameView(GameDriver(game))
+    moves = list(MCTSBot(seed=1, maxIterations=10).think(view, time.monotonic() + 60))
+    # ten playouts in batches of four
+    assert len(moves) == 3
+    assert all(move in view.legalMoves() for move in moves)
+    assert game.turnNumber == 1 and game.state == GameState.TakeCardNoCardDiscarded
+
+
+def test_bots_are_not_asked_after_the_deadline() -> None:
+    view = GameView(GameDriver(GameFactory(3).createGame([1, 2])))
+    passed = time.monotonic() - 1
+    assert not list(PolicyBot(GreedyBot(1)).think(view, passed))
+    assert not list(MCTSBot(seed=1, maxIterations=10).think(view, passed))
@@ -0,0 +1,63 @@
+import io
+from typing import Any
+import pytest
+from terra_futura.archive import ArchiveReader, ArchiveWriter, GameRecord, TABLES
+from terra_futura.bots import finalScores, playGame, RandomBot
+from terra_futura.factories import GameFactory
+from terra_futura.game import Game
+from terra_futura.simulate import makeTasks, runSimulation
+
+
+def _finishedGame(seed: int) -> Game:
+    game = GameFactory(seed).createGame([1, 2])
+    playGame(game, {1: RandomBot(seed), 2: RandomBot(seed + 1)})
+    return game
+
+
+def test_record_describes_the_game() -> None:
+    game = _finishedGame(3)
+    record = GameRecord.fromGame(game)
+    scores = finalScores(game)
+    assert sorted((player, points) for player, _, points in record.scores) == sorted(scores.items())
+    assert len(record.patterns) == 2
+    # one card taken by every player in each of the nine turns
+    assert len(record.picks) == 18
+    assert {turn for _, turn, *_ in record.picks} == set(range(1, 10))
+    for player in game.players:
+        totals = [total for playerId, _, total in record.pollution if playerId == player.id]
+        assert totals == sorted(totals)
+
+    with pytest.raises(ValueError):
+        GameRecord.fromGame(GameFactory(3).createGame([1, 2]))
+
+
+def test_archive_columns_are_mapped(tmp_path: Any) -> None:
+    records = [GameRecord.fromGame(_finishedGame(seed)) for seed in range(5)]
+    with ArchiveWriter(str(tmp_path), flushEvery=2) as writer:
+        for record in records:
+            writer.add(record)
+
+    with ArchiveReader(str(tmp_path)) as archive:
+        assert archive.games == 5
+        for table, columns in TABLES.items():
+            for index, (name, _) in enumerate(columns):
+                column = archive.column(table, name)
+                expected = [row[index] for record in records for row in getattr(record, table)]
+                assert column.tolist() == expected
+                rows = archive.rows(table, 3)
+                assert column[rows].tolist() == [row[index] for row in getattr(records[3], table)]
+                assert archive.rows(table, 1, 3).stop == archive.rows(table, 2).stop
+                column.release()
+        with pytest.raises(IndexError):
+            archive.rows("picks", 5)
+
+
+def test_simulation_writes_an_archive(tmp_path: Any) -> None:
+    output = io.StringIO()
+    with ArchiveWriter(str(tmp_path)) as writer:
+        written = runSimulation(makeTasks(4, 1, ["random"], 2, archive=True), 1, output, 2, writer)
+    with ArchiveReader(str(tmp_path)) as archive:
+        assert archive.games == written == 4
+        points = archive.column("scores", "points")
+        assert len(points) == 8
+        points.release()
@@ -0,0 +1,68 @@
+from terra_futura.bots import (
+    GreedyBot, RandomBot, BotPolicy, activationsFor, finalScores, loadPolicy, playGame, turnActivations
+)
+from terra_futura.card import Card
+from terra_futura.factories import GameFactory
+from terra_futura.grid import Grid
+from terra_futura.simple_types import GameState, GridPosition, Resource
+from terra_futura.transformation_fixed import TransformationFixed
+from terra_futura.arbitrary_basic import ArbitraryBasic
+import pytest
+
+
+@pytest.mark.parametrize("players", [2, 3, 4])
+def test_bots_play_complete_game(players: int) -> None:
+    playerIds = list(range(1, players + 1))
+    game = GameFactory(seed=players).createGame(playerIds)
+    policies: dict[int, BotPolicy] = {1: GreedyBot(1)}
+    for playerId in playerIds[1:]:
+        policies[playerId] = RandomBot(playerId)
+
+    playGame(game, policies)
+
+    assert game.state == GameState.Finish
+    assert set(finalScores(game)) == set(playerIds)
+    for player in game.players:
+        # nine turns fill the whole grid
+        assert all(not player.grid.canPutCard(GridPosition(x, y)) for x in range(-1, 2) for y in range(-1, 2))
+
+
+def test_turn_activations_are_row_and_column() -> None:
+    grid = Grid()
+    for position in [GridPosition(0, 0), GridPosition(1, 0), GridPosition(0, -1), GridPosition(1, 1)]:
+        grid.putCard(position, Card(pollutionSpacesL=1))
+
+    assert set(turnActivations(grid, GridPosition(0, 0))) == {
+        GridPosition(0, 0), GridPosition(1, 0), GridPosition(0, -1)}
+
+
+def test_activation_pays_cheapest_and_keeps_pollution_off_used_cards() -> None:
+    grid = Grid()
+    acting = Card(pollutionSpacesL=1, upperEffect=ArbitraryBasic(from_=1, to=[Resource.GOODS], pollution=1))
+    store = Card(pollutionSpacesL=1)
+    store.resources = [Resource.FOOD, Resource.GREEN]
+    spare = Card(pollutionSpacesL=3)
+    grid.putCard(GridPosition(0, 0), acting)
+    grid.putCard(GridPosition(1, 0), store)
+    grid.putCard(GridPosition(-1, 0), spare)
+
+    [activation] = activationsFor(grid, GridPosition(0, 0))
+
+    assert activation.inputs == ((Resource.GREEN, GridPosition(1, 0)),)
+    assert activation.outputs == ((Resource.GOODS, GridPosition(0, 0)),)
+    assert activation.pollution == (GridPosition(-1, 0),)
+    assert activation.value == 6 - 1 - 1
+
+
+def test_activation_requires_resources() -> None:
+    grid = Grid()
+    grid.putCard(GridPosition(0, 0), Card(pollutionSpacesL=1, upperEffect=TransformationFixed(
+        [Resource.RED], [Resource.FOOD], 0)))
+    assert activationsFor(grid, GridPosition(0, 0)) == []
+
+
+def test_load_policy() -> None:
+    assert loadPolicy("greedy") is GreedyBot
+    assert loadPolicy("terra_futura.bots:RandomBot") is RandomBot
+    with pytest.raises(ValueError):
+        loadPolicy("nonexistent")
@@ -0,0 +1,47 @@
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from terra_futura.catalog import ARBITRARY, FIXED, CardCatalog, attachCatalog, processCatalog
+from terra_futura.factories import GameFactory, catalogCards, createCatalog
+from terra_futura.pile import Pile
+from terra_futura.simple_types import Deck, Resource
+
+
+def _cards(seed: int, catalog: CardCatalog | None) -> list[str]:
+    game = GameFactory(seed, catalog=catalog).createGame([1, 2])
+    states: list[str] = []
+    for deck in Deck:
+        pile = game.piles[deck]
+        assert isinstance(pile, Pile)
+        states += [card.state() for card in pile._visibleCards + pile._hiddenCards]  # pylint: disable=protected-access
+    return states
+
+
+def _workerCards(seed: int) -> list[str]:
+    catalog = processCatalog()
+    assert catalog is not None
+    return _cards(seed, catalog)
+
+
+def test_catalog_cards_are_the_cards_of_the_factory() -> None:
+    with createCatalog() as catalog:
+        assert len(catalog) == len(catalogCards())
+        for seed in range(5):
+            assert _cards(seed, catalog) == _cards(seed, None)
+        # cards of different games share their effects
+        first = GameFactory(0, catalog=catalog).createPile(Deck.LEVEL_II)
+        second = GameFactory(1, catalog=catalog).createPile(Deck.LEVEL_II)
+        effects = {id(card.upperEffect) for card in first._hiddenCards + second._hiddenCards}  # pylint: disable=protected-access
+        assert len(effects) <= catalog.effectCount
+        signature = (FIXED, (Resource.RED,), (Resource.FOOD,), 1)
+        assert catalog.signature(catalog.effectId(signature)) == signature
+        assert catalog.effect(catalog.effectId(signature)) is catalog.effect(catalog.effectId(signature))
+        with pytest.raises(ValueError):
+            catalog.effectId((ARBITRARY, 7, (Resource.FOOD,), 0))
+
+
+def test_workers_attach_to_the_catalog_by_name() -> None:
+    with createCatalog() as catalog:
+        with ProcessPoolExecutor(2, initializer=attachCatalog, initargs=(catalog.name,)) as pool:
+            assert list(pool.map(_workerCards, range(3))) == [_cards(seed, None) for seed in range(3)]
+    with pytest.raises(FileNotFoundError):
+        CardCatalog.attach(catalog.name)
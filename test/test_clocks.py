@@ -0,0 +1,75 @@
+import random
+from typing import Callable
+import pytest
+from terra_futura.clocks import GameClocks, SLOTS, TimeControl, TimerWheel
+from terra_futura.factories import GameFactory
+from terra_futura.simple_types import CardSource, Deck, GridPosition
+
+
+def test_timers_fire_on_their_tick_at_every_level() -> None:
+    wheel = TimerWheel(tick=1.0)
+    rng = random.Random(4)
+    fired: dict[int, float] = {}
+    now = 0.0
+
+    def record(index: int) -> Callable[[], None]:
+        return lambda: fired.__setitem__(index, now)
+
+    dues = {index: float(rng.choice([rng.randrange(SLOTS), rng.randrange(SLOTS ** 2), rng.randrange(SLOTS ** 3 * 2)]))
+            for index in range(300)}
+    timers = {index: wheel.schedule(due, record(index)) for index, due in dues.items()}
+    cancelled = set(rng.sample(sorted(dues), 30))
+    for index in cancelled:
+        wheel.cancel(timers[index])
+    assert len(wheel) == 270
+
+    while len(wheel):
+        previous, now = now, now + rng.choice([1.0, 7.0, 300.0])
+        wheel.advance(now)
+        for index, at in fired.items():
+            if at == now:
+                assert previous < max(dues[index], 1.0) <= now
+    assert set(fired) == set(dues) - cancelled
+
+
+def test_clocks_run_for_the_player_on_turn() -> None:
+    now = [0.0]
+    timeouts: list[tuple[int, int]] = []
+    clocks = GameClocks(TimeControl.parse("10+2"), lambda gameId, playerId: timeouts.append((gameId, playerId)),
+                        tick=0.5, clock=lambda: now[0])
+    game = GameFactory(1).createGame([1, 2])
+    clocks.start(7, game)
+
+    now[0] = 3.0
+    assert game.takeCard(1, CardSource(Deck.LEVEL_I, 1), 1, GridPosition(0, 0))
+    clocks.update(7, game, "takeCard")
+    now[0] = 5.0
+    assert game.turnFinished(1)
+    clocks.update(7, game, "turnFinished")
+    assert clocks.remaining(7) == {1: pytest.approx(7.0), 2: pytest.approx(10.0)}
+
+    now[0] = 14.9
+    clocks.advance()
+    assert not timeouts
+    now[0] = 15.0
+    clocks.advance()
+    assert timeouts == [(7, 2)]
+    assert clocks.remaining(7)[2] == 0
+
+    clocks.stop(7)
+    assert 7 not in clocks and len(clocks.wheel) == 0
+
+
+def test_failing_timer_does_not_stop_the_wheel() -> None:
+    wheel = TimerWheel(tick=1.0)
+    fired: list[int] = []
+
+    def fail() -> None:
+        raise IndexError("no move")
+
+    wheel.schedule(1.0, fail)
+    wheel.schedule(1.0, lambda: fired.append(1))
+    wheel.schedule(5.0, lambda: fired.append(5))
+    assert wheel.advance(10.0) == 3
+    assert fired == [1, 5]
+    assert wheel.failures == 1 and isinstance(wheel.lastFailure, IndexError)
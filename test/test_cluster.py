@@ -0,0 +1,117 @@
+import asyncio
+import json
+from typing import Any, Optional
+from terra_futura.cluster import HashRing, Router
+from terra_futura.load_client import runLoad
+
+
+def test_hash_ring_moves_only_games_of_the_new_worker() -> None:
+    ring = HashRing(range(3))
+    before = {gameId: ring.lookup(gameId) for gameId in range(3000)}
+    ring.add(3)
+    after = {gameId: ring.lookup(gameId) for gameId in range(3000)}
+    moved = [gameId for gameId in before if before[gameId] != after[gameId]]
+    assert all(after[gameId] == 3 for gameId in moved)
+    assert 400 < len(moved) < 1200
+    ring.remove(3)
+    assert {gameId: ring.lookup(gameId) for gameId in range(3000)} == before
+
+
+def test_router_spreads_games_over_workers() -> None:
+    async def scenario() -> tuple[int, list[int]]:
+        router = Router()
+        tcp = await router.start(2, port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        try:
+            async with tcp:
+                report = await runLoad("127.0.0.1", port, games=12, connections=3, players=2)
+                return report.failedGames, sorted(router.created)
+        finally:
+            await router.close()
+
+    failed, workers = asyncio.run(scenario())
+    assert failed == 0
+    assert workers == [0, 1]
+
+
+def test_added_worker_takes_over_games_with_their_state() -> None:
+    async def scenario() -> tuple[int, list[dict[str, Any]]]:
+        router = Router()
+        tcp = await router.start(1, port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        async def call(method: str, game: int, params: dict[str, Any]) -> list[dict[str, Any]]:
+            writer.write(json.dumps({"id": method, "method": method, "game": game, "params": params}).encode() + b"\n")
+            messages = [json.loads(await reader.readline())]
+            while messages[-1].get("id") != method:
+                messages.append(json.loads(await reader.readline()))
+            return messages
+
+        try:
+            async with tcp:
+                for gameId in range(8):
+                    await call("createGame", -1, {"players": [1, 2], "seed": gameId})
+                    await call("subscribe", gameId, {"playerId": 2})
+                    await call("takeCard", gameId, {"playerId": 1, "source": {"deck": "LEVEL_I", "index": 1},
+                                                    "cardIndex": 1, "destination": [0, 0]})
+                assert await router.addWorker() == router.moved
+                moved = next(gameId for gameId in range(8) if router.workerOf(gameId) == 1)
+                messages = await call("turnFinished", moved, {"playerId": 1})
+                writer.close()
+                return moved, messages
+        finally:
+            await router.close()
+
+    moved, messages = asyncio.run(scenario())
+    # the subscription moved along and the game went on from version 1
+    assert messages[0]["event"] == "notify" and messages[0]["game"] == moved
+    assert messages[0]["player"] == 2 and json.loads(messages[0]["state"])["version"] == 2
+    assert messages[-1] == {"id": "turnFinished", "result": True, "version": 2}
+
+
+class _SlowLinkRouter(Router):
+    """Holds the first link of every new client until `gate` is set."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.gate: Optional[asyncio.Event] = None
+
+    async def _link(self, client: Any, worker: int) -> Any:
+        if self.gate is not None and not client.links:
+            await self.gate.wait()
+        return await super()._link(client, worker)
+
+
+def test_request_follows_a_game_that_moved_while_its_link_opened() -> None:
+    async def scenario() -> dict[str, Any]:
+        router = _SlowLinkRouter()
+        tcp = await router.start(1, port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        try:
+            async with tcp:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                for gameId in range(8):
+                    writer.write(json.dumps({"id": gameId, "method": "createGame", "game": -1,
+                                             "params": {"players": [1, 2], "seed": gameId}}).encode() + b"\n")
+                    await reader.readline()
+                writer.close()
+                moving = next(gameId for gameId in range(8) if HashRing(range(2)).lookup(gameId) == 1)
+
+                router.gate = asyncio.Event()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(json.dumps({"id": 1, "method": "takeCard", "game": moving, "params": {
+                    "playerId": 1, "source": {"deck": "LEVEL_I", "index": 1}, "cardIndex": 1,
+                    "destination": [0, 0]}}).encode() + b"\n")
+                await asyncio.sleep(0.1)
+                # the request was routed to the first worker and waits for its link
+                await router.addWorker()
+                assert router.workerOf(moving) == 1
+                router.gate.set()
+                answer: dict[str, Any] = json.loads(await reader.readline())
+                writer.close()
+                return answer
+        finally:
+            await router.close()
+
+    assert asyncio.run(scenario()) == {"id": 1, "result": True, "version": 1}
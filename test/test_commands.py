@@ -0,0 +1,125 @@
+from terra_futura.bots import GameDriver, RandomBot
+from terra_futura.commands import TurnStep
+from terra_futura.factories import GameFactory
+from terra_futura.game import Game
+from terra_futura.simple_types import CardSource, Deck, GameState, GridPosition
+
+
+def _snapshot(game: Game) -> tuple[object, ...]:
+    return (
+        game.state, game.onTurn(), game.turnNumber,
+        tuple(player.grid.state() for player in game.players),
+        tuple(player.grid.activationMask for player in game.players),
+        tuple(pile.state() for pile in game.piles.values()),
+        tuple(pattern.state() for player in game.players for pattern in player.activation_patterns),
+        tuple(method.state() for player in game.players for method in player.scoring_methods),
+    )
+
+
+def test_undo_and_redo_a_whole_game() -> None:
+    game = GameFactory(seed=5).createGame([1, 2])
+    driver = GameDriver(game)
+    bot = RandomBot(5)
+    history = [_snapshot(game)]
+    while game.state != GameState.Finish:
+        if game.state == GameState.TakeCardNoCardDiscarded and game.turnNumber % 3 == 0:
+            assert game.discardLastCardFromDeck(game.onTurn(), Deck.LEVEL_II)
+        else:
+            driver.step(bot)
+        history.append(_snapshot(game))
+
+    # only accepted actions are recorded, one per step
+    for expected in reversed(history[:-1]):
+        assert game.undo()
+        assert _snapshot(game) == expected
+    assert not game.undo()
+
+    for expected in history[1:]:
+        assert game.redo()
+        assert _snapshot(game) == expected
+    assert not game.redo()
+
+
+def test_new_action_clears_redo() -> None:
+    game = GameFactory(seed=1).createGame([1, 2])
+    assert game.discardLastCardFromDeck(1, Deck.LEVEL_I)
+    assert game.undo()
+    assert game.canRedo()
+    assert game.discardLastCardFromDeck(1, Deck.LEVEL_II)
+    assert not game.canRedo()
+    assert game.canUndo()
+
+
+def test_rejected_actions_are_not_recorded() -> None:
+    game = GameFactory(seed=1).createGame([1, 2])
+    assert not game.turnFinished(1)
+    assert not game.discardLastCardFromDeck(2, Deck.LEVEL_I)
+    assert not game.canUndo()
+
+
+def test_clone_has_no_history() -> None:
+    game = GameFactory(seed=1).createGame([1, 2])
+    assert game.discardLastCardFromDeck(1, Deck.LEVEL_I)
+    copy = game.clone()
+    assert not copy.canUndo()
+    assert game.canUndo()
+
+
+def test_submit_turn_is_all_or_nothing() -> None:
+    notifications: list[dict[int, str]] = []
+
+    class Recorder:
+        def notifyAll(self, newState: dict[int, str]) -> None:
+            notifications.append(newState)
+
+    game = GameFactory(seed=3).createGame([1, 2], Recorder())
+    before = _snapshot(game)
+    source = CardSource(Deck.LEVEL_I, 1)
+
+    # player 2 cannot finish player 1's turn
+    assert not game.submitTurn([TurnStep("takeCard", (1, source, 1, GridPosition(0, 0))),
+                                TurnStep("turnFinished", (2,))])
+    assert _snapshot(game) == before
+    assert notifications == []
+    assert not game.canUndo()
+
+    assert game.submitTurn([TurnStep("discardLastCardFromDeck", (1, Deck.LEVEL_II)),
+                            TurnStep("takeCard", (1, source, 1, GridPosition(0, 0))),
+                            TurnStep("turnFinished", (1,))])
+    assert game.onTurn() == 2
+    assert len(notifications) == 1
+    # the steps stay separately undoable
+    assert game.undo() and game.undo() and game.undo()
+    assert _snapshot(game) == before
+
+
+def test_submit_turn_rejects_unknown_methods() -> None:
+    game = GameFactory(seed=3).createGame([1, 2])
+    assert not game.submitTurn([TurnStep("clone", ())])
+    assert not game.submitTurn([])
+
+
+def test_version_counts_every_change() -> None:
+    game = GameFactory(seed=1).createGame([1, 2])
+    assert game.version == 0
+    assert not game.turnFinished(1)
+    assert game.version == 0
+    assert game.discardLastCardFromDeck(1, Deck.LEVEL_I)
+    assert game.undo() and game.redo()
+    assert game.version == 3
+    # a rejected batch leaves the version alone
+    assert not game.submitTurn([TurnStep("takeCard", (1, CardSource(Deck.LEVEL_I, 1), 1, GridPosition(0, 0))),
+                                TurnStep("turnFinished", (2,))])
+    assert game.version == 3
+    assert game.clone().version == 3
+
+
+def test_perform_checks_versions_and_idempotency_keys() -> None:
+    game = GameFactory(seed=1).createGame([1, 2])
+    assert not game.perform("discardLastCardFromDeck", (1, Deck.LEVEL_I), expectedVersion=1, idempotencyKey="k")
+    # the stale attempt is not remembered, a retry with the current version is performed
+    assert game.perform("discardLastCardFromDeck", (1, Deck.LEVEL_I), expectedVersion=0, idempotencyKey="k")
+    assert game.version == 1
+    # the retry is answered without discarding again
+    assert game.perform("discardLastCardFromDeck", (1, Deck.LEVEL_I), expectedVersion=0, idempotencyKey="k")
+    assert game.version == 1 and game.state == GameState.TakeCardCardDiscarded
@@ -0,0 +1,65 @@
+import os
+import struct
+from typing import Any
+from terra_futura.dataset import DatasetConfig, DatasetWriter, OUTCOMES, generateDataset, playPositions, readNpy
+from terra_futura.features import FEATURES
+from terra_futura.simulate import makeTasks
+
+
+def _rows(directory: str) -> list[tuple[list[float], list[float]]]:
+    rows = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("shard-") and name.endswith(".x.npy"):
+            (count, columns), x = readNpy(os.path.join(directory, name))
+            (_, outcomes), y = readNpy(os.path.join(directory, name.replace(".x.", ".y.")))
+            assert (columns, outcomes) == (FEATURES, OUTCOMES)
+            rows += [(x[i * FEATURES:(i + 1) * FEATURES].tolist(), y[i * OUTCOMES:(i + 1) * OUTCOMES].tolist())
+                     for i in range(count)]
+    return rows
+
+
+def test_positions_carry_the_outcome() -> None:
+    task = next(makeTasks(1, 5, ["random", "greedy"], 2))
+    x, y = playPositions(task)
+    assert len(x) == len(y) // OUTCOMES * FEATURES
+    outcomes = list(struct.iter_unpack("<ff", y))
+    # at least one decision per player in each of the nine turns
+    assert len(outcomes) > 18
+    assert {outcome for outcome, _ in outcomes} <= {0.0, 0.5, 1.0}
+
+
+def test_shards_hold_every_position(tmp_path: Any) -> None:
+    config = DatasetConfig(games=3, seed=2, policies=("random",), players=2, shardRows=50, bufferRows=30)
+    writer = generateDataset(str(tmp_path), config, workers=1)
+    expected = sum(len(playPositions(task)[1]) // (OUTCOMES * 4) for task in makeTasks(3, 2, ["random"], 2))
+    rows = _rows(str(tmp_path))
+    assert len(rows) == expected
+    assert writer.shards == -(-expected // 50)
+    shape, _ = readNpy(os.path.join(str(tmp_path), "shard-00000.y.npy"))
+    assert shape == (50, OUTCOMES)
+    # the winner of a two player game sees a positive margin, the loser a negative one
+    assert all((margin > 0) == (outcome == 1.0) for _, (outcome, margin) in rows)
+
+
+def test_resume_continues_from_the_checkpoint(tmp_path: Any) -> None:
+    config = DatasetConfig(games=4, seed=3, policies=("random",), players=2, shardRows=40, bufferRows=20)
+    complete = str(tmp_path / "complete")
+    generateDataset(complete, config, workers=1)
+
+    resumed = str(tmp_path / "resumed")
+    os.makedirs(resumed)
+    writer = DatasetWriter(resumed, config)
+    for task in list(makeTasks(4, 3, ["random"], 2))[:3]:
+        writer.addGame(*playPositions(task))
+    writer.checkpoint()
+    checkpoint = writer.nextGame
+    # a crash after rows of the next game were written
+    del writer
+    for name in os.listdir(resumed):
+        if name.endswith(".tmp"):
+            with open(os.path.join(resumed, name), "ab") as file:
+                file.write(b"\0" * 1000)
+
+    assert DatasetWriter(resumed, config).nextGame == checkpoint
+    generateDataset(resumed, config, workers=1)
+    assert _rows(resumed) == _rows(complete)
@@ -0,0 +1,68 @@
+import time
+from terra_futura.bots import GameDriver, GreedyBot, RandomBot, finalScores, getPlayer, playGame
+from terra_futura.endgame import EndgameBot, solveActivations, solveEndgame
+from terra_futura.factories import GameFactory
+from terra_futura.game import Game
+from terra_futura.simple_types import GameState
+
+
+def _finalRound(seed: int) -> tuple[Game, GameDriver]:
+    game = GameFactory(seed).createGame([1, 2])
+    driver = GameDriver(game)
+    bot = GreedyBot(seed)
+    while game.state != GameState.SelectActivationPattern:
+        driver.step(bot)
+    return game, driver
+
+
+def _finalTurnOf(seed: int, playerId: int) -> Game:
+    game, driver = _finalRound(seed)
+    bot = GreedyBot(seed)
+    while game.onTurn() != playerId:
+        driver.step(bot)
+    assert game.state == GameState.SelectActivationPattern
+    return game
+
+
+def test_solution_line_reaches_the_solved_score() -> None:
+    for seed in range(6):
+        game, driver = _finalRound(seed)
+        player = getPlayer(game, game.onTurn())
+        solution = solveEndgame(player)
+
+        driver.selectPattern(player.id, solution.pattern)
+        for activation in solution.activations:
+            driver.activate(player.id, activation)
+        driver.finishTurn(player.id)
+
+        assert player.scoring_methods[solution.scoring].calculate().value == solution.score
+
+
+def test_solution_is_not_worse_than_doing_nothing() -> None:
+    for seed in range(6):
+        game, _ = _finalRound(seed)
+        player = getPlayer(game, game.onTurn())
+        idle, _, activations = solveActivations(player.grid, [], player.scoring_methods)
+        assert activations == []
+        assert idle == max(method.calculate().value for method in player.scoring_methods)
+        assert solveEndgame(player).score >= idle
+
+
+def test_endgame_bot_scores_at_least_as_much_as_greedy() -> None:
+    for seed in range(4):
+        results = []
+        for bot in (GreedyBot(seed), EndgameBot(seed)):
+            game = GameFactory(seed).createGame([1, 2])
+            # both play the regular turns the same way, only the final round differs
+            playGame(game, {1: bot, 2: RandomBot(seed)})
+            results.append(finalScores(game)[1])
+        assert results[1] >= results[0]
+
+
+def test_worst_known_positions_are_solved_in_time() -> None:
+    # final rounds of greedy games that took seconds before the search merged equivalent states
+    for seed, playerId in ((154, 2), (178, 1)):
+        player = getPlayer(_finalTurnOf(seed, playerId), playerId)
+        start = time.perf_counter()
+        solveEndgame(player)
+        assert time.perf_counter() - start < 2.0
@@ -0,0 +1,50 @@
+from terra_futura.bots import GameDriver, RandomBot
+from terra_futura.factories import GameFactory
+from terra_futura.features import FEATURES, FeatureEncoder, featureNames
+from terra_futura.simple_types import CardSource, Deck, GameState, GridPosition
+
+
+def test_vector_layout_matches_feature_names() -> None:
+    names = featureNames()
+    assert len(names) == FEATURES == len(set(names))
+    game = GameFactory(seed=2).createGame([1, 2])
+    values = FeatureEncoder().encode(game)
+    assert len(values) == FEATURES
+    named = dict(zip(names, values))
+    assert named["turn"] == 1
+    assert named["state_TakeCardNoCardDiscarded"] == 1
+    assert named["player0_present"] == named["player1_present"] == 1
+    assert named["player2_present"] == named["player3_present"] == 0
+    assert all(named[f"{deck.name}_card{index}_present"] == 1 for deck in Deck for index in range(1, 5))
+
+    assert game.takeCard(1, CardSource(Deck.LEVEL_I, 1), 1, GridPosition(0, 0))
+    named = dict(zip(names, FeatureEncoder().encode(game)))
+    assert named["player0_cell00_occupied"] == 1
+    assert named["player0_cell00_active"] == 1
+    assert named["state_ActivateCard"] == 1
+    assert sum(named[f"player0_cell00_option0_{kind}"] for kind in ("fixed", "arbitrary", "other")) == 1
+    # the other player sees the card as the second player's
+    named = dict(zip(names, FeatureEncoder().encode(game, 2)))
+    assert named["player0_cell00_occupied"] == 0
+    assert named["player1_cell00_occupied"] == 1
+
+
+def test_batch_rows_equal_single_encodings() -> None:
+    encoder = FeatureEncoder()
+    games = []
+    for seed in range(3):
+        game = GameFactory(seed).createGame([1, 2, 3])
+        driver = GameDriver(game)
+        bot = RandomBot(seed)
+        for _ in range(25 + seed):
+            if game.state != GameState.Finish:
+                driver.step(bot)
+        games.append(game)
+    batch = encoder.encodeBatch([games[0], (games[1], 2), games[2]])
+    view = batch.view()
+    assert view.shape == (3, FEATURES)
+    rows: list[list[float]] = view.tolist()  # type: ignore[assignment]
+    assert rows[0] == encoder.encode(games[0]).tolist()
+    assert batch.values[FEATURES:2 * FEATURES].tolist() == encoder.encode(games[1], 2).tolist()
+    assert batch.values[2 * FEATURES:].tolist() == FeatureEncoder().encode(games[2]).tolist()
+    view.release()
@@ -48,4 +48,33 @@ class TestGrid:
         # Action & Assert
         assert grid.canPutCard(GridPosition(0, 0)) is True
         grid.putCard(GridPosition(0, 0), card_mock)
-        assert grid.canPutCard(GridPosition(0, 0)) is False
\ No newline at end of file
+        assert grid.canPutCard(GridPosition(0, 0)) is False
+
+    def test_activation_masks(self) -> None:
+        """Test that activations are tracked per cell and reset at the end of the turn"""
+        grid = Grid()
+        for position in [GridPosition(0, 0), GridPosition(1, 0), GridPosition(-1, 1)]:
+            grid.putCard(position, Mock(spec=InterfaceCard))
+
+        # positions wrap around the 3x3 grid
+        assert grid.mask([GridPosition(1, 0)]) == grid.mask([GridPosition(-2, 0)])
+        assert not grid.canBeActivated(GridPosition(1, 1))  # empty cell
+
+        grid.setActivationPattern([GridPosition(0, 0), GridPosition(1, 1)])
+        assert not grid.canBeActivated(GridPosition(0, 0))
+        assert grid.canBeActivated(GridPosition(1, 0))
+        assert grid.positions(grid.activatableMask) == [GridPosition(1, 0), GridPosition(-1, 1)]
+
+        grid.endTurn()
+        assert grid.activationMask == 0
+        assert grid.positions(grid.activatableMask) == grid.positions(grid.occupiedMask)
+        assert len(grid.positions(grid.occupiedMask)) == 3
+
+    def test_remove_card(self) -> None:
+        """Test that removeCard frees the cell"""
+        grid = Grid()
+        grid.putCard(GridPosition(0, 1), Mock(spec=InterfaceCard))
+        grid.removeCard(GridPosition(0, 1))
+        assert grid.canPutCard(GridPosition(0, 1))
+        assert grid.getCard(GridPosition(0, 1)) is None
+        assert grid.occupiedMask == 0
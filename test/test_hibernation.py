@@ -0,0 +1,131 @@
+import asyncio
+import pickle
+import zlib
+from typing import Any
+import pytest
+from terra_futura.bots import GameDriver, RandomBot, closePolicy
+from terra_futura.factories import GameFactory
+from terra_futura.game import Game
+from terra_futura.hibernation import HibernatingGames, hibernate, rehydrate
+from terra_futura.load_client import runLoad
+from terra_futura.server import GameServer
+from . import gameState
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.notifications: list[dict[int, str]] = []
+
+    def notifyAll(self, newState: dict[int, str]) -> None:
+        self.notifications.append(newState)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _playedGame(seed: int, observer: Any = None, steps: int = 12) -> Game:
+    game = GameFactory(seed=seed).createGame([1, 2], observer)
+    driver = GameDriver(game)
+    bot = RandomBot(seed)
+    for _ in range(steps):
+        driver.step(bot)
+    return game
+
+
+def test_rehydrated_game_keeps_state_history_and_observer() -> None:
+    recorder = _Recorder()
+    game = _playedGame(2, recorder)
+    copy = rehydrate(hibernate(game), recorder)
+    assert copy is not game
+    assert gameState(copy) == gameState(game)
+    assert copy.gameObserver is recorder
+
+    count = len(recorder.notifications)
+    assert copy.undo()
+    assert len(recorder.notifications) == count + 1
+
+
+class _Exploit:
+    def __reduce__(self) -> tuple[Any, ...]:
+        return print, ("unpickled",)
+
+
+def test_images_may_refer_to_game_classes_only() -> None:
+    # a foreign callable, a function of the package and a method a pickle would call
+    for payload in (_Exploit(), closePolicy, GameFactory(0).createGame([1, 2]).players[0].grid.getCard):
+        with pytest.raises(pickle.UnpicklingError):
+            rehydrate(zlib.compress(pickle.dumps(payload)), None)
+
+
+def test_least_recently_used_games_are_hibernated(tmp_path: Any) -> None:
+    games = HibernatingGames(capacity=2, directory=str(tmp_path))
+    states = {}
+    for gameId in range(3):
+        games[gameId] = _playedGame(gameId)
+        states[gameId] = gameState(games[gameId])
+    assert not games.isResident(0)
+    assert len(games) == 3 and sorted(games) == [0, 1, 2]
+
+    # reading game 0 back hibernates game 1, now the least recently used
+    assert gameState(games[0]) == states[0]
+    assert games.isResident(0) and not games.isResident(1)
+    assert games.metrics.misses == 1
+    assert games.metrics.hibernations == 2
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_idle_games_are_hibernated(tmp_path: Any) -> None:
+    clock = _Clock()
+    games = HibernatingGames(idleSeconds=10, directory=str(tmp_path), clock=clock)
+    games[0] = _playedGame(0)
+    games[1] = _playedGame(1)
+    clock.now = 8
+    # reading a game keeps it awake
+    assert games[1].turnNumber > 0
+    clock.now = 15
+    games.sweep()
+    assert not games.isResident(0) and games.isResident(1)
+    assert 0 in games
+
+    # an idle limit of zero still returns the game just read
+    games = HibernatingGames(idleSeconds=0, directory=str(tmp_path), clock=clock)
+    games[0] = _playedGame(0)
+    assert games.isResident(0)
+    clock.now = 16
+    games.sweep()
+    assert not games.isResident(0)
+
+
+def test_deleted_games_are_removed_from_disk(tmp_path: Any) -> None:
+    games = HibernatingGames(capacity=1, directory=str(tmp_path))
+    games[0] = _playedGame(0)
+    games[1] = _playedGame(1)
+    del games[0]
+    del games[1]
+    assert len(games) == 0
+    assert list(tmp_path.iterdir()) == []
+    with pytest.raises(KeyError):
+        _ = games[0]
+    with pytest.raises(ValueError):
+        HibernatingGames(capacity=0)
+
+
+def test_server_plays_games_that_are_hibernated_between_turns(tmp_path: Any) -> None:
+    games = HibernatingGames(capacity=1, directory=str(tmp_path))
+    server = GameServer(games)
+
+    async def scenario() -> Any:
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            return await runLoad("127.0.0.1", port, games=4, connections=4, players=2)
+
+    report = asyncio.run(scenario())
+    assert report.failedGames == 0
+    assert games.metrics.misses > 0
+    assert len(games) == 0
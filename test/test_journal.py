@@ -0,0 +1,66 @@
+from terra_futura.arbitrary_basic import ArbitraryBasic
+from terra_futura.card import Card
+from terra_futura.grid import Grid
+from terra_futura.journal import Journal, trial
+from terra_futura.process_action import ProcessAction
+from terra_futura.simple_types import GridPosition, Resource
+
+ACTING, STORE = GridPosition(0, 0), GridPosition(1, 0)
+
+
+def _grid() -> tuple[Grid, Card, Card]:
+    grid = Grid()
+    acting = Card(pollutionSpacesL=2, upperEffect=ArbitraryBasic(from_=1, to=[Resource.GOODS], pollution=1))
+    store = Card(pollutionSpacesL=1)
+    store.resources = [Resource.RED, Resource.FOOD]
+    grid.putCard(ACTING, acting)
+    grid.putCard(STORE, store)
+    return grid, acting, store
+
+
+def test_rollback_to_mark_undoes_later_changes_only() -> None:
+    card = Card(pollutionSpacesL=3)
+    journal = Journal()
+    journal.record(card)
+    card.putResources([Resource.RED])
+    mark = journal.mark()
+    journal.record(card)
+    card.putResources([Resource.GREEN])
+    journal.record(card)
+    card.placePollution(2)
+
+    journal.rollback(mark)
+    assert card.resources == [Resource.RED]
+    assert card.pollution == 0
+    assert len(journal) == 1
+
+    journal.rollback()
+    assert card.resources == []
+
+
+def test_failed_apply_leaves_grid_unchanged() -> None:
+    grid, acting, store = _grid()
+    before = grid.state()
+
+    # pollution deactivates the paying card before it pays
+    assert not ProcessAction().activateCard(acting, grid, [(Resource.RED, STORE)], [(Resource.GOODS, ACTING)],
+                                            [STORE])
+
+    assert grid.state() == before
+    assert store.resources == [Resource.RED, Resource.FOOD]
+
+
+def test_trial_rolls_back_successful_activations() -> None:
+    grid, acting, store = _grid()
+    before = grid.state()
+
+    with trial() as journal:
+        assert ProcessAction().activateCard(acting, grid, [(Resource.RED, STORE)], [(Resource.GOODS, ACTING)],
+                                            [ACTING], journal)
+        assert acting.resources == [Resource.GOODS]
+        assert store.resources == [Resource.FOOD]
+        assert len(journal) == 3
+
+    assert grid.state() == before
+    assert acting.resources == []
+    assert store.resources == [Resource.RED, Resource.FOOD]
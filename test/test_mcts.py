@@ -0,0 +1,92 @@
+import gc
+import time
+import pytest
+from terra_futura.bots import GameDriver, GreedyBot, RandomBot, cardChoices, getPlayer
+from terra_futura.factories import GameFactory
+from terra_futura.mcts import FINISH_TURN, MCTSBot, Move, legalMoves, search, winShares
+from terra_futura.simple_types import GameState
+from terra_futura.state_buffer import StateBuffer
+from terra_futura.game import Game
+
+
+def _gameAt(state: GameState, seed: int = 0) -> tuple[Game, GameDriver]:
+    game = GameFactory(seed).createGame([1, 2])
+    driver = GameDriver(game)
+    bot = RandomBot(seed)
+    while game.state != state:
+        driver.step(bot)
+    return game, driver
+
+
+def test_legal_moves_follow_game_state() -> None:
+    game, driver = _gameAt(GameState.TakeCardNoCardDiscarded)
+    assert legalMoves(driver) == [Move(card=choice) for choice in cardChoices(game, 1)]
+
+    _, driver = _gameAt(GameState.ActivateCard)
+    assert legalMoves(driver)[0] == FINISH_TURN
+
+    _, driver = _gameAt(GameState.SelectScoringMethod)
+    assert legalMoves(driver) == [Move(scoring=0), Move(scoring=1)]
+
+
+def test_search_does_not_change_the_searched_game() -> None:
+    game, driver = _gameAt(GameState.TakeCardNoCardDiscarded)
+    before = getPlayer(game, 1).grid.state()
+
+    statistics = search(game, [], time.monotonic() + 60, seed=1, maxIterations=8)
+
+    assert sum(visits for visits, _ in statistics) == 8
+    assert len(statistics) == len(legalMoves(driver))
+    assert getPlayer(game, 1).grid.state() == before
+    assert game.state == GameState.TakeCardNoCardDiscarded
+
+
+def test_mcts_picks_the_better_scoring_method() -> None:
+    # the opponent scores 38 either way, so only the second method wins
+    game, _ = _gameAt(GameState.SelectScoringMethod, seed=191)
+    methods = getPlayer(game, game.onTurn()).scoring_methods
+    assert [m.calculate().value for m in methods] == [31, 45]
+    opponent = getPlayer(game, 3 - game.onTurn()).scoring_methods
+    assert [m.calculate().value for m in opponent] == [38, 38]
+
+    choice = MCTSBot(seed=1, timeBudget=60, maxIterations=30).chooseScoring(game, game.onTurn())
+
+    assert choice == 1
+
+
+def test_mcts_decides_only_for_the_player_on_turn() -> None:
+    game, _ = _gameAt(GameState.TakeCardNoCardDiscarded)
+    with pytest.raises(ValueError):
+        MCTSBot(seed=1, maxIterations=4).chooseCard(game, 2)
+
+
+def test_root_parallel_search_merges_workers() -> None:
+    game, _ = _gameAt(GameState.TakeCardNoCardDiscarded)
+    with MCTSBot(seed=2, timeBudget=60, workers=2, maxIterations=4) as bot:
+        choice = bot.chooseCard(game, 1)
+    assert choice in cardChoices(game, 1)
+
+
+def test_workers_are_released_when_closed_or_collected() -> None:
+    game, _ = _gameAt(GameState.TakeCardNoCardDiscarded)
+    names = []
+    for closed in (True, False):
+        bot = MCTSBot(seed=2, timeBudget=60, workers=2, maxIterations=4)
+        bot.chooseCard(game, 1)
+        names.append(bot._states.name)  # type: ignore[union-attr]  # pylint: disable=protected-access
+        if closed:
+            bot.close()
+        del bot
+        gc.collect()
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            StateBuffer.attach(name)
+
+
+def test_win_shares_split_ties() -> None:
+    game = GameFactory(0).createGame([1, 2])
+    driver = GameDriver(game)
+    while game.state != GameState.Finish:
+        driver.step(GreedyBot(0))
+    shares = winShares(game)
+    assert sum(shares.values()) == 1
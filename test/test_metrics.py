@@ -0,0 +1,10 @@
+from terra_futura.metrics import percentile
+
+
+def test_percentile_picks_from_the_sorted_values() -> None:
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    assert percentile(values, 0.0) == 1.0
+    assert percentile(values, 0.5) == 3.0
+    assert percentile(values, 0.99) == 5.0
+    assert percentile(values, 1.0) == 5.0
+    assert percentile([], 0.5) == 0.0
@@ -125,6 +125,12 @@ class PileFake(InterfacePile):
     def removeLastCard(self) -> None:
         ...
 
+    def returnCard(self, index: int, card: InterfaceCard) -> None:
+        ...
+
+    def returnLastCard(self, card: InterfaceCard) -> None:
+        ...
+
     def state(self)-> str:
         return ""
 
@@ -138,6 +144,12 @@ class PileUnableToGiveCardFake(InterfacePile):
     def removeLastCard(self) -> None:
         ...
 
+    def returnCard(self, index: int, card: InterfaceCard) -> None:
+        ...
+
+    def returnLastCard(self, card: InterfaceCard) -> None:
+        ...
+
     def state(self)-> str:
         return ""
 
@@ -0,0 +1,70 @@
+from collections import Counter
+from itertools import islice
+from terra_futura.arbitrary_basic import ArbitraryBasic
+from terra_futura.card import Card
+from terra_futura.grid import Grid
+from terra_futura.payments import distribute, payments
+from terra_futura.process_action import ProcessAction
+from terra_futura.scoring_method import BASE_SCORES
+from terra_futura.simple_types import GridPosition, Resource
+from terra_futura.transformation_fixed import TransformationFixed
+
+A, B, C = GridPosition(-1, 0), GridPosition(1, 0), GridPosition(0, 1)
+
+
+def _grid() -> Grid:
+    grid = Grid()
+    acting = Card(pollutionSpacesL=1, upperEffect=ArbitraryBasic(from_=2, to=[Resource.GOODS], pollution=0))
+    grid.putCard(GridPosition(0, 0), acting)
+    first = Card(pollutionSpacesL=1)
+    first.resources = [Resource.GREEN, Resource.GREEN, Resource.GREEN, Resource.FOOD]
+    second = Card(pollutionSpacesL=1)
+    second.resources = [Resource.GREEN, Resource.RED]
+    grid.putCard(A, first)
+    grid.putCard(B, second)
+    inactive = Card(pollutionSpacesL=1)
+    inactive.resources = [Resource.RED]
+    inactive.placePollution(1)
+    grid.putCard(C, inactive)
+    return grid
+
+
+def test_distribute_takes_exact_amounts() -> None:
+    assert list(distribute(2, [("a", 1), ("b", 2)])) == [[("a", 1), ("b", 1)], [("b", 2)]]
+    assert list(distribute(4, [("a", 1), ("b", 2)])) == []
+
+
+def test_payments_are_distinct_per_card_multisets() -> None:
+    grid = _grid()
+    found = list(payments(grid, ArbitraryBasic(from_=2, to=[Resource.GOODS], pollution=0)))
+    keys = [frozenset(Counter(found_payment).items()) for found_payment in found]
+    assert len(keys) == len(set(keys))
+    # GG@A, GF@A, G@A+G@B, G@A+R@B, F@A+G@B, F@A+R@B, G@B+R@B
+    assert len(found) == 7
+    # the inactive card never pays
+    assert all(position != C for found_payment in found for _, position in found_payment)
+
+
+def test_every_payment_is_accepted() -> None:
+    effect = ArbitraryBasic(from_=2, to=[Resource.GOODS], pollution=0)
+    for payment in payments(_grid(), effect):
+        grid = _grid()
+        card = grid.getCard(GridPosition(0, 0))
+        assert card is not None
+        assert ProcessAction().activateCard(card, grid, list(payment), [(Resource.GOODS, GridPosition(0, 0))], [])
+
+
+def test_cheapest_first() -> None:
+    effect = ArbitraryBasic(from_=2, to=[Resource.GOODS], pollution=0)
+    costs = [sum(BASE_SCORES[r] for r, _ in payment) for payment in payments(_grid(), effect, cheapestFirst=True)]
+    assert costs == sorted(costs)
+    assert costs[0] == 2
+
+
+def test_fixed_payments_and_early_termination() -> None:
+    grid = _grid()
+    effect = TransformationFixed([Resource.GREEN, Resource.RED], [Resource.FOOD], 0)
+    assert {frozenset(payment) for payment in payments(grid, effect)} == {
+        frozenset({(Resource.GREEN, A), (Resource.RED, B)}), frozenset({(Resource.GREEN, B), (Resource.RED, B)})}
+    assert list(payments(grid, TransformationFixed([Resource.GOODS], [Resource.FOOD], 0))) == []
+    assert len(list(islice(payments(grid, ArbitraryBasic(from_=3, to=[], pollution=0)), 2))) == 2
@@ -0,0 +1,84 @@
+from terra_futura.arbitrary_basic import ArbitraryBasic
+from terra_futura.bots import RandomBot, finalScores, playGame
+from terra_futura.card import Card
+from terra_futura.factories import GameFactory
+from terra_futura.grid import Grid
+from terra_futura.interfaces import InterfaceGrid
+from terra_futura.planner import PlannerBot, gridValue, planTurn
+from terra_futura.process_action import ProcessAction
+from terra_futura.simple_types import GameState, GridPosition, Resource
+from terra_futura.transformation_fixed import TransformationFixed
+
+
+def _chain() -> Grid:
+    grid = Grid()
+    # the converter can only be paid after the producer has been activated
+    grid.putCard(GridPosition(0, 0), Card(pollutionSpacesL=2, upperEffect=TransformationFixed(
+        [Resource.RED], [Resource.FOOD], 1)))
+    grid.putCard(GridPosition(1, 0), Card(pollutionSpacesL=1, upperEffect=TransformationFixed(
+        [], [Resource.RED], 0)))
+    grid.putCard(GridPosition(-1, 0), Card(pollutionSpacesL=3))
+    return grid
+
+
+def test_plan_orders_producer_before_converter() -> None:
+    grid = _chain()
+    before = grid.state()
+
+    plan = planTurn(grid, [GridPosition(0, 0), GridPosition(1, 0)])
+
+    assert [a.card for a in plan.activations] == [GridPosition(1, 0), GridPosition(0, 0)]
+    assert plan.value == 5 - 1
+    # planning leaves the grid as it was
+    assert grid.state() == before
+
+
+def test_plan_replays_to_its_value() -> None:
+    grid = _chain()
+    plan = planTurn(grid, [GridPosition(0, 0), GridPosition(1, 0), GridPosition(-1, 0)])
+    for activation in plan.activations:
+        card = grid.getCard(activation.card)
+        assert card is not None
+        assert ProcessAction().activateCard(card, grid, list(activation.inputs), list(activation.outputs),
+                                            list(activation.pollution))
+    assert gridValue(grid) == plan.value
+
+
+def test_custom_objective_is_searched_without_pruning() -> None:
+    def reds(grid: InterfaceGrid) -> int:
+        card = grid.getCard(GridPosition(1, 0))
+        assert card is not None
+        return card.resources.count(Resource.RED)
+
+    plan = planTurn(_chain(), [GridPosition(0, 0), GridPosition(1, 0)], reds)
+
+    # converting the red resource would lower this objective
+    assert [a.card for a in plan.activations] == [GridPosition(1, 0)]
+    assert plan.value == 1
+
+
+def test_plan_searches_payments_beyond_the_cheapest() -> None:
+    grid = Grid()
+    grid.putCard(GridPosition(0, 0), Card(pollutionSpacesL=1, upperEffect=ArbitraryBasic(1, [Resource.GOODS], 0)))
+    for position, resource in ((GridPosition(1, 0), Resource.RED), (GridPosition(-1, 0), Resource.GREEN)):
+        card = Card(pollutionSpacesL=1)
+        card.putResources([resource])
+        grid.putCard(position, card)
+
+    def kept(grid: InterfaceGrid) -> int:
+        produced, saved = grid.getCard(GridPosition(0, 0)), grid.getCard(GridPosition(1, 0))
+        assert produced is not None and saved is not None
+        return len(produced.resources) + 10 * len(saved.resources)
+
+    plan = planTurn(grid, [GridPosition(0, 0)], kept)
+
+    # the first payment takes the red resource, the objective wants it kept
+    assert plan.value == 11
+    assert [a.inputs for a in plan.activations] == [((Resource.GREEN, GridPosition(-1, 0)),)]
+
+
+def test_planner_bot_plays_complete_game() -> None:
+    game = GameFactory(seed=2).createGame([1, 2])
+    playGame(game, {1: PlannerBot(1), 2: RandomBot(2)})
+    assert game.state == GameState.Finish
+    assert set(finalScores(game)) == {1, 2}
@@ -118,4 +118,37 @@ def test_activate_card_success_performs_actions() -> None:
     assert result is True
 
     # verify resources: inputs removed, output added
-    assert acting.resources == [Resource.MONEY]
\ No newline at end of file
+    assert acting.resources == [Resource.MONEY]
+
+def test_plan_resolves_cards_and_can_be_applied_repeatedly() -> None:
+    pa = ProcessAction()
+    acting = Card(pollutionSpacesL=3, upperEffect=ArbitraryBasic(from_=1, to=[Resource.GOODS], pollution=1))
+    store = Card(pollutionSpacesL=1)
+    store.resources = [Resource.RED, Resource.RED]
+    pos_act = GridPosition(0, 0)
+    pos_store = GridPosition(1, 0)
+    grid = DummyGrid({pos_act: acting, pos_store: store})
+
+    plan = pa.plan(acting, grid, inputs=[(Resource.RED, pos_store)], outputs=[(Resource.GOODS, pos_act)],
+                   pollution=[pos_act])
+
+    assert plan is not None
+    assert plan.pollution == ((acting, 1),)
+    assert plan.inputs == ((store, (Resource.RED,)),)
+    assert plan.outputs == ((acting, (Resource.GOODS,)),)
+    # planning alone changes nothing
+    assert store.resources == [Resource.RED, Resource.RED]
+
+    pa.apply(plan)
+    pa.apply(plan)
+    assert store.resources == []
+    assert acting.resources == [Resource.GOODS, Resource.GOODS]
+    assert acting.pollution == 2
+
+
+def test_plan_of_invalid_action_is_none() -> None:
+    pa = ProcessAction()
+    acting = Card(pollutionSpacesL=1, upperEffect=ArbitraryBasic(from_=1, to=[Resource.GOODS], pollution=0))
+    grid = DummyGrid({GridPosition(0, 0): acting})
+    assert pa.plan(acting, grid, inputs=[(Resource.RED, GridPosition(0, 0))],
+                   outputs=[(Resource.GOODS, GridPosition(0, 0))], pollution=[]) is None
@@ -282,3 +282,27 @@ def test_create_pollution_on_missing_card() -> None:
     )
     assert result is False
     assert Counter(main_card.resources) == Counter([Resource.RED, Resource.GREEN])
+
+
+def test_plan_then_apply() -> None:
+    logic = ProcessActionAssistance()
+
+    main_card = Card(pollutionSpacesL=2, upperEffect=AlwaysAssistanceEffect())
+    main_card.putResources([Resource.RED, Resource.GREEN])
+    main_pos = GridPosition(1,1)
+    main_grid = DummyGrid({main_pos: main_card})
+
+    other_card = Card(pollutionSpacesL=1, upperEffect=TransformationFixedAlwaysAssist([Resource.GREEN, Resource.RED], [Resource.FOOD], 1))
+    assistingPlayer = DummyPlayer(DummyGrid({GridPosition(0,1): other_card}))
+
+    plan = logic.plan(main_card, main_grid, assistingPlayer, other_card,
+                      [(Resource.GREEN, main_pos), (Resource.RED, main_pos)], [(Resource.FOOD, main_pos)], [main_pos])
+    assert plan is not None
+    assert main_card.resources == [Resource.RED, Resource.GREEN]
+
+    logic.apply(plan)
+    assert main_card.resources == [Resource.FOOD]
+    assert main_card.pollution == 1
+
+    assert logic.plan(main_card, main_grid, assistingPlayer, other_card,
+                      [(Resource.GREEN, main_pos), (Resource.RED, main_pos)], [(Resource.FOOD, main_pos)], [main_pos]) is None
@@ -0,0 +1,70 @@
+from typing import Any
+import pytest
+from terra_futura.bots import GameDriver, RandomBot
+from terra_futura.factories import GameFactory
+from terra_futura.replay import ReplayReader, ReplayWriter
+from terra_futura.simple_types import GameState
+from terra_futura.simulate import SimulationTask, simulateGame
+from . import gameState
+
+
+def test_any_recorded_state_can_be_restored(tmp_path: Any) -> None:
+    path = str(tmp_path / "game.tfr")
+    game = GameFactory(seed=8).createGame([1, 2])
+    driver = GameDriver(game)
+    bot = RandomBot(8)
+    states = [gameState(game)]
+    with ReplayWriter(path, game, checkpointEvery=5):
+        while game.state != GameState.Finish:
+            driver.step(bot)
+            states.append(gameState(game))
+            if len(states) == 30:
+                assert game.undo()
+                states.append(gameState(game))
+                assert game.redo()
+                states.append(gameState(game))
+    assert game.actionLog is None
+
+    with ReplayReader(path) as replay:
+        assert len(replay) == len(states) - 1
+        for number in range(-1, len(replay)):
+            assert gameState(replay.stateAfter(number)) == states[number + 1]
+        assert replay.action(29).method == "undo"
+        assert replay.action(30).method == "redo"
+        with pytest.raises(IndexError):
+            replay.stateAfter(len(replay))
+
+
+def test_actions_are_found_by_turn_and_method(tmp_path: Any) -> None:
+    path = str(tmp_path / "game.tfr")
+    simulateGame(SimulationTask(0, 11, ("random", "random"), path))
+
+    with ReplayReader(path) as replay:
+        first = replay.find(turn=7)
+        assert replay.action(first).turn == 7
+        assert replay.action(first - 1).turn == 6
+        assert replay.action(first).method in ("takeCard", "discardLastCardFromDeck")
+
+        number = replay.find(turn=7, method="turnFinished", occurrence=2)
+        action = replay.action(number)
+        assert action.method == "turnFinished" and action.playerId == 2
+        game = replay.stateAfter(number)
+        assert game.turnNumber == 8 and game.onTurn() == 1
+
+        assert replay.find(turn=7, method="turnFinished", playerId=2) == number
+        with pytest.raises(KeyError):
+            replay.find(turn=7, method="turnFinished", occurrence=3)
+
+
+def test_incomplete_replays_are_rejected(tmp_path: Any) -> None:
+    path = tmp_path / "game.tfr"
+    game = GameFactory(seed=8).createGame([1, 2])
+    with ReplayWriter(str(path), game):
+        GameDriver(game).step(RandomBot(0))
+    with ReplayReader(str(path)) as replay:
+        assert len(replay) == 1
+
+    # a writer that never closed has no index
+    path.write_bytes(path.read_bytes()[:-40])
+    with pytest.raises(ValueError):
+        ReplayReader(str(path))
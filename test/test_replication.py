@@ -0,0 +1,117 @@
+import asyncio
+from typing import Any
+from terra_futura.bots import GameDriver, RandomBot
+from terra_futura.replication import Follower, Replicator
+from terra_futura.server import GameServer
+from terra_futura.simple_types import GameState
+from . import gameState
+
+
+async def _replicated(follower: Follower) -> tuple[GameServer, Replicator, asyncio.Server]:
+    stream = await follower.start(port=0)
+    replicator = await Replicator.connect("127.0.0.1", stream.sockets[0].getsockname()[1])
+    return GameServer(replicator=replicator), replicator, stream
+
+
+def test_follower_replays_the_games_of_the_primary() -> None:
+    async def scenario() -> tuple[dict[int, tuple[object, ...]], dict[int, tuple[object, ...]], int, int]:
+        follower = Follower()
+        server, replicator, stream = await _replicated(follower)
+        async with stream:
+            for seed in range(3):
+                server.createGame([1, 2], seed)
+            for gameId, game in server.games.items():
+                driver, bot = GameDriver(game), RandomBot(gameId)
+                for step in range(30 + gameId * 20):
+                    if game.state == GameState.Finish:
+                        break
+                    driver.step(bot)
+                    if step % 9 == 8:
+                        assert game.undo()
+                        driver = GameDriver(game)
+                    await asyncio.sleep(0)
+            server.closeGame(1)
+            await replicator.synced()
+            lag = replicator.metrics.lagActions
+            await replicator.close()
+            return ({gameId: gameState(game) for gameId, game in server.games.items()},
+                    {gameId: gameState(game) for gameId, game in follower.games.items()},
+                    lag, replicator.metrics.actions)
+
+    primary, replicas, lag, actions = asyncio.run(scenario())
+    assert sorted(primary) == [0, 2]
+    assert replicas == primary
+    assert lag == 0 and actions > 100
+
+
+def test_promoted_follower_continues_the_games() -> None:
+    async def scenario() -> tuple[GameState, int]:
+        follower = Follower()
+        server, replicator, stream = await _replicated(follower)
+        async with stream:
+            server.createGame([1, 2], 5)
+            game = server.games[0]
+            driver, bot = GameDriver(game), RandomBot(1)
+            for _ in range(60):
+                driver.step(bot)
+            assert game.perform("turnFinished", (game.onTurn(),), idempotencyKey="a")
+            driver.allowed = []
+            await replicator.synced()
+            allowed = list(driver.allowed)
+            # the primary fails
+            await replicator.close()
+            await follower.ended.wait()
+        promoted = GameServer()
+        follower.promote(promoted)
+        assert not follower.games
+        replica = promoted.games[0]
+        assert gameState(replica) == gameState(game)
+        # a retry after the failover is answered, not performed again
+        playerId = 1 if replica.onTurn() == 2 else 2
+        assert replica.perform("turnFinished", (playerId,), idempotencyKey="a")
+        assert gameState(replica) == gameState(game)
+        driver = GameDriver(replica, allowed)
+        while replica.state != GameState.Finish:
+            driver.step(bot)
+        return replica.state, promoted.createGame([1, 2], 6)
+
+    state, nextGameId = asyncio.run(scenario())
+    assert state == GameState.Finish
+    assert nextGameId == 1
+
+
+_RUN: list[str] = []
+
+
+def _run(code: str) -> None:
+    _RUN.append(code)
+
+
+class _Exploit:
+    def __reduce__(self) -> tuple[Any, ...]:
+        return _run, ("anything",)
+
+
+def test_follower_skips_frames_it_cannot_apply() -> None:
+    async def scenario() -> tuple[bool, int, tuple[object, ...], tuple[object, ...]]:
+        follower = Follower()
+        server, replicator, stream = await _replicated(follower)
+        async with stream:
+            server.createGame([1, 2], 3)
+            game = server.games[0]
+            replicator._action(7, "turnFinished", (1,))  # pylint: disable=protected-access
+            replicator._action(0, "__init__", ())  # pylint: disable=protected-access
+            replicator._action(0, "turnFinished", (_Exploit(),))  # pylint: disable=protected-access
+            driver, bot = GameDriver(game), RandomBot(3)
+            for _ in range(10):
+                driver.step(bot)
+            await replicator.synced()
+            connected = replicator.metrics.connected and not follower.ended.is_set()
+            await replicator.close()
+            return connected, follower.rejected, gameState(follower.games[0]), gameState(game)
+
+    connected, rejected, replica, primary = asyncio.run(scenario())
+    assert connected
+    assert rejected == 3
+    assert not _RUN
+    assert replica == primary
@@ -0,0 +1,299 @@
+import asyncio
+import base64
+import json
+import time
+from typing import Any, Iterator, Optional
+from terra_futura.anytime import GameView
+from terra_futura.clocks import TimeControl
+from terra_futura.factories import GameFactory
+from terra_futura.hibernation import hibernate
+from terra_futura.mcts import Move
+from terra_futura.server import GameServer
+from terra_futura.load_client import runLoad
+from terra_futura.simple_types import CardSource, Deck, GameState, GridPosition, Resource
+
+
+async def _exchange(port: int, requests: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Send requests one by one and collect every line received until each one is answered."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    messages: list[dict[str, Any]] = []
+    for request in requests:
+        writer.write(json.dumps(request).encode() + b"\n")
+        while True:
+            message = json.loads(await reader.readline())
+            messages.append(message)
+            if message.get("id") == request["id"]:
+                break
+    writer.close()
+    await writer.wait_closed()
+    return messages
+
+
+def test_requests_are_answered_and_notifications_pushed() -> None:
+    async def scenario() -> list[dict[str, Any]]:
+        server = GameServer()
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            return await _exchange(port, [
+                {"id": 1, "method": "createGame", "params": {"players": [1, 2], "seed": 3}},
+                {"id": 2, "method": "subscribe", "game": 0, "params": {"playerId": 2}},
+                {"id": 3, "method": "takeCard", "game": 0, "params": {
+                    "playerId": 1, "source": {"deck": "LEVEL_I", "index": 1},
+                    "cardIndex": 1, "destination": [0, 0]}},
+                {"id": 4, "method": "takeCard", "game": 0, "params": {
+                    "playerId": 2, "source": {"deck": "LEVEL_I", "index": 1},
+                    "cardIndex": 1, "destination": [0, 0]}},
+            ])
+
+    messages = asyncio.run(scenario())
+    assert messages[0] == {"id": 1, "result": 0}
+    assert messages[1] == {"id": 2, "result": True}
+    # the accepted action pushes an update for the subscribed seat before the response
+    assert messages[2]["event"] == "notify"
+    assert messages[2]["game"] == 0 and messages[2]["player"] == 2
+    assert messages[3] == {"id": 3, "result": True, "version": 1}
+    # player 2 is not on turn
+    assert messages[4] == {"id": 4, "result": False, "version": 1}
+
+
+def test_malformed_requests_get_errors() -> None:
+    async def scenario() -> list[dict[str, Any]]:
+        server = GameServer()
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            return await _exchange(port, [
+                {"id": 1, "method": "createGame", "params": {"players": [1]}},
+                {"id": 2, "method": "turnFinished", "game": 5, "params": {"playerId": 1}},
+                {"id": 3, "method": "createGame", "params": {"players": [1, 2]}},
+                {"id": 4, "method": "takeCard", "game": 0, "params": {
+                    "playerId": 1, "source": {"deck": "LEVEL_III", "index": 1},
+                    "cardIndex": 1, "destination": [0, 0]}},
+                {"id": 5, "method": "explode", "game": 0, "params": {"playerId": 1}},
+            ])
+
+    messages = asyncio.run(scenario())
+    assert "error" in messages[0]
+    assert "error" in messages[1]
+    assert messages[2] == {"id": 3, "result": 0}
+    assert "error" in messages[3]
+    assert "error" in messages[4]
+
+
+def test_clients_cannot_move_games() -> None:
+    async def scenario() -> tuple[list[dict[str, Any]], list[int]]:
+        server = GameServer()
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            data = base64.b64encode(hibernate(GameFactory(1).createGame([1, 2]))).decode()
+            messages = await _exchange(port, [
+                {"id": 1, "method": "createGame", "params": {"players": [1, 2]}},
+                {"id": 2, "method": "exportGame", "game": 0, "params": {}},
+                {"id": 3, "method": "importGame", "game": 1, "params": {"data": data}},
+            ])
+        return messages, list(server.games)
+
+    messages, games = asyncio.run(scenario())
+    assert "error" in messages[1]
+    assert "error" in messages[2]
+    assert games == [0]
+
+
+def test_load_client_plays_complete_games() -> None:
+    server = GameServer()
+
+    async def scenario() -> Any:
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            return await runLoad("127.0.0.1", port, games=6, connections=2, players=3)
+
+    report = asyncio.run(scenario())
+    assert report.games == 6
+    assert report.failedGames == 0
+    # every accepted action notifies all three seats
+    assert report.notifications > 6 * 9 * 3
+    # finished games are closed by the client
+    assert server.games == {}
+
+
+def test_created_game_starts_with_first_player() -> None:
+    server = GameServer()
+    gameId = server.createGame([4, 7], seed=1)
+    game = server.games[gameId]
+    assert game.state == GameState.TakeCardNoCardDiscarded
+    assert game.currentPlayerId == 4
+
+
+def test_batched_turns_play_complete_games_with_fewer_requests() -> None:
+    async def scenario(batch: bool) -> Any:
+        server = GameServer()
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            return await runLoad("127.0.0.1", port, games=2, connections=1, players=2, batch=batch)
+
+    single, batched = asyncio.run(scenario(False)), asyncio.run(scenario(True))
+    assert batched.failedGames == 0
+    assert len(batched.latencies) < len(single.latencies) / 2
+    # one notification per seat and turn instead of one per action
+    assert batched.notifications < single.notifications
+
+
+def test_rejected_batch_changes_nothing() -> None:
+    async def scenario() -> list[dict[str, Any]]:
+        server = GameServer()
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            return await _exchange(port, [
+                {"id": 1, "method": "createGame", "params": {"players": [1, 2], "seed": 3}},
+                {"id": 2, "method": "submitTurn", "game": 0, "params": {"steps": [
+                    {"method": "takeCard", "params": {"playerId": 1, "source": {"deck": "LEVEL_I", "index": 1},
+                                                      "cardIndex": 1, "destination": [0, 0]}},
+                    {"method": "turnFinished", "params": {"playerId": 2}}]}},
+                {"id": 3, "method": "submitTurn", "game": 0, "params": {"steps": [{"method": "explode",
+                                                                                   "params": {}}]}},
+                {"id": 4, "method": "takeCard", "game": 0, "params": {
+                    "playerId": 1, "source": {"deck": "LEVEL_I", "index": 1},
+                    "cardIndex": 1, "destination": [0, 0]}},
+            ])
+
+    messages = asyncio.run(scenario())
+    assert messages[1] == {"id": 2, "result": False, "version": 0}
+    assert "error" in messages[2]
+    # the first turn was rolled back, so the same card can still be taken
+    assert messages[3] == {"id": 4, "result": True, "version": 1}
+
+
+def test_stale_versions_and_retries_are_rejected() -> None:
+    takeCard = {"playerId": 1, "source": {"deck": "LEVEL_I", "index": 1}, "cardIndex": 1, "destination": [0, 0]}
+
+    async def scenario() -> list[dict[str, Any]]:
+        server = GameServer()
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            return await _exchange(port, [
+                {"id": 1, "method": "createGame", "params": {"players": [1, 2], "seed": 3}},
+                {"id": 2, "method": "subscribe", "game": 0, "params": {"playerId": 1}},
+                {"id": 3, "method": "takeCard", "game": 0, "params": {**takeCard, "idempotencyKey": "a"}},
+                # a retry of the request, and another client acting on what it saw before
+                {"id": 4, "method": "takeCard", "game": 0, "params": {**takeCard, "idempotencyKey": "a"}},
+                {"id": 5, "method": "turnFinished", "game": 0, "params": {"playerId": 1, "expectedVersion": 0}},
+                {"id": 6, "method": "turnFinished", "game": 0, "params": {"playerId": 1, "expectedVersion": 1}},
+                {"id": 7, "method": "turnFinished", "game": 0, "params": {"playerId": 1, "expectedVersion": "1"}},
+            ])
+
+    messages = asyncio.run(scenario())
+    assert json.loads(messages[2]["state"])["version"] == 1
+    assert json.loads(messages[2]["state"])["on_turn"] == 1
+    assert messages[3] == {"id": 3, "result": True, "version": 1}
+    assert messages[4] == {"id": 4, "result": True, "version": 1}
+    assert messages[5] == {"id": 5, "result": False, "version": 1}
+    assert json.loads(messages[6]["state"])["on_turn"] == 2
+    assert messages[7] == {"id": 6, "result": True, "version": 2}
+    assert "expectedVersion" in messages[8]["error"]
+
+
+def test_bot_seats_play_the_game() -> None:
+    async def scenario() -> tuple[list[dict[str, Any]], GameServer]:
+        server = GameServer()
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            messages = await _exchange(port, [
+                {"id": 1, "method": "createGame", "params": {"players": [1, 2], "seed": 5}},
+                {"id": 2, "method": "addBot", "game": 0, "params": {"playerId": 1, "bot": "os:system"}},
+                {"id": 3, "method": "addBot", "game": 0, "params": {"playerId": 2, "bot": "greedy", "budget": 0}},
+                {"id": 4, "method": "addBot", "game": 0, "params": {"playerId": 1, "bot": "greedy", "budget": 0.5}},
+                {"id": 5, "method": "addBot", "game": 0, "params": {"playerId": 2, "bot": "random", "seed": 3}},
+            ])
+            for _ in range(500):
+                if server.games[0].state == GameState.Finish:
+                    break
+                await asyncio.sleep(0.01)
+        return messages, server
+
+    messages, server = asyncio.run(scenario())
+    assert "Unknown bot" in messages[1]["error"]
+    assert "budget" in messages[2]["error"]
+    assert messages[3]["result"] is True and messages[4]["result"] is True
+    assert server.games[0].state == GameState.Finish
+    assert server.botHost.metrics.defaults == 0
+
+
+class _ClosableBot:
+    """Never finds a move; counts how often it was closed."""
+
+    def __init__(self) -> None:
+        self.closed = 0
+
+    def think(self, view: GameView, deadline: float) -> Iterator[Optional[Move]]:
+        while time.monotonic() < deadline and view.state != GameState.Finish:
+            yield None
+
+    def close(self) -> None:
+        self.closed += 1
+
+
+def test_bots_are_closed_with_their_game() -> None:
+    async def scenario() -> int:
+        server = GameServer()
+        gameId = server.createGame([1, 2], 1)
+        bot = _ClosableBot()
+        server.addBot(gameId, 2, bot, 0.01)
+        await asyncio.sleep(0.01)
+        server.closeGame(gameId)
+        await asyncio.sleep(0.01)
+        return bot.closed
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_players_out_of_time_get_default_moves() -> None:
+    async def scenario() -> tuple[list[dict[str, Any]], GameServer]:
+        server = GameServer(timeControl=TimeControl(0.02))
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            messages = await _exchange(port, [
+                {"id": 1, "method": "createGame", "params": {"players": [1, 2], "seed": 2}},
+                {"id": 2, "method": "clock", "game": 0},
+            ])
+            for _ in range(500):
+                if server.games[0].state == GameState.Finish:
+                    break
+                await asyncio.sleep(0.01)
+            messages += await _exchange(port, [{"id": 3, "method": "clock", "game": 0}])
+        return messages, server
+
+    messages, server = asyncio.run(scenario())
+    assert set(messages[1]["result"]) == {"1", "2"}
+    assert server.games[0].state == GameState.Finish
+    assert server.clocks is not None and server.clocks.timeouts > 20
+    assert messages[2]["result"] == {"1": 0, "2": 0}
+
+
+def test_timeout_while_waiting_for_a_reward_resolves_it() -> None:
+    server = GameServer(timeControl=TimeControl(0.01))
+    gameId = server.createGame([1, 2], 2)
+    game = server.games[gameId]
+    for playerId in (1, 2):
+        assert game.takeCard(playerId, CardSource(Deck.LEVEL_I, 1), 1, GridPosition(0, 0))
+        if playerId == 1:
+            assert game.turnFinished(1)
+    card = game.players[0].grid.getCard(GridPosition(0, 0))
+    assert card is not None
+    # player 1 assisted player 2 and is owed a reward
+    game._selectReward.setReward(1, card, [Resource.GREEN])  # pylint: disable=protected-access
+    game._state = GameState.SelectReward  # pylint: disable=protected-access
+    assert server.clocks is not None
+    server.clocks.update(gameId, game, "takeCard")
+    time.sleep(0.03)
+    server.clocks.advance()
+    assert game.state == GameState.ActivateCard
+    assert card.resources == [Resource.GREEN]
+    assert server.clocks.wheel.failures == 0
@@ -0,0 +1,47 @@
+import io
+import json
+from terra_futura.simulate import SimulationTask, makeTasks, runChunks, runSimulation, simulateGame
+
+
+def test_simulate_game_reports_scores_of_all_players() -> None:
+    result = simulateGame(SimulationTask(0, 42, ("greedy", "random", "random")))
+
+    assert result["game"] == 0
+    assert set(result["scores"]) == {"1", "2", "3"}
+    assert result["policies"] == {"1": "greedy", "2": "random", "3": "random"}
+    # per player nine cards taken, ten finished turns, a pattern and a scoring method, and the activations
+    assert result["actions"] > 3 * 21
+    assert result["seconds"] > 0
+
+
+def test_simulation_is_reproducible() -> None:
+    task = SimulationTask(3, 7, ("greedy", "random"))
+    first, second = simulateGame(task), simulateGame(task)
+    assert first["scores"] == second["scores"]
+
+
+def test_tasks_rotate_seats() -> None:
+    tasks = list(makeTasks(3, seed=1, policies=["greedy", "random"], players=2))
+    assert [t.policies for t in tasks] == [("greedy", "random"), ("random", "greedy"), ("greedy", "random")]
+    assert tasks == list(makeTasks(3, seed=1, policies=["greedy", "random"], players=2))
+
+
+def test_run_simulation_streams_every_game() -> None:
+    output = io.StringIO()
+    written = runSimulation(makeTasks(5, 0, ["random"], 2), workers=2, output=output, chunkSize=2)
+
+    lines = output.getvalue().splitlines()
+    assert written == 5
+    assert sorted(json.loads(line)["game"] for line in lines) == [0, 1, 2, 3, 4]
+
+
+def _squares(chunk: list[int]) -> list[int]:
+    return [n * n for n in chunk]
+
+
+def test_chunks_report_the_index_of_their_first_task() -> None:
+    squares: dict[int, int] = {}
+    for first, results in runChunks(_squares, iter(range(7)), workers=2, chunkSize=3):
+        for offset, square in enumerate(results):
+            squares[first + offset] = square
+    assert squares == {n: n * n for n in range(7)}
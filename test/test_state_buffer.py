@@ -0,0 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from terra_futura.bots import GameDriver, RandomBot, finalScores
+from terra_futura.catalog import CardCatalog, attachCatalog, processCatalog
+from terra_futura.factories import GameFactory, createCatalog
+from terra_futura.game import Game
+from terra_futura.mcts import legalMoves, search
+from terra_futura.simple_types import GameState
+from terra_futura.state_buffer import StateBuffer, decodeGame, encodeGame, sharedGame
+from terra_futura.transformation_fixed import TransformationFixed
+
+
+def _played(seed: int, steps: int, catalog: CardCatalog | None = None) -> Game:
+    game = GameFactory(seed, catalog=catalog).createGame([1, 2, 3])
+    driver, bot = GameDriver(game), RandomBot(seed)
+    for _ in range(steps):
+        if game.state == GameState.Finish:
+            break
+        driver.step(bot)
+    return game
+
+
+def _finish(game: Game, seed: int) -> dict[int, int]:
+    driver, bot = GameDriver(game), RandomBot(seed)
+    while game.state != GameState.Finish:
+        driver.step(bot)
+    return finalScores(game)
+
+
+def _sharedScores(task: tuple[str, int, int]) -> dict[int, int]:
+    name, offset, seed = task
+    catalog = processCatalog()
+    assert catalog is not None
+    return _finish(sharedGame(name, offset, catalog), seed)
+
+
+def test_decoded_games_play_on_like_the_original() -> None:
+    with createCatalog() as catalog:
+        for seed, steps in [(0, 0), (1, 7), (2, 40), (3, 90), (4, 500)]:
+            game = _played(seed, steps)
+            record = encodeGame(game, catalog)
+            copy = decodeGame(memoryview(record), catalog)
+            assert encodeGame(copy, catalog) == record
+            assert (copy.state, copy.onTurn(), copy.turnNumber, copy.version) == \
+                (game.state, game.onTurn(), game.turnNumber, game.version)
+            assert [p.grid.state() for p in copy.players] == [p.grid.state() for p in game.players]
+            if game.state != GameState.Finish:
+                assert legalMoves(GameDriver(copy)) == legalMoves(GameDriver(game))
+            assert _finish(copy, seed) == _finish(game.clone(), seed)
+
+
+def test_workers_read_positions_by_offset() -> None:
+    with createCatalog() as catalog:
+        states = StateBuffer.create(4096)
+        try:
+            games = [_played(seed, 20 * seed, catalog) for seed in range(4)]
+            offsets = [states.write(game, catalog) for game in games]
+            assert len(states.view(offsets[1])) == len(encodeGame(games[1], catalog))
+            with ProcessPoolExecutor(2, initializer=attachCatalog, initargs=(catalog.name,)) as pool:
+                scores = list(pool.map(_sharedScores, [(states.name, offset, 9) for offset in offsets]))
+            assert scores == [_finish(game.clone(), 9) for game in games]
+            # the same search as from a clone
+            assert search(states.read(offsets[2], catalog), [], float("inf"), 5, maxIterations=8) == \
+                search(games[2].clone(), [], float("inf"), 5, maxIterations=8)
+        finally:
+            states.close()
+
+
+def test_cards_outside_the_catalog_are_rejected() -> None:
+    with createCatalog() as catalog:
+        game = _played(0, 0)
+        pile = game.piles[next(iter(game.piles))]
+        visible = pile.getCard(1)
+        assert visible is not None
+        visible.upperEffect = TransformationFixed([], [], 5)
+        with pytest.raises(ValueError):
+            encodeGame(game, catalog)
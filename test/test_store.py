@@ -0,0 +1,141 @@
+import asyncio
+import sqlite3
+from typing import Any, Optional
+from terra_futura.bots import GameDriver, RandomBot
+from terra_futura.commands import TurnStep
+from terra_futura.factories import GameFactory
+from terra_futura.game import Game
+from terra_futura.game_observer import GameObserver
+from terra_futura.load_client import runLoad
+from terra_futura.server import GameServer
+from terra_futura.simple_types import CardSource, Deck, GameState, GridPosition
+from terra_futura.store import GameStore, benchmark
+from . import gameState
+
+
+def _play(game: Game, seed: int, steps: int, store: Optional[GameStore] = None) -> None:
+    driver = GameDriver(game)
+    bot = RandomBot(seed)
+    for _ in range(steps):
+        if game.state == GameState.Finish:
+            return
+        driver.step(bot)
+        if store is not None:
+            store.commit()
+
+
+def test_actions_after_the_snapshot_are_replayed(tmp_path: Any) -> None:
+    path = str(tmp_path / "games.db")
+    store = GameStore(path, snapshotEvery=5)
+    game = GameFactory(seed=4).createGame([1, 2], GameObserver({}))
+    store.attach(0, game)
+    _play(game, 4, 21, store)
+    assert game.undo() and game.undo() and game.redo()
+    while game.state != GameState.ActivateCard:
+        _play(game, 4, 1)
+    assert game.submitTurn([TurnStep("turnFinished", (game.onTurn(),))])
+    store.commit()
+    expected = gameState(game)
+    assert store.metrics.snapshots > 1
+    store.close()
+
+    with sqlite3.connect(path) as connection:
+        actions = connection.execute("SELECT COUNT(*) FROM actions").fetchone()[0]
+    assert 0 < actions < 5
+
+    notifications: list[dict[int, str]] = []
+
+    class Recorder:
+        def notifyAll(self, newState: dict[int, str]) -> None:
+            notifications.append(newState)
+
+    store = GameStore(path, snapshotEvery=5)
+    copy = store.load(0, Recorder())
+    assert gameState(copy) == expected
+    # replaying notifies nobody
+    assert notifications == []
+
+    # the rebuilt game keeps logging where the old one stopped
+    _play(copy, 6, 8)
+    store.commit()
+    expected = gameState(copy)
+    store.close()
+    store = GameStore(path)
+    assert gameState(store.load(0, Recorder())) == expected
+    store.close()
+
+
+def test_uncommitted_actions_are_lost(tmp_path: Any) -> None:
+    path = str(tmp_path / "games.db")
+    store = GameStore(path)
+    game = GameFactory(seed=1).createGame([1, 2], GameObserver({}))
+    store.attach(0, game)
+    store.commit()
+    expected = gameState(game)
+    assert game.discardLastCardFromDeck(1, Deck.LEVEL_I)
+    assert game.takeCard(1, CardSource(Deck.LEVEL_I, 1), 1, GridPosition(0, 0))
+    store.close()
+
+    store = GameStore(path)
+    assert store.gameIds() == [0]
+    assert gameState(store.load(0, GameObserver({}))) == expected
+    store.delete(0)
+    store.commit()
+    assert store.gameIds() == []
+    store.close()
+
+
+def test_idempotency_keys_survive_a_reload(tmp_path: Any) -> None:
+    path = str(tmp_path / "games.db")
+    store = GameStore(path)
+    game = GameFactory(seed=1).createGame([1, 2], GameObserver({}))
+    store.attach(0, game)
+    store.commit()
+    takeCard = (1, CardSource(Deck.LEVEL_I, 1), 1, GridPosition(0, 0))
+    assert game.perform("takeCard", takeCard, idempotencyKey="a")
+    # taking the card again would be legal now
+    assert game.undo()
+    store.commit()
+    store.close()
+
+    store = GameStore(path)
+    copy = store.load(0, GameObserver({}))
+    assert copy.version == 2
+    assert copy.perform("takeCard", takeCard, idempotencyKey="a")
+    assert copy.version == 2 and copy.state == GameState.TakeCardNoCardDiscarded
+    store.close()
+
+
+def test_concurrent_actions_share_commits(tmp_path: Any) -> None:
+    report = benchmark(str(tmp_path / "games.db"), games=8)
+    assert report.actions > 8 * 9 * 2
+    assert report.metrics.commits < report.actions
+
+
+def test_server_hosts_stored_games_again(tmp_path: Any) -> None:
+    path = str(tmp_path / "games.db")
+    store = GameStore(path)
+    server = GameServer(store=store)
+    gameId = server.createGame([1, 2], seed=3)
+
+    async def scenario() -> Any:
+        tcp = await server.start(port=0)
+        port = tcp.sockets[0].getsockname()[1]
+        async with tcp:
+            return await runLoad("127.0.0.1", port, games=3, connections=3, players=2)
+
+    report = asyncio.run(scenario())
+    assert report.failedGames == 0
+    game = server.games[gameId]
+    _play(game, 3, 10)
+    store.commit()
+    expected = gameState(game)
+    store.close()
+
+    store = GameStore(path)
+    restarted = GameServer(store=store)
+    # the load client closed its games
+    assert list(restarted.games) == [gameId]
+    assert gameState(restarted.games[gameId]) == expected
+    assert restarted.createGame([1, 2], seed=0) == gameId + 1
+    store.close()
@@ -0,0 +1,68 @@
+import random
+from typing import Any
+import pytest
+from terra_futura.tournament import EloRatings, Tournament, TournamentConfig, swissTables, tableGames
+
+
+def test_elo_moves_ratings_by_result() -> None:
+    ratings = EloRatings(["a", "b", "c"], k=32)
+    ratings.update({"a": 20, "b": 10})
+    assert ratings.ratings["a"] == pytest.approx(1516)
+    assert ratings.ratings["b"] == pytest.approx(1484)
+    # a three player game counts as three duels of half the weight
+    ratings.update({"a": 5, "b": 5, "c": 5})
+    assert sum(ratings.ratings.values()) == pytest.approx(4500)
+    assert 1500 < ratings.ratings["a"] < 1516
+    assert 1484 < ratings.ratings["b"] < 1500
+    assert [entrant for entrant, _, _ in ratings.standings()] == ["a", "c", "b"]
+    assert ratings.games == {"a": 2, "b": 2, "c": 1}
+
+
+def test_swiss_tables_seat_entrants_by_rating() -> None:
+    ratings = EloRatings(["a", "b", "c", "d", "e"])
+    for entrant, rating in zip("abcde", (1400, 1600, 1500, 1700, 1300)):
+        ratings.ratings[entrant] = rating
+    assert swissTables(ratings, 2, random.Random(0)) == [("d", "b"), ("c", "a")]
+    assert swissTables(ratings, 3, random.Random(0)) == [("d", "b", "c"), ("a", "e")]
+    assert tableGames(("a", "e")) == [("a", "e"), ("e", "a")]
+
+    with pytest.raises(ValueError):
+        TournamentConfig(("a", "b"), seats=3)
+    with pytest.raises(ValueError):
+        TournamentConfig(("a", "b", "c", "d", "e"), seats=5)
+
+
+def test_round_robin_plays_every_table_in_every_seating() -> None:
+    config = TournamentConfig(("greedy", "random", "terra_futura.bots:RandomBot"), seats=2, rounds=2, seed=1)
+    report = Tournament(config).run(workers=2)
+    # three tables of two seatings per round
+    assert report.games == 12
+    assert sorted(games for _, _, games in report.standings) == [8, 8, 8]
+    assert report.gamesPerCoreSecond == pytest.approx(report.gamesPerSecond / 2)
+    assert "games/s per core" in str(report)
+
+
+def test_resumed_tournament_plays_the_remaining_games(tmp_path: Any) -> None:
+    config = TournamentConfig(("greedy", "random", "terra_futura.bots:GreedyBot"), seats=3,
+                              format="swiss", rounds=2, seed=4)
+    complete: list[tuple[int, int]] = []
+    Tournament(config).run(chunkSize=1, onResult=lambda result: complete.append((result["game"], result["seed"])))
+
+    path = str(tmp_path / "tournament.json")
+    played: list[tuple[int, int]] = []
+
+    def crash(result: dict[str, Any]) -> None:
+        played.append((result["game"], result["seed"]))
+        if len(played) == 5:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        Tournament(config, path, checkpointEvery=2).run(chunkSize=1, onResult=crash)
+    resumed = Tournament(config, path)
+    # the fifth game was rated after the checkpoint of the fourth
+    assert (resumed.round, resumed.games) == (1, 4)
+    played = played[:4]
+    report = resumed.run(chunkSize=1, onResult=lambda result: played.append((result["game"], result["seed"])))
+    assert report.games == 2
+    assert sorted(played) == sorted(complete)
+    assert Tournament(config, path).finished